@@ -0,0 +1,289 @@
+"""
+Admission Control Module for the Python Server
+Per-client token-bucket rate limits and bounded concurrency pools that keep
+slow Gemini-backed requests from taking the threads of metadata requests
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from metrics import Counter, Gauge, Histogram
+
+# Requests in progress per pool, requests allowed to wait for a slot, and
+# seconds a request waits before it is turned away. In the threaded servers a
+# waiting request holds a thread, so size + queue of the LLM pool should stay
+# well below the server's thread count (GUNICORN_THREADS). Pools are per
+# process, so a deployment admits WEB_CONCURRENCY times as many requests
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 4))
+LLM_POOL_QUEUE = int(os.getenv('LLM_POOL_QUEUE', 4))
+LLM_POOL_QUEUE_TIMEOUT = float(os.getenv('LLM_POOL_QUEUE_TIMEOUT', 30))
+METADATA_POOL_SIZE = int(os.getenv('METADATA_POOL_SIZE', 8))
+METADATA_POOL_QUEUE = int(os.getenv('METADATA_POOL_QUEUE', 16))
+METADATA_POOL_QUEUE_TIMEOUT = float(os.getenv('METADATA_POOL_QUEUE_TIMEOUT', 10))
+
+# Requests per minute per client, and the burst a client may send at once (0 turns the limit off).
+# Buckets are kept per worker process and a client's requests are spread over
+# the workers, so across a deployment a client gets up to WEB_CONCURRENCY times
+# these; divide the intended limit by the number of workers when setting them
+LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', 30))
+LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', 10))
+METADATA_RATE_LIMIT = float(os.getenv('METADATA_RATE_LIMIT', 600))
+METADATA_RATE_BURST = int(os.getenv('METADATA_RATE_BURST', 60))
+
+# Header identifying the client, e.g. X-Forwarded-For behind a trusted proxy;
+# the connection's address is used when unset
+RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER', '')
+
+# Clients whose token buckets are remembered, least recently seen dropped first
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000))
+
+# Traffic class of each route, and whether a request holds a pool slot while
+# it runs; job submissions return at once and are only rate limited
+ROUTES = {
+    '/api/notes/generate': ('llm', True),
+    '/api/quiz/generate': ('llm', True),
+    '/api/studypack/generate': ('llm', True),
+    '/api/jobs/notes': ('llm', False),
+    '/api/jobs/quiz': ('llm', False),
+    '/api/jobs/studypack': ('llm', False),
+    '/api/video/metadata': ('metadata', True),
+    '/api/video/metadata/batch': ('metadata', True),
+    '/api/playlist/metadata': ('metadata', True),
+    '/api/links/ingest': ('metadata', True)
+}
+
+queue_wait = Histogram(
+    'admission_queue_wait_seconds', 'Time requests waited for a pool slot', labels=('pool',)
+)
+rejections = Counter(
+    'admission_rejections_total', 'Requests turned away with 429 by pool and reason', labels=('pool', 'reason')
+)
+exemptions = Counter(
+    'admission_exemptions_total', 'Requests let through uncharged because they cause no upstream work', labels=('pool',)
+)
+pool_in_flight = Gauge('admission_in_flight', 'Requests holding a pool slot', labels=('pool',))
+pool_queued = Gauge('admission_queued', 'Requests waiting for a pool slot', labels=('pool',))
+
+class Rejected(Exception):
+    """Raised when a request is turned away; carries the error type and Retry-After seconds"""
+
+    def __init__(self, error_type, message, retry_after):
+        super().__init__(message)
+        self.type = error_type
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token buckets per client: rate requests per minute, up to burst at once"""
+
+    def __init__(self, name, rate, burst, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.name = name
+        self.rate = rate / 60
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Take a token for client; raises Rejected when its bucket is empty"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            rejections.inc(self.name, 'rate_limited')
+            raise Rejected(
+                'RATE_LIMITED',
+                f'Too many {self.name} requests from this client; retry later',
+                math.ceil((1 - tokens) / self.rate)
+            )
+
+class _Waiter:
+    __slots__ = ('notify', 'queued_at')
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.queued_at = time.monotonic()
+
+class AdmissionPool:
+    """
+    At most size requests at a time, with up to max_queue more waiting
+
+    Slots are handed to waiters in arrival order. A request that finds the
+    queue full, or waits longer than queue_timeout, is rejected with a
+    Retry-After estimated from how long requests have recently held a slot.
+    """
+
+    def __init__(self, name, size, max_queue, queue_timeout):
+        self.name = name
+        self.size = size
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = deque()
+        self._hold_seconds = 1.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for a slot; returns the function that releases it, or raises Rejected"""
+        granted = threading.Event()
+        waiter = self._enter(granted.set)
+        if waiter is not None and not granted.wait(self.queue_timeout) and self._leave(waiter):
+            self._reject('queue_timeout')
+        return self._releaser()
+
+    async def acquire_async(self):
+        """acquire() for the event loop: waits without holding a thread"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def set_granted():
+            if not granted.done():
+                granted.set_result(None)
+
+        waiter = self._enter(lambda: loop.call_soon_threadsafe(set_granted))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(granted, self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._leave(waiter):
+                    self._reject('queue_timeout')
+            except asyncio.CancelledError:
+                if not self._leave(waiter):
+                    self._releaser()()
+                raise
+        return self._releaser()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "queue_limit": self.max_queue,
+                "active": self._active,
+                "queued": len(self._waiters),
+                "hold_seconds": round(self._hold_seconds, 3)
+            }
+
+    def _enter(self, notify):
+        # Returns None when a slot was free, or the queued waiter
+        with self._lock:
+            if self._active < self.size:
+                self._active += 1
+                pool_in_flight.set(self.name, value=self._active)
+                queue_wait.observe(0, self.name)
+                return None
+            waiter = None
+            if len(self._waiters) < self.max_queue:
+                waiter = _Waiter(notify)
+                self._waiters.append(waiter)
+                pool_queued.set(self.name, value=len(self._waiters))
+        if waiter is None:
+            self._reject('queue_full')
+        return waiter
+
+    def _leave(self, waiter):
+        # True if the waiter was still queued, False if it was already handed a slot
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return False
+            pool_queued.set(self.name, value=len(self._waiters))
+        queue_wait.observe(time.monotonic() - waiter.queued_at, self.name)
+        return True
+
+    def _releaser(self):
+        admitted_at = time.monotonic()
+        return lambda: self._release(admitted_at)
+
+    def _release(self, admitted_at):
+        now = time.monotonic()
+        with self._lock:
+            self._hold_seconds += 0.2 * (now - admitted_at - self._hold_seconds)
+            if self._waiters:
+                # Hand the slot straight to the next waiter
+                waiter = self._waiters.popleft()
+                pool_queued.set(self.name, value=len(self._waiters))
+            else:
+                waiter = None
+                self._active -= 1
+                pool_in_flight.set(self.name, value=self._active)
+        if waiter is not None:
+            queue_wait.observe(now - waiter.queued_at, self.name)
+            waiter.notify()
+
+    def _reject(self, reason):
+        with self._lock:
+            queued = len(self._waiters)
+            hold_seconds = self._hold_seconds
+        rejections.inc(self.name, reason)
+        raise Rejected(
+            'OVERLOADED',
+            f'The server is busy with {self.name} requests; retry later',
+            max(1, math.ceil((queued + 1) / max(self.size, 1) * hold_seconds))
+        )
+
+pools = {
+    'llm': AdmissionPool('llm', LLM_POOL_SIZE, LLM_POOL_QUEUE, LLM_POOL_QUEUE_TIMEOUT),
+    'metadata': AdmissionPool('metadata', METADATA_POOL_SIZE, METADATA_POOL_QUEUE, METADATA_POOL_QUEUE_TIMEOUT)
+}
+rate_limiters = {
+    'llm': RateLimiter('llm', LLM_RATE_LIMIT, LLM_RATE_BURST),
+    'metadata': RateLimiter('metadata', METADATA_RATE_LIMIT, METADATA_RATE_BURST)
+}
+
+def client_id(remote_addr, get_header):
+    """Identify the client by RATE_LIMIT_CLIENT_HEADER (first entry) or by its address"""
+    if RATE_LIMIT_CLIENT_HEADER:
+        value = get_header(RATE_LIMIT_CLIENT_HEADER)
+        if value:
+            return value.split(',')[0].strip()
+    return remote_addr or 'unknown'
+
+def admit(endpoint, client):
+    """
+    Apply the route's rate limit and take a pool slot
+
+    Returns the function that releases the slot, or None for routes that do
+    not hold one. Raises Rejected when the request should get a 429.
+    """
+    route = ROUTES.get(endpoint)
+    if route is None:
+        return None
+    traffic_class, pooled = route
+    rate_limiters[traffic_class].check(client)
+    return pools[traffic_class].acquire() if pooled else None
+
+def exempt(endpoint):
+    """
+    Let a request through without a token or a slot
+
+    For requests served from a cache or merged into an identical request
+    that was already admitted, so they cost no upstream work.
+    """
+    route = ROUTES.get(endpoint)
+    if route is not None:
+        exemptions.inc(route[0])
+
+async def admit_async(endpoint, client):
+    """admit() for the event loop"""
+    route = ROUTES.get(endpoint)
+    if route is None:
+        return None
+    traffic_class, pooled = route
+    rate_limiters[traffic_class].check(client)
+    return await pools[traffic_class].acquire_async() if pooled else None
+
+def stats():
+    """Return the state of every pool"""
+    return {name: pool.stats() for name, pool in pools.items()}
@@ -1,313 +1,837 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 import os
+import json
 from dotenv import load_dotenv
-from googleapiclient.discovery import build
-import re
 
 # Import the quiz and notes modules
-from quiz import generate_quiz_for_video
-from notes import generate_notes_for_video
+from quiz import (
+    generate_quiz_for_video, quiz_key, transcript_cache, artifact_cache, in_flight,
+    remember_generation, is_generation_cached
+)
+from notes import generate_notes_for_video, stream_notes_for_video, notes_key
+from studypack import generate_study_pack_for_video, study_pack_key
+from jobs import JobManager, JobQueueFull
+from search import transcript_index, SEARCH_MAX_RESULTS
+from prefetch import (
+    PrefetchScheduler, prefetch_kinds, PREFETCH_WORKERS, PREFETCH_BUDGET_SECONDS, PREFETCH_QUEUE_LIMIT
+)
+from youtube_api import (
+    YOUTUBE_API_KEY, get_youtube_client, format_video_metadata, fetch_video_metadata_batch,
+    get_video_item, get_playlist, ingest_playlist, ingest_links, metadata_cache, playlist_snapshots
+)
+import metrics
+import subsystems
+import http_cache
+import admission
+import upstream
+from youtube_urls import extract_video_id, extract_playlist_id, split_links
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 
-# Get YouTube API key from environment variable
-YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+# Valid note types for the notes endpoints
+NOTE_TYPES = ['comprehensive', 'summary', 'key_points', 'study_guide']
 
-# Create YouTube API client
-def get_youtube_client():
-    if not YOUTUBE_API_KEY:
-        return None
-    return build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
+# Seconds the GET generation endpoints wait for their job before answering
+JOB_WAIT_TIMEOUT = float(os.getenv('JOB_WAIT_TIMEOUT', 180))
 
-# Helper function to extract video ID from YouTube URL
-def extract_video_id(url):
-    if not url:
-        return None
+# Quiz and notes generation runs on a bounded worker pool
+job_manager = JobManager(
+    max_workers=int(os.getenv('JOB_WORKERS', 4)),
+    max_queue=int(os.getenv('JOB_QUEUE_LIMIT', 100)),
+    job_ttl=int(os.getenv('JOB_TTL', 3600))
+)
+
+# Transcripts (and optionally notes and quizzes) prepared in the background for
+# imported and viewed videos; it waits while generation jobs are queued or running
+prefetcher = PrefetchScheduler(
+    kinds=prefetch_kinds(),
+    workers=PREFETCH_WORKERS,
+    budget_seconds=PREFETCH_BUDGET_SECONDS,
+    queue_limit=PREFETCH_QUEUE_LIMIT,
+    busy=lambda: job_manager.active() > 0
+)
+
+# Subsystems that must be warm before /api/ready reports ready, e.g. "gemini,transcripts" (default: none)
+READINESS_REQUIRES = os.getenv('READINESS_REQUIRES', '')
+
+# Maximum number of IDs or URLs accepted by the batch metadata endpoint
+MAX_BATCH_VIDEOS = int(os.getenv('MAX_BATCH_VIDEOS', 500))
+
+# Maximum number of links accepted by the bulk link ingestion endpoint
+MAX_INGEST_LINKS = int(os.getenv('MAX_INGEST_LINKS', 5000))
+
+# Request metrics, labelled by route pattern so video IDs do not create new series
+def get_endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = get_endpoint()
+    metrics.requests_in_flight.inc(g.metrics_endpoint)
+
+# Registered after the metrics hook so rejected requests are measured too
+@app.before_request
+def admit_request():
+    if g.metrics_endpoint in GENERATION_ROUTES and is_served_without_work(g.metrics_endpoint, get_request_params()):
+        admission.exempt(g.metrics_endpoint)
+        return
+    try:
+        g.admission_release = admission.admit(
+            g.metrics_endpoint, admission.client_id(request.remote_addr, request.headers.get)
+        )
+    except admission.Rejected as e:
+        return rejected_response(e)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = g.get('metrics_endpoint', get_endpoint())
+    metrics.record_request(
+        time.perf_counter() - g.get('metrics_started', time.perf_counter()),
+        endpoint, request.method, str(response.status_code)
+    )
+    if response.status_code >= 400 and response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True) or {}
+        error_type = (body.get('error') or {}).get('type', 'UNKNOWN') if isinstance(body, dict) else 'UNKNOWN'
+        metrics.errors_total.inc(endpoint, error_type)
+    return response
+
+# Registered after the metrics hook so it runs first, and 304s are recorded as such
+@app.after_request
+def apply_http_caching(response):
+    if response.is_streamed or response.direct_passthrough:
+        return response
+    status, content = http_cache.finalize_response(
+        get_endpoint(), request.method, response.status_code, response.get_data(), response.headers,
+        accept_encoding=request.headers.get('Accept-Encoding'),
+        if_none_match=request.headers.get('If-None-Match'),
+        refresh=parse_bool(request.args.get('refresh'))
+    )
+    response.status_code = status
+    response.set_data(content)
+    if status == 304:
+        response.headers.pop('Content-Length', None)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    release = g.pop('admission_release', None)
+    if release:
+        release()
+    if 'metrics_endpoint' in g:
+        metrics.requests_in_flight.dec(g.pop('metrics_endpoint'))
+
+@metrics.register_collector
+def collect_service_stats():
+    caches = {
+        'transcripts': transcript_cache,
+        'artifacts': artifact_cache,
+        'metadata': metadata_cache,
+        'playlists': playlist_snapshots
+    }
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    flight_stats = in_flight.stats()
+    job_stats = job_manager.stats()
+    prefetch_stats = prefetcher.stats()
+    search_stats = transcript_index.stats()
+    return (
+        metrics.render_family('cache_lookups_total', 'counter', 'Cache lookups by cache and result', [
+            ({'cache': name, 'result': result}, stats[key])
+            for name, stats in cache_stats.items()
+            for result, key in (('memory_hit', 'memory_hits'), ('disk_hit', 'disk_hits'), ('miss', 'misses'))
+        ])
+        + metrics.render_family('cache_evictions_total', 'counter', 'Cache evictions by cache', [
+            ({'cache': name}, stats['evictions']) for name, stats in cache_stats.items()
+        ])
+        + metrics.render_family('cache_disk_bytes', 'gauge', 'Bytes stored in the disk tier', [
+            ({'cache': name}, stats['disk_bytes']) for name, stats in cache_stats.items()
+        ])
+        + metrics.render_family('singleflight_calls_total', 'counter', 'Single-flight calls by role', [
+            ({'role': role}, flight_stats[role]) for role in ('leaders', 'merged', 'timeouts')
+        ])
+        + metrics.render_family('singleflight_in_flight', 'gauge', 'Distinct calls currently in flight', [
+            ({}, flight_stats['in_flight'])
+        ])
+        + metrics.render_family('jobs', 'gauge', 'Generation jobs by status', [
+            ({'status': status}, job_stats[status]) for status in ('queued', 'running', 'finished')
+        ])
+        + metrics.render_family('prefetch_queue_depth', 'gauge', 'Background prefetch tasks waiting to run', [
+            ({}, prefetch_stats['queued'])
+        ])
+        + metrics.render_family('prefetch_budget_remaining_seconds', 'gauge', 'Seconds of background work left in the hourly budget', [
+            ({}, prefetch_stats['budget_remaining_seconds'])
+        ])
+        + metrics.render_family('search_index_videos', 'gauge', 'Videos in the transcript search index', [
+            ({}, search_stats['videos'])
+        ])
+        + metrics.render_family('search_index_bytes', 'gauge', 'Size of the transcript search index file', [
+            ({}, search_stats['disk_bytes'])
+        ])
+    )
+
+# Helper function to read a boolean parameter such as ?refresh=true
+def parse_bool(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes')
+
+# Helper function to merge query string and JSON body parameters
+def get_request_params():
+    params = request.args.to_dict()
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        params.update(body)
+    return params
+
+# Validate notes parameters; returns (params, error body)
+def parse_notes_params(args):
+    video_id_or_url = args.get('videoId')
+    note_type = args.get('type') or 'comprehensive'
     
-    # Remove any whitespace
-    url = url.strip()
+    if not video_id_or_url:
+        return None, {
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'videoId parameter is required'
+            }
+        }
     
-    # YouTube video ID regex patterns
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/)([a-zA-Z0-9_-]{11})',
-        r'youtube\.com\/watch\?.*v=([a-zA-Z0-9_-]{11})',
-    ]
+    if note_type not in NOTE_TYPES:
+        return None, {
+            'success': False,
+            'error': {
+                'type': 'INVALID_PARAMETER',
+                'message': f'Invalid note type. Must be one of: {", ".join(NOTE_TYPES)}'
+            }
+        }
     
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match and match.group(1):
-            return match.group(1)
+    return {
+        'videoId': video_id_or_url,
+        'type': note_type,
+        'refresh': parse_bool(args.get('refresh'))
+    }, None
+
+# Validate quiz parameters; returns (params, error body)
+def parse_quiz_params(args):
+    video_id_or_url = args.get('videoId')
     
-    # If it's just a video ID (11 characters)
-    if re.match(r'^[a-zA-Z0-9_-]{11}$', url):
-        return url
+    if not video_id_or_url:
+        return None, {
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'videoId parameter is required'
+            }
+        }
+    
+    try:
+        num_questions = int(args.get('questions', 4))
+    except (TypeError, ValueError):
+        num_questions = 4
+    
+    return {
+        'videoId': video_id_or_url,
+        'questions': num_questions,
+        'refresh': parse_bool(args.get('refresh'))
+    }, None
+
+# Validate study pack parameters; returns (params, error body)
+def parse_study_pack_params(args):
+    video_id_or_url = args.get('videoId')
+    
+    if not video_id_or_url:
+        return None, {
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'videoId parameter is required'
+            }
+        }
+    
+    note_types = args.get('types', 'comprehensive')
+    if isinstance(note_types, str):
+        note_types = [note_type.strip() for note_type in note_types.split(',') if note_type.strip()]
+    
+    invalid_types = [note_type for note_type in note_types if note_type not in NOTE_TYPES]
+    if invalid_types:
+        return None, {
+            'success': False,
+            'error': {
+                'type': 'INVALID_PARAMETER',
+                'message': f'Invalid note type. Must be one of: {", ".join(NOTE_TYPES)}'
+            }
+        }
+    
+    try:
+        num_questions = int(args.get('questions', 4))
+    except (TypeError, ValueError):
+        num_questions = 4
+    
+    return {
+        'videoId': video_id_or_url,
+        'types': list(dict.fromkeys(note_types)),
+        'questions': num_questions,
+        'refresh': parse_bool(args.get('refresh'))
+    }, None
+
+# Prepare the rest of a video in the background once someone studies it. Only
+# generation requests (and POST /api/prefetch) count as viewing a video: metadata
+# is fetched for every tile of a library screen
+def schedule_viewed_video(params):
+    prefetcher.schedule_video(extract_video_id(params['videoId']))
+
+# Submit a generation job. Identical requests share the job already queued or
+# running, so only one worker waits on the generation; results generated
+# recently are read from the cache in the calling thread instead of queuing
+def submit_generation_job(kind, params, fn, *args):
+    key = GENERATION_KEYS[kind](params)
+    schedule_viewed_video(params)
+    return job_manager.submit(
+        kind, params, fn, *args,
+        key=key + (params['refresh'],),
+        inline=not params['refresh'] and is_generation_cached(key),
+        on_done=remember_result
+    )
+
+def submit_notes_job(params):
+    return submit_generation_job(
+        'notes', params, generate_notes_for_video,
+        params['videoId'], params['type'], params['refresh']
+    )
+
+def submit_quiz_job(params):
+    return submit_generation_job(
+        'quiz', params, generate_quiz_for_video,
+        params['videoId'], params['questions'], params['refresh']
+    )
+
+def submit_study_pack_job(params):
+    return submit_generation_job(
+        'studypack', params, generate_study_pack_for_video,
+        params['videoId'], params['types'], params['questions'], params['refresh']
+    )
+
+# Request key of each kind of generation job, without the refresh flag
+GENERATION_KEYS = {
+    'notes': lambda params: notes_key(params['videoId'], params['type']),
+    'quiz': lambda params: quiz_key(params['videoId'], params['questions']),
+    'studypack': lambda params: study_pack_key(params['videoId'], params['types'], params['questions'])
+}
+
+# Generation routes, with the kind of job and the parameter parser of each
+GENERATION_ROUTES = {
+    '/api/notes/generate': ('notes', parse_notes_params),
+    '/api/quiz/generate': ('quiz', parse_quiz_params),
+    '/api/studypack/generate': ('studypack', parse_study_pack_params),
+    '/api/jobs/notes': ('notes', parse_notes_params),
+    '/api/jobs/quiz': ('quiz', parse_quiz_params),
+    '/api/jobs/studypack': ('studypack', parse_study_pack_params)
+}
+
+# Remember complete results, whose artifacts are now cached
+def remember_result(job):
+    if job.status == 'succeeded' and is_complete_result(job):
+        remember_generation(GENERATION_KEYS[job.kind](job.params))
+
+# Whether a generation request will be answered without calling Gemini: its
+# result was generated recently, or an identical generation is queued or in
+# flight and the request will share it. Such requests are not charged by admission control
+def is_served_without_work(endpoint, args):
+    kind, parse = GENERATION_ROUTES[endpoint]
+    params, error = parse(args)
+    if error or params['refresh']:
+        return False
+    key = GENERATION_KEYS[kind](params)
+    if is_generation_cached(key):
+        return True
+    # Streamed notes do not share a generation in flight
+    stream = str(args.get('stream', '')).strip().lower()
+    if stream in ('sse', 'ndjson') or parse_bool(stream):
+        return False
+    return job_manager.has_job(key + (False,)) or in_flight.running(key + (False,))
+
+# Number of questions in a quiz result's data
+def count_questions(quiz_data):
+    return len((quiz_data or {}).get('quiz') or [])
+
+# Whether a successful job result has everything that was asked for: quizzes can
+# come back with fewer questions, and study packs keep the parts that failed
+def is_complete_result(job):
+    data = job.result.get('data') or {}
+    if job.kind == 'quiz':
+        return count_questions(data.get('quiz')) >= job.params['questions']
+    if job.kind == 'studypack':
+        parts = list((data.get('notes') or {}).values())
+        quiz = data.get('quiz')
+        if quiz is not None:
+            parts.append(quiz)
+            if quiz['success'] and count_questions(quiz['data']) < job.params['questions']:
+                return False
+        return all(part['success'] for part in parts)
+    return True
+
+# Response body, status and extra headers for a finished job, or for one still
+# running after the wait. Incomplete results are not stored by clients or proxies,
+# so asking again retries the parts that are missing
+def job_response(job):
+    if not job.done.is_set():
+        return {
+            'success': False,
+            'error': {
+                'type': 'TIMEOUT',
+                'message': f'Generation is still running; poll /api/jobs/{job.id} for the result',
+                'jobId': job.id
+            }
+        }, 504, None
     
+    if job.status == 'error':
+        return job.result, 500, None
+    if job.status == 'failed':
+        # Upstream failures keep their 502/503/504, and a merged request that gave up
+        # waiting for the identical generation in flight (TIMEOUT) gets 504 like a job
+        # still running; other failures are the request's fault
+        error_type = (job.result.get('error') or {}).get('type')
+        return job.result, 504 if error_type == 'TIMEOUT' else upstream.ERROR_STATUS.get(error_type, 400), None
+    if not is_complete_result(job):
+        return job.result, 200, {'Cache-Control': http_cache.INCOMPLETE_POLICY}
+    return job.result, 200, None
+
+# Block until a job finishes and return its result as the response
+def wait_for_job(job):
+    job_manager.wait(job, JOB_WAIT_TIMEOUT)
+    body, status, headers = job_response(job)
+    return jsonify(body), status, headers
+
+# Streaming format requested with ?stream=ndjson|sse, or an SSE Accept header
+def get_stream_format():
+    stream = request.args.get('stream', '').strip().lower()
+    if stream in ('sse', 'ndjson'):
+        return stream
+    if parse_bool(stream):
+        return 'sse' if 'text/event-stream' in request.headers.get('Accept', '') else 'ndjson'
     return None
 
-@app.route('/api/video/metadata', methods=['GET'])
-def get_video_metadata():
-    video_id_or_url = request.args.get('videoId')
+# Stream notes events to the client as Gemini produces them
+def stream_notes_response(params, stream_format):
+    schedule_viewed_video(params)
+    events = stream_notes_for_video(params['videoId'], params['type'], params['refresh'])
     
+    def generate():
+        for event in events:
+            if stream_format == 'sse':
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + '\n'
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Headers reporting how the metadata cache answered, with a max-age matching the entry's TTL
+def cache_headers(cache_status, age, fresh_for):
+    return {
+        'X-Cache': cache_status,
+        'Age': str(int(age)),
+        'Cache-Control': http_cache.metadata_policy(age, fresh_for)
+    }
+
+def with_cache_headers(response, cache_status, age, fresh_for):
+    metrics.cache_responses.inc(get_endpoint(), cache_status)
+    response.headers.update(cache_headers(cache_status, age, fresh_for))
+    return response
+
+def queue_full_body(error):
+    return {
+        'success': False,
+        'error': {
+            'type': 'QUEUE_FULL',
+            'message': str(error)
+        }
+    }
+
+def queue_full_response(error):
+    return jsonify(queue_full_body(error)), 503
+
+# Body for a request turned away by admission control (rate limit or full pool)
+def rejected_body(error):
+    return {
+        'success': False,
+        'error': {
+            'type': error.type,
+            'message': str(error),
+            'retryAfter': error.retry_after
+        }
+    }
+
+def rejected_response(error):
+    return jsonify(rejected_body(error)), 429, {'Retry-After': str(error.retry_after)}
+
+# Look up one video's metadata; returns (body, status, (cache status, age, fresh_for) or None)
+def lookup_video_metadata(video_id_or_url):
     if not video_id_or_url:
-        return jsonify({
+        return {
             'success': False,
             'error': {
                 'type': 'MISSING_PARAMETER',
                 'message': 'videoId parameter is required'
             }
-        }), 400
+        }, 400, None
     
     video_id = extract_video_id(video_id_or_url)
     
     if not video_id:
-        return jsonify({
+        return {
             'success': False,
             'error': {
                 'type': 'PARSING_ERROR',
                 'message': 'Invalid YouTube video ID or URL'
             }
-        }), 400
+        }, 400, None
     
     try:
         youtube = get_youtube_client()
         
         if not youtube:
-            return jsonify({
+            return {
                 'success': False,
                 'error': {
                     'type': 'API_KEY_ERROR',
                     'message': 'YouTube API key not configured'
                 }
-            }), 500
+            }, 500, None
         
-        # Get video details from YouTube API
-        response = youtube.videos().list(
-            part='snippet,contentDetails,statistics',
-            id=video_id
-        ).execute()
+        # Get video details from the metadata cache or the YouTube API
+        video_data, cache_status, age, fresh_for = get_video_item(video_id)
         
-        if not response.get('items'):
-            return jsonify({
+        if not video_data:
+            return {
                 'success': False,
                 'error': {
                     'type': 'VIDEO_NOT_FOUND',
                     'message': 'Video not found or not accessible'
                 }
-            }), 404
-        
-        video_data = response['items'][0]
-        snippet = video_data['snippet']
-        content_details = video_data['contentDetails']
-        statistics = video_data.get('statistics', {})
-        
-        # Parse ISO 8601 duration format
-        duration_str = content_details.get('duration', 'PT0S')  # Default to 0 seconds
-        
-        # Format thumbnail URL
-        thumbnails = snippet.get('thumbnails', {})
-        thumbnail_url = (
-            thumbnails.get('high', {}).get('url') or
-            thumbnails.get('medium', {}).get('url') or
-            thumbnails.get('default', {}).get('url') or
-            f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'
-        )
+            }, 404, None
         
         # Create response object
-        metadata = {
-            'id': video_id,
-            'title': snippet.get('title', 'Unknown Title'),
-            'author': snippet.get('channelTitle', 'Unknown Author'),
-            'duration': duration_str,  # Client can parse this if needed
-            'thumbnailUrl': thumbnail_url,
-            'publishedAt': snippet.get('publishedAt'),
-            'description': snippet.get('description', ''),
-            'viewCount': statistics.get('viewCount'),
-            'likeCount': statistics.get('likeCount'),
-            'commentCount': statistics.get('commentCount'),
-            'tags': snippet.get('tags', []),
-            'categoryId': snippet.get('categoryId')
-        }
+        metadata = format_video_metadata(video_data)
         
-        return jsonify({
+        return {
             'success': True,
             'data': metadata
-        })
+        }, 200, (cache_status, age, fresh_for)
         
     except Exception as e:
-        return jsonify({
+        return {
             'success': False,
             'error': {
-                'type': 'SERVER_ERROR',
+                'type': upstream.error_type(e),
                 'message': str(e)
             }
-        }), 500
+        }, upstream.error_status(e), None
 
-@app.route('/api/playlist/metadata', methods=['GET'])
-def get_playlist_metadata():
-    playlist_id = request.args.get('playlistId')
+# Turn a lookup result into a JSON response with the cache headers
+def metadata_response(body, status, cache):
+    response = jsonify(body)
+    if cache:
+        with_cache_headers(response, *cache)
+    return response, status
+
+@app.route('/api/video/metadata', methods=['GET'])
+def get_video_metadata():
+    return metadata_response(*lookup_video_metadata(request.args.get('videoId')))
+
+@app.route('/api/video/metadata/batch', methods=['GET', 'POST'])
+def get_video_metadata_batch():
+    params = get_request_params()
+    video_ids_or_urls = params.get('videoIds')
     
-    if not playlist_id:
+    if isinstance(video_ids_or_urls, str):
+        video_ids_or_urls = [value for value in video_ids_or_urls.split(',') if value.strip()]
+    
+    if not video_ids_or_urls or not isinstance(video_ids_or_urls, list):
         return jsonify({
             'success': False,
             'error': {
                 'type': 'MISSING_PARAMETER',
-                'message': 'playlistId parameter is required'
+                'message': 'videoIds parameter is required (list or comma-separated string)'
+            }
+        }), 400
+    
+    if len(video_ids_or_urls) > MAX_BATCH_VIDEOS:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'INVALID_PARAMETER',
+                'message': f'At most {MAX_BATCH_VIDEOS} videos can be requested at once'
             }
         }), 400
     
+    if not YOUTUBE_API_KEY:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'API_KEY_ERROR',
+                'message': 'YouTube API key not configured'
+            }
+        }), 500
+    
     try:
-        youtube = get_youtube_client()
-        
-        if not youtube:
-            return jsonify({
-                'success': False,
-                'error': {
-                    'type': 'API_KEY_ERROR',
-                    'message': 'YouTube API key not configured'
-                }
-            }), 500
-        
-        # Get playlist details
-        playlist_response = youtube.playlists().list(
-            part='snippet,contentDetails',
-            id=playlist_id
-        ).execute()
+        # Dedupe IDs, keeping first-seen order
+        video_ids = [extract_video_id(str(value)) for value in video_ids_or_urls]
+        unique_ids = list(dict.fromkeys(video_id for video_id in video_ids if video_id))
+        results, cache_counts, fresh_for = fetch_video_metadata_batch(unique_ids)
         
-        if not playlist_response.get('items'):
-            return jsonify({
-                'success': False,
-                'error': {
-                    'type': 'PLAYLIST_NOT_FOUND',
-                    'message': 'Playlist not found or not accessible'
-                }
-            }), 404
-        
-        playlist_data = playlist_response['items'][0]
-        playlist_snippet = playlist_data['snippet']
-        playlist_details = playlist_data['contentDetails']
-        
-        # Get playlist items (videos)
+        # Return results in input order
         videos = []
-        next_page_token = None
+        for value, video_id in zip(video_ids_or_urls, video_ids):
+            if not video_id:
+                result = {
+                    'success': False,
+                    'error': {
+                        'type': 'PARSING_ERROR',
+                        'message': 'Invalid YouTube video ID or URL'
+                    }
+                }
+            else:
+                result = results[video_id]
+            videos.append(dict(result, input=value))
         
-        # Limit to 50 videos to avoid excessive API usage
-        max_results = 50
+        response = jsonify({
+            'success': True,
+            'data': {
+                'videos': videos,
+                'requested': len(video_ids_or_urls),
+                'unique': len(unique_ids)
+            }
+        })
+        response.headers['X-Cache'] = ', '.join(f'{status}={count}' for status, count in sorted(cache_counts.items()))
+        if any(is_transient_failure(video) for video in videos):
+            # Another try may succeed, so the batch must not be cached as a whole
+            response.headers['Cache-Control'] = http_cache.DEFAULT_POLICY
+        else:
+            response.headers['Cache-Control'] = http_cache.metadata_policy(0, fresh_for)
+        return response
         
-        while True:
-            playlist_items_response = youtube.playlistItems().list(
-                part='snippet,contentDetails',
-                playlistId=playlist_id,
-                maxResults=min(max_results - len(videos), 50),  # YouTube API allows max 50 per request
-                pageToken=next_page_token
-            ).execute()
-            
-            # Extract video IDs
-            video_ids = [item['contentDetails']['videoId'] for item in playlist_items_response.get('items', [])]
-            
-            if video_ids:
-                # Get video details for all videos in one request
-                videos_response = youtube.videos().list(
-                    part='snippet,contentDetails,statistics',
-                    id=','.join(video_ids)
-                ).execute()
-                
-                for video in videos_response.get('items', []):
-                    video_snippet = video['snippet']
-                    video_content = video['contentDetails']
-                    
-                    thumbnails = video_snippet.get('thumbnails', {})
-                    thumbnail_url = (
-                        thumbnails.get('high', {}).get('url') or
-                        thumbnails.get('medium', {}).get('url') or
-                        thumbnails.get('default', {}).get('url') or
-                        f'https://img.youtube.com/vi/{video["id"]}/hqdefault.jpg'
-                    )
-                    
-                    videos.append({
-                        'id': video['id'],
-                        'title': video_snippet.get('title', 'Unknown Title'),
-                        'description': video_snippet.get('description', ''),
-                        'thumbnailUrl': thumbnail_url,
-                        'duration': video_content.get('duration', 'PT0S'),
-                        'author': video_snippet.get('channelTitle', 'Unknown'),
-                        'publishedAt': video_snippet.get('publishedAt')
-                    })
-            
-            next_page_token = playlist_items_response.get('nextPageToken')
-            
-            if not next_page_token or len(videos) >= max_results:
-                break
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': upstream.error_type(e),
+                'message': str(e)
+            }
+        }), upstream.error_status(e)
+
+# Failures in a batch that a retry would not change
+PERMANENT_BATCH_ERRORS = ('VIDEO_NOT_FOUND', 'PARSING_ERROR')
+
+def is_transient_failure(result):
+    return not result.get('success') and (result.get('error') or {}).get('type') not in PERMANENT_BATCH_ERRORS
+
+# Look up a playlist and its videos; returns (body, status, (cache status, age, fresh_for) or None)
+def lookup_playlist_metadata(playlist_id):
+    if not playlist_id:
+        return {
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'playlistId parameter is required'
+            }
+        }, 400, None
+    
+    if not YOUTUBE_API_KEY:
+        return {
+            'success': False,
+            'error': {
+                'type': 'API_KEY_ERROR',
+                'message': 'YouTube API key not configured'
+            }
+        }, 500, None
+    
+    try:
+        # Get the whole playlist from the metadata cache or the YouTube API
+        result, cache_status, age, fresh_for = get_playlist(extract_playlist_id(playlist_id) or playlist_id.strip())
         
-        # Create playlist metadata
-        thumbnails = playlist_snippet.get('thumbnails', {})
-        thumbnail_url = (
-            thumbnails.get('high', {}).get('url') or
-            thumbnails.get('medium', {}).get('url') or
-            thumbnails.get('default', {}).get('url')
-        )
+        if not result['success']:
+            return result, 404, None
         
-        playlist_metadata = {
-            'id': playlist_id,
-            'title': playlist_snippet.get('title', 'Unknown Playlist'),
-            'description': playlist_snippet.get('description', ''),
-            'thumbnailUrl': thumbnail_url,
-            'channelTitle': playlist_snippet.get('channelTitle', 'Unknown Channel'),
-            'itemCount': playlist_details.get('itemCount', 0),
-            'publishedAt': playlist_snippet.get('publishedAt'),
-            'videos': videos
-        }
+        prefetcher.schedule_playlist([video['id'] for video in result['data']['videos']])
         
-        return jsonify({
-            'success': True,
-            'data': playlist_metadata
-        })
+        return result, 200, (cache_status, age, fresh_for)
         
     except Exception as e:
-        return jsonify({
+        return {
             'success': False,
             'error': {
-                'type': 'SERVER_ERROR',
+                'type': upstream.error_type(e),
                 'message': str(e)
             }
-        }), 500
+        }, upstream.error_status(e), None
 
-@app.route('/api/notes/generate', methods=['GET'])
-def generate_notes():
-    video_id_or_url = request.args.get('videoId')
-    note_type = request.args.get('type', default='comprehensive')
+# Streaming playlist ingestion requested with ?stream=ndjson
+def wants_playlist_stream(args):
+    return args.get('stream', '').strip().lower() == 'ndjson' or parse_bool(args.get('stream'))
+
+@app.route('/api/playlist/metadata', methods=['GET'])
+def get_playlist_metadata():
+    playlist_id = request.args.get('playlistId')
     
-    if not video_id_or_url:
+    if playlist_id and YOUTUBE_API_KEY and wants_playlist_stream(request.args):
+        return stream_playlist_response(extract_playlist_id(playlist_id) or playlist_id.strip())
+    
+    return metadata_response(*lookup_playlist_metadata(playlist_id))
+
+# Stream playlist events as NDJSON so the client can render page by page
+def stream_playlist_response(playlist_id):
+    def generate():
+        try:
+            for event in ingest_playlist(playlist_id):
+                if event['event'] == 'videos' and event['page'] == 1:
+                    prefetcher.schedule_playlist([video['id'] for video in event['data']])
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            yield json.dumps({
+                'event': 'error',
+                'error': {
+                    'type': upstream.error_type(e),
+                    'message': str(e)
+                }
+            }) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Links from a JSON list or string, a text/plain body, or ?links=; None if none were sent
+def get_links_param():
+    links = get_request_params().get('links')
+    if links is None and request.mimetype == 'text/plain':
+        links = request.get_data(as_text=True)
+    if isinstance(links, str):
+        links = split_links(links)
+    if not isinstance(links, list):
+        return None
+    return [link for link in links if str(link).strip()] or None
+
+@app.route('/api/links/ingest', methods=['GET', 'POST'])
+def ingest_links_route():
+    links = get_links_param()
+    
+    if not links:
         return jsonify({
             'success': False,
             'error': {
                 'type': 'MISSING_PARAMETER',
-                'message': 'videoId parameter is required'
+                'message': 'links parameter is required (list, or text with one link per line)'
             }
         }), 400
     
-    # Validate note type
-    valid_note_types = ['comprehensive', 'summary', 'key_points', 'study_guide']
-    if note_type not in valid_note_types:
+    if len(links) > MAX_INGEST_LINKS:
         return jsonify({
             'success': False,
             'error': {
                 'type': 'INVALID_PARAMETER',
-                'message': f'Invalid note type. Must be one of: {", ".join(valid_note_types)}'
+                'message': f'At most {MAX_INGEST_LINKS} links can be ingested at once'
             }
         }), 400
     
+    if not YOUTUBE_API_KEY:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'API_KEY_ERROR',
+                'message': 'YouTube API key not configured'
+            }
+        }), 500
+    
+    # Resolve all links concurrently and stream one NDJSON line per link, in input order
+    def generate():
+        try:
+            for event in ingest_links(links):
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            yield json.dumps({
+                'event': 'error',
+                'error': {
+                    'type': upstream.error_type(e),
+                    'message': str(e)
+                }
+            }) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/search', methods=['GET'])
+def search_transcripts():
+    query = request.args.get('q', '')
+    video_id_or_url = request.args.get('videoId')
+    
+    video_id = None
+    if video_id_or_url:
+        video_id = extract_video_id(video_id_or_url)
+        if not video_id:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'type': 'PARSING_ERROR',
+                    'message': 'Invalid YouTube video ID or URL'
+                }
+            }), 400
+    
     try:
-        # Use the notes module to generate notes
-        result = generate_notes_for_video(video_id_or_url, note_type)
-        
-        if not result.get('success', False):
-            return jsonify(result), 400
-        
-        return jsonify(result)
+        limit = min(max(int(request.args.get('limit', 20)), 1), SEARCH_MAX_RESULTS)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        limit, offset = 20, 0
+    
+    result = transcript_index.search(query, video_id=video_id, limit=limit, offset=offset)
+    
+    if result is None:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'q parameter is required'
+            }
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'query': query,
+            'hits': result[0],
+            'truncated': result[1],
+            'limit': limit,
+            'offset': offset
+        }
+    })
+
+@app.route('/api/notes/generate', methods=['GET'])
+def generate_notes():
+    params, error = parse_notes_params(request.args)
+    if error:
+        return jsonify(error), 400
+    
+    stream_format = get_stream_format()
+    if stream_format:
+        return stream_notes_response(params, stream_format)
+    
+    try:
+        # Run the notes job on the worker pool and wait for its result
+        job = submit_notes_job(params)
+        return wait_for_job(job)
         
+    except JobQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -319,27 +843,39 @@ def generate_notes():
 
 @app.route('/api/quiz/generate', methods=['GET'])
 def generate_quiz():
-    video_id_or_url = request.args.get('videoId')
-    num_questions = request.args.get('questions', default=4, type=int)
+    params, error = parse_quiz_params(request.args)
+    if error:
+        return jsonify(error), 400
     
-    if not video_id_or_url:
+    try:
+        # Run the quiz job on the worker pool and wait for its result
+        job = submit_quiz_job(params)
+        return wait_for_job(job)
+        
+    except JobQueueFull as e:
+        return queue_full_response(e)
+    except Exception as e:
         return jsonify({
             'success': False,
             'error': {
-                'type': 'MISSING_PARAMETER',
-                'message': 'videoId parameter is required'
+                'type': 'SERVER_ERROR',
+                'message': str(e)
             }
-        }), 400
+        }), 500
+
+@app.route('/api/studypack/generate', methods=['GET'])
+def generate_study_pack():
+    params, error = parse_study_pack_params(request.args)
+    if error:
+        return jsonify(error), 400
     
     try:
-        # Use the quiz module to generate a quiz
-        result = generate_quiz_for_video(video_id_or_url, num_questions)
-        
-        if not result.get('success', False):
-            return jsonify(result), 400
-        
-        return jsonify(result)
+        # Run the study pack job on the worker pool and wait for its result
+        job = submit_study_pack_job(params)
+        return wait_for_job(job)
         
+    except JobQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -349,6 +885,203 @@ def generate_quiz():
             }
         }), 500
 
+@app.route('/api/jobs/notes', methods=['POST'])
+def submit_notes():
+    params, error = parse_notes_params(get_request_params())
+    if error:
+        return jsonify(error), 400
+    
+    try:
+        job = submit_notes_job(params)
+    except JobQueueFull as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 202
+
+@app.route('/api/jobs/quiz', methods=['POST'])
+def submit_quiz():
+    params, error = parse_quiz_params(get_request_params())
+    if error:
+        return jsonify(error), 400
+    
+    try:
+        job = submit_quiz_job(params)
+    except JobQueueFull as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 202
+
+@app.route('/api/jobs/studypack', methods=['POST'])
+def submit_study_pack():
+    params, error = parse_study_pack_params(get_request_params())
+    if error:
+        return jsonify(error), 400
+    
+    try:
+        job = submit_study_pack_job(params)
+    except JobQueueFull as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'JOB_NOT_FOUND',
+                'message': 'Job not found or expired'
+            }
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'success': True,
+        'data': {
+            'transcripts': transcript_cache.stats(),
+            'artifacts': artifact_cache.stats(),
+            'metadata': metadata_cache.stats(),
+            'in_flight': in_flight.stats(),
+            'jobs': job_manager.stats(),
+            'prefetch': prefetcher.stats(),
+            'search': transcript_index.stats(),
+            'compressed': http_cache.compressed_cache.stats(),
+            'admission': admission.stats(),
+            'upstream': upstream.stats()
+        }
+    })
+
+@app.route('/api/prefetch', methods=['GET'])
+def get_prefetch_status():
+    return jsonify({
+        'success': True,
+        'data': prefetcher.stats()
+    })
+
+@app.route('/api/prefetch', methods=['POST'])
+def schedule_prefetch():
+    video_ids = get_request_params().get('videoIds')
+    if isinstance(video_ids, str):
+        video_ids = split_links(video_ids)
+    
+    if not isinstance(video_ids, list) or not video_ids:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'MISSING_PARAMETER',
+                'message': 'videoIds parameter is required'
+            }
+        }), 400
+    
+    if not prefetcher.enabled:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'PREFETCH_DISABLED',
+                'message': 'Background prefetching is turned off (PREFETCH=off)'
+            }
+        }), 409
+    
+    scheduled = []
+    for value in video_ids:
+        video_id = extract_video_id(str(value))
+        if video_id:
+            prefetcher.schedule_video(video_id)
+            scheduled.append(video_id)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'scheduled': scheduled,
+            'prefetch': prefetcher.stats()
+        }
+    }), 202
+
+@app.route('/api/prefetch', methods=['DELETE'])
+def cancel_prefetch():
+    video_id = request.args.get('videoId')
+    if video_id:
+        video_id = extract_video_id(video_id)
+        if not video_id:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'type': 'PARSING_ERROR',
+                    'message': 'Invalid YouTube video ID or URL'
+                }
+            }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'cancelled': prefetcher.cancel(video_id),
+            'prefetch': prefetcher.stats()
+        }
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/health', methods=['GET'])
+def get_health():
+    return jsonify({
+        'success': True,
+        'data': {
+            'status': 'ok',
+            'uptimeSeconds': round(time.time() - STARTED_AT, 3)
+        }
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def get_readiness():
+    states = subsystems.status()
+    missing = [name for name in subsystems.warm_up_names(READINESS_REQUIRES) if not states[name]['warm']]
+    data = {
+        'ready': not missing,
+        'importSeconds': APP_IMPORT_SECONDS,
+        'uptimeSeconds': round(time.time() - STARTED_AT, 3),
+        'subsystems': states
+    }
+    
+    if missing:
+        return jsonify({
+            'success': False,
+            'error': {
+                'type': 'NOT_READY',
+                'message': f'Waiting for warm-up of: {", ".join(missing)}'
+            },
+            'data': data
+        }), 503
+    
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+APP_IMPORT_SECONDS = round(time.perf_counter() - _import_started, 6)
+STARTED_AT = time.time()
+metrics.app_import_seconds.set(value=APP_IMPORT_SECONDS)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    subsystems.start_warm_up()
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,177 @@
+"""
+ASGI Entry Point for the Python Server
+Serves the I/O-bound endpoints from an asyncio event loop so that waiting
+clients do not each hold a thread. Everything else is passed to the Flask
+app unchanged.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict
+import metrics
+import subsystems
+import http_cache
+import admission
+import app as server
+
+# Threads for metadata lookups; separate from the YouTube executor, whose tasks wait on each other
+ASYNC_METADATA_WORKERS = int(os.getenv('ASYNC_METADATA_WORKERS', 16))
+
+metadata_executor = ThreadPoolExecutor(max_workers=ASYNC_METADATA_WORKERS, thread_name_prefix='async-metadata')
+
+flask_app = WsgiToAsgi(server.app)
+
+async def run_blocking(fn, *args):
+    """Run a blocking lookup on the metadata executor"""
+    return await asyncio.get_running_loop().run_in_executor(metadata_executor, fn, *args)
+
+async def wait_for_job(job):
+    """Wait for a job without blocking a thread; returns (body, status, headers) like app.job_response"""
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+
+    def set_finished():
+        if not finished.done():
+            finished.set_result(None)
+
+    job.add_done_callback(lambda job: loop.call_soon_threadsafe(set_finished))
+    try:
+        await asyncio.wait_for(finished, server.JOB_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    return server.job_response(job)
+
+async def run_job(submit, params):
+    """Submit a generation job and wait for it; returns (body, status, None, headers)"""
+    try:
+        # Off the event loop: a cached result is read while submitting
+        job = await run_blocking(submit, params)
+        body, status, headers = await wait_for_job(job)
+    except server.JobQueueFull as e:
+        return server.queue_full_body(e), 503, None, None
+    except Exception as e:
+        return {
+            'success': False,
+            'error': {
+                'type': 'SERVER_ERROR',
+                'message': str(e)
+            }
+        }, 500, None, None
+    return body, status, None, headers
+
+async def video_metadata(args):
+    return (*await run_blocking(server.lookup_video_metadata, args.get('videoId')), None)
+
+async def playlist_metadata(args):
+    return (*await run_blocking(server.lookup_playlist_metadata, args.get('playlistId')), None)
+
+async def generate_notes(args):
+    params, error = server.parse_notes_params(args)
+    if error:
+        return error, 400, None, None
+    return await run_job(server.submit_notes_job, params)
+
+async def generate_quiz(args):
+    params, error = server.parse_quiz_params(args)
+    if error:
+        return error, 400, None, None
+    return await run_job(server.submit_quiz_job, params)
+
+# GET routes served here; each returns (body, status, (cache status, age, fresh_for) or None, extra headers or None)
+ROUTES = {
+    '/api/video/metadata': video_metadata,
+    '/api/playlist/metadata': playlist_metadata,
+    '/api/notes/generate': generate_notes,
+    '/api/quiz/generate': generate_quiz
+}
+
+def encode_json(body):
+    """Encode a body the way Flask's jsonify does"""
+    return (server.app.json.dumps(body, separators=(',', ':')) + '\n').encode('utf-8')
+
+def request_header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def send_json(send, scope, args, body, status, cache, extra_headers=None):
+    headers = {'Content-Type': 'application/json'}
+    if extra_headers:
+        headers.update(extra_headers)
+    if cache:
+        headers.update(server.cache_headers(*cache))
+    status, content = http_cache.finalize_response(
+        scope['path'], 'GET', status, encode_json(body), headers,
+        accept_encoding=request_header(scope, b'accept-encoding'),
+        if_none_match=request_header(scope, b'if-none-match'),
+        refresh=server.parse_bool(args.get('refresh'))
+    )
+    if status != 304:
+        headers['Content-Length'] = str(len(content))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    })
+    await send({'type': 'http.response.body', 'body': content})
+    return status
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            subsystems.start_warm_up()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            metadata_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get(scope.get('path')) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+    args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+    if handler is None or 'stream' in args:
+        # Streaming responses and all other routes are served by Flask
+        return await flask_app(scope, receive, send)
+
+    endpoint = scope['path']
+    started = time.perf_counter()
+    metrics.requests_in_flight.inc(endpoint)
+    release = None
+    try:
+        client = admission.client_id(
+            (scope.get('client') or (None,))[0],
+            lambda name: request_header(scope, name.lower().encode('latin-1'))
+        )
+        try:
+            if endpoint in server.GENERATION_ROUTES and server.is_served_without_work(endpoint, args):
+                admission.exempt(endpoint)
+            else:
+                release = await admission.admit_async(endpoint, client)
+        except admission.Rejected as e:
+            body, status = server.rejected_body(e), 429
+            sent_status = await send_json(send, scope, args, body, status, None, {'Retry-After': str(e.retry_after)})
+        else:
+            body, status, cache, headers = await handler(args)
+            if cache:
+                metrics.cache_responses.inc(endpoint, cache[0])
+            sent_status = await send_json(send, scope, args, body, status, cache, headers)
+    finally:
+        if release:
+            release()
+        metrics.requests_in_flight.dec(endpoint)
+
+    metrics.record_request(time.perf_counter() - started, endpoint, 'GET', str(sent_status))
+    if status >= 400:
+        error_type = (body.get('error') or {}).get('type', 'UNKNOWN') if isinstance(body, dict) else 'UNKNOWN'
+        metrics.errors_total.inc(endpoint, error_type)
@@ -0,0 +1,104 @@
+"""
+HTTP caching and compression benchmark, run offline against local stand-in services
+
+Starts the app, warms its caches, then requests a large playlist, notes and
+a quiz repeatedly in four ways: without compression, with gzip, with brotli,
+and as a revalidation with If-None-Match (answered with 304). For each it
+reports the bytes on the wire per response and the median and p95 latency,
+so the savings of compression and of conditional requests can be compared.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_http_cache.py
+    python benchmarks/bench_http_cache.py --server async --requests 200
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeServices, FakeSettings
+from loadtest import free_port, percentile, start_app
+
+ROUTES = {
+    'playlist': '/api/playlist/metadata?playlistId=PLbenchhttpcache0001',
+    'notes': '/api/notes/generate?videoId=benchnotes1',
+    'quiz': '/api/quiz/generate?videoId=benchquiz01'
+}
+
+def fetch(port, path, headers):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, response.getheader('ETag'), len(body)
+    finally:
+        connection.close()
+
+def run_mode(port, path, headers, requests):
+    latencies = []
+    sizes = []
+    statuses = set()
+    for _ in range(requests):
+        started = time.perf_counter()
+        status, _, size = fetch(port, path, headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes.append(size)
+        statuses.add(status)
+    return {
+        'status': ','.join(str(status) for status in sorted(statuses)),
+        'bytes': round(sum(sizes) / len(sizes)),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', default='threaded', help='threaded or async')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route and mode')
+    parser.add_argument('--playlist-size', type=int, default=500, help='Videos in the playlist')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    settings = FakeSettings(gemini_latency=0.05, jitter=0, playlist_size=args.playlist_size)
+    cache_dir = tempfile.mkdtemp(prefix='bench-http-cache-')
+    rows = []
+    try:
+        with FakeServices(settings) as fakes, open(os.path.join(cache_dir, 'server.log'), 'w') as log_file:
+            port = free_port()
+            process = start_app(port, fakes, cache_dir, log_file, server=args.server, extra_env={'PREFETCH': 'off'})
+            try:
+                for name, path in ROUTES.items():
+                    status, etag, _ = fetch(port, path, {})
+                    if status != 200:
+                        raise RuntimeError(f'{name} returned {status}')
+                    modes = {
+                        'identity': {},
+                        'gzip': {'Accept-Encoding': 'gzip'},
+                        'br': {'Accept-Encoding': 'br'},
+                        'revalidate (304)': {'Accept-Encoding': 'br', 'If-None-Match': etag}
+                    }
+                    for mode, headers in modes.items():
+                        rows.append((name, mode, run_mode(port, path, headers, args.requests)))
+            finally:
+                process.terminate()
+                process.wait(15)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    columns = ('status', 'bytes', 'p50_ms', 'p95_ms')
+    print(f'{"route":<10}{"mode":<18}' + ''.join(f'{column:>10}' for column in columns))
+    for name, mode, result in rows:
+        print(f'{name:<10}{mode:<18}' + ''.join(f'{result[column]:>10}' for column in columns))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
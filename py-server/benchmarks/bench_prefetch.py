@@ -0,0 +1,118 @@
+"""
+Prefetch benchmark, run offline against local stand-in services
+
+Imports a playlist, then opens notes and a quiz for each of its first videos,
+the way a student starts studying an imported playlist. It does this once with
+PREFETCH=off and once with background prefetching. With prefetching, the
+benchmark waits for the prefetch queue to drain (the "think time" between
+importing and opening a video) before timing the requests. The
+prefetch_tasks_total counters show how much background work was done.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_prefetch.py
+    python benchmarks/bench_prefetch.py --prefetch transcripts --videos 3
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeServices, FakeSettings
+from loadtest import free_port, start_app
+
+def get_json(port, path, params, timeout=120):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', f'{path}?{urlencode(params)}')
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def timed(port, path, params):
+    started = time.perf_counter()
+    status, _ = get_json(port, path, params)
+    return round((time.perf_counter() - started) * 1000, 1), status
+
+def wait_for_idle(port, timeout):
+    """Wait until no prefetch task is queued or running; returns the prefetch stats"""
+    deadline = time.monotonic() + timeout
+    while True:
+        _, body = get_json(port, '/api/prefetch', {})
+        stats = body['data']
+        if (stats['queued'] == 0 and stats['running'] == 0) or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.1)
+
+def run(prefetch, fakes, args):
+    cache_dir = tempfile.mkdtemp(prefix='bench-prefetch-')
+    port = free_port()
+    result = {}
+    try:
+        with open(os.path.join(cache_dir, 'server.log'), 'w') as log_file:
+            process = start_app(port, fakes, cache_dir, log_file, extra_env={
+                'PREFETCH': prefetch,
+                'PREFETCH_PLAYLIST_VIDEOS': str(args.videos),
+                'WARM_UP': 'all'
+            })
+            try:
+                status, body = get_json(port, '/api/playlist/metadata', {'playlistId': 'PLbenchprefetch0001'})
+                if status != 200:
+                    raise RuntimeError(f'Playlist import failed with status {status}')
+                video_ids = [video['id'] for video in body['data']['videos'][:args.videos]]
+
+                started = time.perf_counter()
+                stats = wait_for_idle(port, args.idle_timeout)
+                result['prefetch_s'] = round(time.perf_counter() - started, 2)
+                result['tasks'] = stats['completed'] + stats['failed']
+
+                notes, quiz = [], []
+                for video_id in video_ids:
+                    notes.append(timed(port, '/api/notes/generate', {'videoId': video_id})[0])
+                    quiz.append(timed(port, '/api/quiz/generate', {'videoId': video_id})[0])
+                result['notes_ms'] = round(statistics.median(notes), 1)
+                result['quiz_ms'] = round(statistics.median(quiz), 1)
+            finally:
+                process.terminate()
+                process.wait(15)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prefetch', default='transcripts,notes,quiz',
+                        help='PREFETCH setting compared with PREFETCH=off')
+    parser.add_argument('--videos', type=int, default=3, help='Videos opened from the start of the playlist')
+    parser.add_argument('--idle-timeout', type=float, default=120, help='Seconds to wait for the prefetch queue')
+    parser.add_argument('--gemini-latency', type=float, default=0.4, help='Seconds per Gemini call')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    settings = FakeSettings(gemini_latency=args.gemini_latency, jitter=0)
+    results = {}
+    with FakeServices(settings) as fakes:
+        for prefetch in ('off', args.prefetch):
+            print(f'Running with PREFETCH={prefetch}...', flush=True)
+            results[prefetch] = run(prefetch, fakes, args)
+
+    columns = ('prefetch_s', 'tasks', 'notes_ms', 'quiz_ms')
+    print()
+    print(f'{"PREFETCH":<26}' + ''.join(f'{column:>14}' for column in columns))
+    for prefetch, result in results.items():
+        print(f'{prefetch:<26}' + ''.join(f'{str(result.get(column)):>14}' for column in columns))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Transcript search benchmark
+
+Builds a search index of synthetic transcripts in a temporary directory and
+reports the indexing rate, the index size, and query latency (p50/p95) for
+common and rare words, two-word queries, phrases, prefixes and queries
+limited to one video. Words are drawn from a Zipf-like distribution over a
+generated vocabulary, so common words occur in most passages and rare words
+in few, as in real captions.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --videos 20000 --segments 400
+"""
+
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+from loadtest import percentile
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'ba', 'do', 'fi', 'gu', 'he', 'jo', 'pe']
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_segments(rng, vocabulary, weights, segments):
+    start = 0.0
+    items = []
+    for _ in range(segments):
+        duration = round(rng.uniform(1.5, 5.0), 2)
+        items.append({'text': ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(6, 14))),
+                      'start': start, 'duration': duration})
+        start += duration
+    return items
+
+def time_queries(index, queries, video_id=None):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, video_id=video_id, limit=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentile(latencies, 0.5), percentile(latencies, 0.95)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--videos', type=int, default=2000, help='Transcripts to index')
+    parser.add_argument('--segments', type=int, default=400, help='Segments per transcript')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='Distinct words')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per query kind')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    cache_dir = tempfile.mkdtemp(prefix='bench-search-')
+    os.environ['CACHE_DIR'] = cache_dir
+    from search import TranscriptIndex
+    from transcript import Transcript
+
+    try:
+        rng = random.Random(1)
+        vocabulary = make_vocabulary(args.vocabulary, rng)
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        index = TranscriptIndex()
+
+        video_ids = [f'vid{number:08d}' for number in range(args.videos)]
+        transcripts = {}
+        indexing = 0.0
+        for video_id in video_ids:
+            transcript = Transcript.from_items(make_segments(rng, vocabulary, weights, args.segments))
+            started = time.perf_counter()
+            index.add(video_id, transcript)
+            indexing += time.perf_counter() - started
+            if len(transcripts) < 50:
+                transcripts[video_id] = transcript
+
+        stats = index.stats()
+        print(f'{args.videos} videos, {stats["passages"]} passages, '
+              f'{stats["disk_bytes"] / 1024 / 1024:.1f} MiB index')
+        print(f'indexing: {args.videos / indexing:,.0f} videos/s ({indexing / args.videos * 1000:.2f} ms per video)')
+
+        # Phrases are taken from indexed text so that they match
+        samples = list(transcripts.values())
+        phrases = []
+        for _ in range(args.queries):
+            words = rng.choice(samples).segment_text(rng.randrange(args.segments)).split()
+            phrases.append('"' + ' '.join(words[:3]) + '"')
+
+        kinds = {
+            'common word': [rng.choice(vocabulary[:20]) for _ in range(args.queries)],
+            'rare word': [rng.choice(vocabulary[-5000:]) for _ in range(args.queries)],
+            'two words': [f'{rng.choice(vocabulary[:500])} {rng.choice(vocabulary[:500])}' for _ in range(args.queries)],
+            'phrase': phrases,
+            'prefix': [rng.choice(vocabulary[:2000])[:4] + '*' for _ in range(args.queries)]
+        }
+
+        print()
+        print(f'{"query":<24}{"p50 ms":>10}{"p95 ms":>10}')
+        for kind, queries in kinds.items():
+            p50, p95 = time_queries(index, queries)
+            print(f'{kind:<24}{p50:>10.2f}{p95:>10.2f}')
+        p50, p95 = time_queries(index, kinds['common word'], video_id=video_ids[0])
+        print(f'{"common word, one video":<24}{p50:>10.2f}{p95:>10.2f}')
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Threaded versus async serving benchmark, run offline against local stand-in services
+
+Starts the server once with Flask's threaded server and once with uvicorn and
+asgi.py, and sends the same burst of concurrent slow requests to each: many
+quiz requests for different videos while Gemini is slow, so most clients
+spend their time waiting for a job worker. The job pool and Gemini
+concurrency limits are the same in both modes. For each mode it reports
+throughput, latency, status counts and the server's peak memory and thread
+count.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_serving.py
+    python benchmarks/bench_serving.py --clients 1000 --gemini-latency 2 --job-workers 64
+    python benchmarks/bench_serving.py --path /api/video/metadata --clients 2000
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeServices, FakeSettings
+from loadtest import free_port, percentile, read_memory_mb, start_app
+
+MODES = ('threaded', 'async')
+
+def read_threads(pid):
+    """Return the thread count of a process, or None without /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class ProcessSampler:
+    """Record the highest thread count of a process while the burst runs"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, read_threads(self.pid) or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+async def fetch(port, target, timeout):
+    """Send one GET with its own connection and return the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+async def burst(port, path, params, clients, timeout):
+    """Open all client requests at once and return (latencies, statuses, duration)"""
+    latencies = []
+    statuses = {}
+
+    async def client(i):
+        started = time.perf_counter()
+        try:
+            status = await fetch(port, f'{path}?{urlencode(params(i))}', timeout)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - started)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies, statuses, time.perf_counter() - started
+
+def run_mode(mode, args, settings):
+    cache_dir = tempfile.mkdtemp(prefix='bench-serving-')
+    env = {
+        'JOB_WORKERS': str(args.job_workers),
+        'JOB_QUEUE_LIMIT': str(args.clients),
+        'GEMINI_MAX_CONCURRENCY': str(args.job_workers),
+        'ASYNC_METADATA_WORKERS': str(args.job_workers)
+    }
+    if args.path == '/api/quiz/generate':
+        params = lambda i: {'videoId': f'serve{i:06d}', 'questions': 4}
+    elif args.path == '/api/notes/generate':
+        params = lambda i: {'videoId': f'serve{i:06d}', 'type': 'summary'}
+    else:
+        params = lambda i: {'videoId': f'serve{i:06d}'}
+
+    try:
+        with FakeServices(settings) as fakes, open(os.path.join(cache_dir, 'server.log'), 'w') as log_file:
+            port = free_port()
+            process = start_app(port, fakes, cache_dir, log_file, mode, env)
+            try:
+                idle_threads = read_threads(process.pid)
+                with ProcessSampler(process.pid) as sampler:
+                    latencies, statuses, duration = asyncio.run(
+                        burst(port, args.path, params, args.clients, args.timeout)
+                    )
+                _, peak_rss = read_memory_mb(process.pid)
+            finally:
+                process.terminate()
+                process.wait(10)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        'duration_s': round(duration, 2),
+        'throughput_rps': round(len(latencies) / duration, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'peak_rss_mb': peak_rss,
+        'idle_threads': idle_threads,
+        'peak_threads': sampler.peak_threads,
+        'statuses': statuses
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/api/quiz/generate',
+                        choices=('/api/quiz/generate', '/api/notes/generate', '/api/video/metadata'))
+    parser.add_argument('--clients', type=int, default=500, help='Concurrent requests in the burst')
+    parser.add_argument('--job-workers', type=int, default=32, help='JOB_WORKERS and GEMINI_MAX_CONCURRENCY')
+    parser.add_argument('--gemini-latency', type=float, default=1.0, help='Seconds per Gemini call')
+    parser.add_argument('--youtube-latency', type=float, default=0.05, help='Seconds per YouTube API call')
+    parser.add_argument('--transcript-segments', type=int, default=200, help='Caption segments per video')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated: threaded,async')
+    parser.add_argument('--timeout', type=float, default=600, help='Client timeout per request in seconds')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    settings = FakeSettings(
+        youtube_latency=args.youtube_latency,
+        gemini_latency=args.gemini_latency,
+        transcript_segments=args.transcript_segments
+    )
+
+    results = {}
+    for mode in args.modes.split(','):
+        print(f'Running {args.clients} concurrent {args.path} requests against the {mode} server...', flush=True)
+        results[mode] = run_mode(mode, args, settings)
+
+    columns = ('duration_s', 'throughput_rps', 'p50_ms', 'p95_ms', 'peak_rss_mb', 'idle_threads', 'peak_threads')
+    print()
+    print(f'{"server":<10}' + ''.join(f'{column:>16}' for column in columns))
+    for mode, result in results.items():
+        print(f'{mode:<10}' + ''.join(f'{str(result[column]):>16}' for column in columns))
+    for mode, result in results.items():
+        print(f'{mode} statuses: {result["statuses"]}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
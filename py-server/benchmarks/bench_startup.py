@@ -0,0 +1,175 @@
+"""
+Cold start benchmark, run offline against local stand-in services
+
+Measures how long importing app.py takes in a fresh interpreter, with the
+SDKs left to be imported lazily and with all of them imported up front. Then,
+for each server, it measures the time from starting the process to the first
+successful /api/health response, and the latency of the first and second
+metadata and quiz requests (each for a video not seen before, so the second
+request shows the cost once the subsystem is warm). Memory is the
+proportional set size (PSS) summed over the server and its worker
+processes, so memory shared between preloaded workers is counted once.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --servers threaded,gunicorn,gunicorn-preload --workers 4
+    python benchmarks/bench_startup.py --warm-up all
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeServices, FakeSettings
+from loadtest import free_port, send_request
+
+IMPORT_SCRIPT = '''
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if {preload}:
+    import subsystems
+    subsystems.preload()
+print(imported - started, time.perf_counter() - started)
+'''
+
+def measure_import(preload, runs):
+    """Median seconds to import app.py (and the SDKs with preload) in a fresh interpreter"""
+    env = dict(os.environ, CACHE_DIR=tempfile.mkdtemp(prefix='bench-import-'))
+    times = []
+    try:
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, '-c', IMPORT_SCRIPT.format(preload=preload)],
+                cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True
+            ).stdout.split()
+            times.append(float(output[-1]))
+    finally:
+        shutil.rmtree(env['CACHE_DIR'], ignore_errors=True)
+    return statistics.median(times)
+
+def process_tree(pid):
+    """pid and the pids of its child processes"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+def read_pss_mb(pid):
+    """Proportional set size of a process tree in MiB, or None without /proc"""
+    total = 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+def timed_request(port, path, params, timeout):
+    started = time.perf_counter()
+    status = send_request(port, path, params, timeout)
+    return round((time.perf_counter() - started) * 1000, 1), status
+
+def run_server(server, fakes, args):
+    cache_dir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(
+        os.environ,
+        PYTHONUNBUFFERED='1',
+        CACHE_DIR=cache_dir,
+        YOUTUBE_API_ENDPOINT=fakes.base_url,
+        GEMINI_API_ENDPOINT=fakes.base_url,
+        BENCH_TRANSCRIPT_URL=fakes.base_url,
+        YOUTUBE_API_KEY='benchmark-key',
+        GEMINI_API_KEY='benchmark-gemini-key',
+        WARM_UP=args.warm_up,
+        WEB_CONCURRENCY=str(args.workers)
+    )
+    port = free_port()
+    result = {}
+    try:
+        with open(os.path.join(cache_dir, 'server.log'), 'w') as log_file:
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), str(port), server],
+                cwd=SERVER_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+            )
+            try:
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    if process.poll() is not None:
+                        with open(log_file.name) as f:
+                            raise RuntimeError(f'{server} exited with status {process.returncode}:\n{f.read()[-2000:]}')
+                    try:
+                        if send_request(port, '/api/health', {}, 1) == 200:
+                            break
+                    except OSError:
+                        time.sleep(0.02)
+                result['ready_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                result['idle_pss_mb'] = read_pss_mb(process.pid)
+
+                for name, path, params in (
+                    ('metadata', '/api/video/metadata', lambda i: {'videoId': f'start{i:06d}'}),
+                    ('quiz', '/api/quiz/generate', lambda i: {'videoId': f'start{i:06d}', 'questions': 4})
+                ):
+                    for attempt, label in ((1, 'first'), (2, 'second')):
+                        latency, status = timed_request(port, path, params(attempt + (10 if name == 'quiz' else 0)), 120)
+                        result[f'{name}_{label}_ms'] = latency if status == 200 else f'{latency} ({status})'
+                result['pss_mb'] = read_pss_mb(process.pid)
+            finally:
+                process.terminate()
+                process.wait(15)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default='threaded,async,gunicorn,gunicorn-preload',
+                        help='Comma-separated: threaded, async, gunicorn, gunicorn-preload')
+    parser.add_argument('--workers', type=int, default=1, help='Gunicorn worker processes (WEB_CONCURRENCY)')
+    parser.add_argument('--warm-up', default='none', help='WARM_UP setting for the servers (default: none)')
+    parser.add_argument('--import-runs', type=int, default=5, help='Fresh interpreters per import measurement')
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='Seconds per Gemini call')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    print(f'import app.py, SDKs lazy:       {measure_import(False, args.import_runs) * 1000:8.1f} ms')
+    print(f'import app.py, SDKs preloaded:  {measure_import(True, args.import_runs) * 1000:8.1f} ms')
+    print()
+
+    settings = FakeSettings(gemini_latency=args.gemini_latency, jitter=0)
+    results = {}
+    with FakeServices(settings) as fakes:
+        for server in args.servers.split(','):
+            print(f'Starting {server} (WARM_UP={args.warm_up})...', flush=True)
+            results[server] = run_server(server, fakes, args)
+
+    columns = ('ready_ms', 'metadata_first_ms', 'metadata_second_ms', 'quiz_first_ms', 'quiz_second_ms',
+               'idle_pss_mb', 'pss_mb')
+    print()
+    print(f'{"server":<18}' + ''.join(f'{column:>20}' for column in columns))
+    for server, result in results.items():
+        print(f'{server:<18}' + ''.join(f'{str(result.get(column)):>20}' for column in columns))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
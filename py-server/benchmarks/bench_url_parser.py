@@ -0,0 +1,126 @@
+"""
+Microbenchmark for YouTube link parsing
+
+Measures youtube_urls.classify_link on a generated mix of watch, youtu.be,
+embed, live, shorts and playlist URLs, bare IDs and invalid input. The two
+video ID extractors it replaced (from app.py and quiz.py) are kept here for
+comparison: their throughput is reported, and so are the inputs on which
+they disagreed with each other or with the classifier.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_url_parser.py [links]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_urls import classify_link, split_links
+
+ID_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-'
+
+FORMS = [
+    'https://www.youtube.com/watch?v={video}',
+    'https://www.youtube.com/watch?v={video}&t=42s',
+    'https://m.youtube.com/watch?feature=share&v={video}',
+    'https://www.youtube.com/watch?v={video}&list={playlist}&index=3',
+    'https://youtu.be/{video}',
+    'https://youtu.be/{video}?si=AbCdEfGh',
+    'https://www.youtube.com/embed/{video}',
+    'https://www.youtube.com/live/{video}?feature=share',
+    'https://youtube.com/shorts/{video}',
+    'https://www.youtube.com/playlist?list={playlist}',
+    '{video}',
+    '{playlist}',
+    'https://example.com/watch/{video}',
+    'https://vimeo.com/123456789',
+    'not a link'
+]
+
+def legacy_app_extract_video_id(url):
+    """app.extract_video_id before the shared classifier"""
+    if not url:
+        return None
+    url = url.strip()
+    patterns = [
+        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/)([a-zA-Z0-9_-]{11})',
+        r'youtube\.com\/watch\?.*v=([a-zA-Z0-9_-]{11})',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match and match.group(1):
+            return match.group(1)
+    if re.match(r'^[a-zA-Z0-9_-]{11}$', url):
+        return url
+    return None
+
+def legacy_quiz_extract_video_id(url):
+    """quiz.extract_video_id before the shared classifier"""
+    if not url:
+        return None
+    url = url.strip()
+    patterns = [
+        r"(?:v=|\/)([0-9A-Za-z_-]{11})",
+        r"youtu\.be\/([0-9A-Za-z_-]{11})",
+        r"youtube\.com\/embed\/([0-9A-Za-z_-]{11})",
+        r"youtube\.com\/watch\?v=([0-9A-Za-z_-]{11})",
+        r"youtube\.com\/live\/([0-9A-Za-z_-]{11})"
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1)
+    if re.match(r'^[a-zA-Z0-9_-]{11}$', url):
+        return url
+    return None
+
+def generate_links(count, seed=1):
+    rng = random.Random(seed)
+    make_id = lambda length: ''.join(rng.choice(ID_CHARS) for _ in range(length))
+    return [
+        rng.choice(FORMS).format(video=make_id(11), playlist='PL' + make_id(32))
+        for _ in range(count)
+    ]
+
+def measure(fn, links, repeat=3):
+    """Best links per second over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for link in links:
+            fn(link)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(links) / best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    links = generate_links(count)
+    text = '\n'.join(links)
+
+    print(f'{count} links')
+    print(f'classify_link:              {measure(classify_link, links):12,.0f} links/s')
+    print(f'split_links + classify:     {measure(lambda text: [classify_link(link) for link in split_links(text)], [text], 3) * count:12,.0f} links/s')
+    print(f'legacy app extractor:       {measure(legacy_app_extract_video_id, links):12,.0f} links/s (videos only)')
+    print(f'legacy quiz extractor:      {measure(legacy_quiz_extract_video_id, links):12,.0f} links/s (videos only)')
+
+    disagreements = {}
+    for link in links[:20000]:
+        app_id = legacy_app_extract_video_id(link)
+        quiz_id = legacy_quiz_extract_video_id(link)
+        new_id = classify_link(link).video_id
+        if len({app_id, quiz_id, new_id}) > 1:
+            form = re.sub(r'[\w-]{11,}', 'ID', link)
+            disagreements.setdefault(form, (app_id, quiz_id, new_id))
+
+    print()
+    print('Forms where the extractors disagree (app, quiz, classify_link):')
+    for form, ids in sorted(disagreements.items()):
+        print(f'  {form:<55} {ids}')
+
+if __name__ == '__main__':
+    main()
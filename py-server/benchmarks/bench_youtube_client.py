@@ -0,0 +1,52 @@
+"""
+Microbenchmark for YouTube Data API client setup
+
+Compares the per-request cost of the old approach (calling
+googleapiclient.discovery.build on every request) with the shared per-thread
+client from youtube_api.get_youtube_client. Both variants build a
+videos().list request object but do not send it, so no network access or
+real API key is needed.
+
+Usage (from the py-server directory):
+    python benchmarks/bench_youtube_client.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('YOUTUBE_API_KEY', 'benchmark-key')
+
+from googleapiclient.discovery import build
+import youtube_api
+
+def per_request_build():
+    youtube = build('youtube', 'v3', developerKey=os.environ['YOUTUBE_API_KEY'])
+    return youtube.videos().list(part='snippet,contentDetails,statistics', id='dQw4w9WgXcQ')
+
+def shared_client():
+    youtube = youtube_api.get_youtube_client()
+    return youtube.videos().list(part='snippet,contentDetails,statistics', id='dQw4w9WgXcQ')
+
+def measure(fn, iterations):
+    fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    youtube_api.YOUTUBE_API_KEY = os.environ['YOUTUBE_API_KEY']
+
+    before = measure(per_request_build, iterations)
+    after = measure(shared_client, iterations)
+
+    print(f"Iterations:                {iterations}")
+    print(f"build() per request:       {before:8.3f} ms/request")
+    print(f"shared per-thread client:  {after:8.3f} ms/request")
+    print(f"Speedup:                   {before / after:8.1f}x")
+
+if __name__ == '__main__':
+    main()
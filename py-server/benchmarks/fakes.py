@@ -0,0 +1,418 @@
+"""
+Local stand-ins for the Google services used by the server
+
+One threaded HTTP server answers for three upstreams:
+- the YouTube Data API (/youtube/v3/videos, /playlists, /playlistItems)
+- the YouTube pages read by youtube-transcript-api (/watch, /api/timedtext)
+- the Gemini REST API (/v1beta/models/<model>:generateContent and
+  :streamGenerateContent)
+
+In the default synthetic mode, responses are generated from the request. This
+keeps the same ID giving the same data. Latency, transcript length, playlist
+size and failure rate can be set in FakeSettings. In record mode, requests are
+forwarded to the real services and the responses are saved to a cassette
+file. In replay mode, the saved responses are served back and nothing goes
+over the network.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+UPSTREAMS = {
+    'youtube': 'https://youtube.googleapis.com',
+    'transcripts': 'https://www.youtube.com',
+    'gemini': 'https://generativelanguage.googleapis.com'
+}
+
+# Request headers passed on to the real services in record mode
+FORWARDED_HEADERS = ('Accept-Language', 'If-None-Match', 'Content-Type', 'x-goog-api-key')
+
+# Query parameters left out of cassette keys
+IGNORED_PARAMS = ('key', '$alt')
+
+WORDS = (
+    'energy system model data network signal process value function memory '
+    'structure pattern method result theory example question answer layer '
+    'vector matrix gradient sample error measure cell protein market price'
+).split()
+
+class FakeSettings:
+    """Behaviour of the stand-in services; latencies are in seconds"""
+
+    def __init__(self, youtube_latency=0.02, transcript_latency=0.05, gemini_latency=0.4,
+                 gemini_latency_per_1k_tokens=0.05, jitter=0.2, failure_rate=0.0, transcript_segments=400,
+                 playlist_size=200, seed=1):
+        self.youtube_latency = youtube_latency
+        self.transcript_latency = transcript_latency
+        self.gemini_latency = gemini_latency
+        self.gemini_latency_per_1k_tokens = gemini_latency_per_1k_tokens
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.transcript_segments = transcript_segments
+        self.playlist_size = playlist_size
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+def service_for_path(path):
+    if path.startswith('/youtube/'):
+        return 'youtube'
+    if path.startswith('/v1beta/'):
+        return 'gemini'
+    return 'transcripts'
+
+def make_etag(*parts):
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:27] + '"'
+
+def words_for(seed, count):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+# Synthetic YouTube Data API
+
+def fake_video(video_id):
+    seed = int(hashlib.sha256(video_id.encode()).hexdigest()[:8], 16)
+    return {
+        'kind': 'youtube#video',
+        'etag': make_etag('video', video_id),
+        'id': video_id,
+        'snippet': {
+            'publishedAt': '2023-05-01T12:00:00Z',
+            'channelId': 'UCbenchmark',
+            'title': f'Lecture {seed % 1000}: {words_for(seed, 4)}',
+            'description': words_for(seed + 1, 60),
+            'thumbnails': {
+                'default': {'url': f'https://i.ytimg.com/vi/{video_id}/default.jpg', 'width': 120, 'height': 90},
+                'high': {'url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg', 'width': 480, 'height': 360}
+            },
+            'channelTitle': 'Benchmark Channel',
+            'tags': words_for(seed + 2, 5).split(),
+            'categoryId': '27'
+        },
+        'contentDetails': {'duration': f'PT{seed % 60}M{seed % 59}S', 'dimension': '2d', 'definition': 'hd'},
+        'statistics': {'viewCount': str(seed % 100000), 'likeCount': str(seed % 5000), 'commentCount': str(seed % 300)}
+    }
+
+def playlist_video_id(playlist_id, index):
+    return hashlib.sha256(f'{playlist_id}:{index}'.encode()).hexdigest()[:11]
+
+def youtube_response(path, params, settings):
+    resource = path.rsplit('/', 1)[-1]
+    if resource == 'videos':
+        items = [fake_video(video_id) for video_id in params.get('id', '').split(',') if video_id]
+        return {'kind': 'youtube#videoListResponse', 'etag': make_etag('videos', params.get('id')),
+                'items': items, 'pageInfo': {'totalResults': len(items), 'resultsPerPage': len(items)}}
+
+    if resource == 'playlists':
+        playlist_id = params.get('id', '')
+        return {'kind': 'youtube#playlistListResponse', 'etag': make_etag('playlist', playlist_id), 'items': [{
+            'kind': 'youtube#playlist',
+            'etag': make_etag('playlist-item', playlist_id),
+            'id': playlist_id,
+            'snippet': {
+                'publishedAt': '2023-01-01T00:00:00Z',
+                'title': f'Benchmark playlist {playlist_id}',
+                'description': words_for(playlist_id, 30),
+                'thumbnails': {'high': {'url': 'https://i.ytimg.com/vi/playlist/hqdefault.jpg'}},
+                'channelTitle': 'Benchmark Channel'
+            },
+            'contentDetails': {'itemCount': settings.playlist_size}
+        }]}
+
+    if resource == 'playlistItems':
+        playlist_id = params.get('playlistId', '')
+        page_size = min(int(params.get('maxResults', 5)), 50)
+        offset = int(params.get('pageToken') or 0)
+        indexes = range(offset, min(offset + page_size, settings.playlist_size))
+        response = {
+            'kind': 'youtube#playlistItemListResponse',
+            'etag': make_etag('playlist-page', playlist_id, offset),
+            'items': [{
+                'kind': 'youtube#playlistItem',
+                'etag': make_etag('playlist-entry', playlist_id, index),
+                'id': f'{playlist_id}.{index}',
+                'snippet': {'position': index, 'title': f'Item {index}'},
+                'contentDetails': {'videoId': playlist_video_id(playlist_id, index)}
+            } for index in indexes],
+            'pageInfo': {'totalResults': settings.playlist_size, 'resultsPerPage': page_size}
+        }
+        if offset + page_size < settings.playlist_size:
+            response['nextPageToken'] = str(offset + page_size)
+        return response
+
+    return None
+
+# Synthetic transcript pages
+
+def watch_page(video_id, base_url):
+    captions = {
+        'playerCaptionsTracklistRenderer': {
+            'captionTracks': [{
+                'baseUrl': f'{base_url}/api/timedtext?v={video_id}&lang=en',
+                'name': {'simpleText': 'English'},
+                'languageCode': 'en',
+                'isTranslatable': False
+            }],
+            'translationLanguages': []
+        }
+    }
+    return (
+        '<!DOCTYPE html><html><head><title>Benchmark video</title></head><body><script>'
+        'var ytInitialPlayerResponse = {"playabilityStatus":{"status":"OK"},'
+        f'"captions":{json.dumps(captions)},"videoDetails":{{"videoId":"{video_id}"}}}};'
+        '</script></body></html>'
+    )
+
+def timed_text(video_id, segments):
+    """Auto-caption style XML: rolling lines that repeat the previous words, filler and markers"""
+    rng = random.Random(video_id)
+    lines = ['<?xml version="1.0" encoding="utf-8" ?><transcript>']
+    start = 0.0
+    previous = []
+    for index in range(segments):
+        duration = round(rng.uniform(1.5, 5.0), 2)
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(('um', 'uh', 'you know')))
+        if index % 3 and previous:
+            words = previous[-3:] + words
+        text = ' '.join(words)
+        if index % 40 == 0:
+            text = '[Music] ' + text
+        lines.append(f'<text start="{start:.2f}" dur="{duration}">{text}</text>')
+        previous = words
+        start += duration
+    lines.append('</transcript>')
+    return ''.join(lines)
+
+# Synthetic Gemini
+
+def gemini_text(prompt):
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    match = re.search(r'create exactly (\d+) multiple choice questions', prompt)
+    if match:
+        return json.dumps({'quiz': [{
+            'question': f'Question {index + 1} about section {digest}?',
+            'options': {letter: f'Option {letter} {words_for(digest + letter, 5)}' for letter in 'ABCD'},
+            'correct_answer': 'ABCD'[index % 4],
+            'explanation': words_for(f'{digest}{index}', 20)
+        } for index in range(int(match.group(1)))]}, indent=2)
+
+    sections = [f'## Section {index + 1}\n\n- **{words_for(digest + str(index), 2)}**: {words_for(index, 25)}'
+                for index in range(6)]
+    return f'# Notes {digest}\n\n' + '\n\n'.join(sections)
+
+def gemini_candidate(text):
+    return {'candidates': [{
+        'content': {'parts': [{'text': text}], 'role': 'model'},
+        'finishReason': 1,
+        'index': 0
+    }]}
+
+class Cassette:
+    """Recorded upstream responses keyed by method, path, query and body"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    @staticmethod
+    def key(method, path, params, body):
+        query = urlencode(sorted((name, value) for name, value in params.items() if name not in IGNORED_PARAMS))
+        digest = hashlib.sha256(body).hexdigest()[:16] if body else ''
+        return f'{method} {path}?{query} {digest}'
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, status, content_type, body):
+        with self._lock:
+            self.entries[key] = {'status': status, 'content_type': content_type, 'body': body}
+
+    def save(self):
+        with self._lock, open(self.path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+class FakeServices:
+    """
+    Run the stand-in services on a local port
+
+    mode is 'synthetic', 'record' or 'replay'; record and replay need a
+    cassette path. Use base_url as the API root for every client.
+    """
+
+    def __init__(self, settings=None, mode='synthetic', cassette=None, host='127.0.0.1', port=0):
+        if mode not in ('synthetic', 'record', 'replay'):
+            raise ValueError(f'Unknown mode: {mode}')
+        if mode != 'synthetic' and not cassette:
+            raise ValueError(f'{mode} mode needs a cassette file')
+        self.settings = settings or FakeSettings()
+        self.mode = mode
+        self.cassette = Cassette(cassette) if cassette else None
+        self.requests = {service: 0 for service in UPSTREAMS}
+        self.failures = {service: 0 for service in UPSTREAMS}
+        self.replay_misses = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f'http://{host}:{self.server.server_address[1]}'
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.mode == 'record':
+            self.cassette.save()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'failures': dict(self.failures),
+                    'replay_misses': self.replay_misses}
+
+    def _count(self, service):
+        """Count a request and decide whether it should fail"""
+        with self._lock:
+            self.requests[service] += 1
+            failed = self._random.random() < self.settings.failure_rate
+            if failed:
+                self.failures[service] += 1
+            jitter = 1 + self._random.uniform(-self.settings.jitter, self.settings.jitter)
+        return failed, jitter
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                services.handle(self)
+
+            def do_POST(self):
+                services.handle(self)
+
+        return Handler
+
+    def handle(self, handler):
+        url = urlsplit(handler.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        service = service_for_path(url.path)
+
+        if self.mode == 'synthetic':
+            status, content_type, payload, headers = self.synthetic(service, url.path, params, body, handler.headers)
+        else:
+            status, content_type, payload, headers = self.recorded(service, handler.command, url, params, body,
+                                                                  handler.headers)
+
+        if isinstance(payload, (list, dict)):
+            payload = json.dumps(payload)
+        data = payload.encode() if isinstance(payload, str) else payload
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def synthetic(self, service, path, params, body, request_headers):
+        failed, jitter = self._count(service)
+        latency = {
+            'youtube': self.settings.youtube_latency,
+            'transcripts': self.settings.transcript_latency,
+            'gemini': self.settings.gemini_latency
+        }[service]
+        if service == 'gemini':
+            # Generation time grows with the prompt, at about four characters per token
+            latency += len(body) / 4000 * self.settings.gemini_latency_per_1k_tokens
+        time.sleep(latency * jitter)
+
+        if service == 'youtube':
+            if failed:
+                return 503, 'application/json', {'error': {'code': 503, 'message': 'Backend Error',
+                                                           'errors': [{'reason': 'backendError'}]}}, {}
+            response = youtube_response(path, params, self.settings)
+            if response is None:
+                return 404, 'application/json', {'error': {'code': 404, 'message': 'Not Found'}}, {}
+            if request_headers.get('If-None-Match') == response['etag']:
+                return 304, 'application/json', b'', {'ETag': response['etag']}
+            return 200, 'application/json', response, {'ETag': response['etag']}
+
+        if service == 'transcripts':
+            if failed:
+                return 429, 'text/html', '<html>Too Many Requests</html>', {}
+            if path == '/watch':
+                return 200, 'text/html; charset=utf-8', watch_page(params.get('v', ''), self.base_url), {}
+            if path == '/api/timedtext':
+                return 200, 'text/xml; charset=utf-8', timed_text(params.get('v', ''),
+                                                                   self.settings.transcript_segments), {}
+            return 404, 'text/html', '<html>Not Found</html>', {}
+
+        if failed:
+            return 503, 'application/json', {'error': {'code': 503, 'message': 'The model is overloaded.',
+                                                       'status': 'UNAVAILABLE'}}, {}
+        request = json.loads(body or b'{}')
+        prompt = ''.join(part.get('text', '') for content in request.get('contents', [])
+                         for part in content.get('parts', []))
+        text = gemini_text(prompt)
+        if ':streamGenerateContent' in path:
+            size = max(1, len(text) // 4)
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            return 200, 'application/json', [gemini_candidate(piece) for piece in pieces], {}
+        return 200, 'application/json', gemini_candidate(text), {}
+
+    def recorded(self, service, method, url, params, body, request_headers):
+        key = Cassette.key(method, url.path, params, body)
+        if self.mode == 'replay':
+            entry = self.cassette.get(key)
+            if entry is None:
+                with self._lock:
+                    self.replay_misses += 1
+                return 599, 'text/plain', f'No recorded response for {key}', {}
+            with self._lock:
+                self.requests[service] += 1
+            return entry['status'], entry['content_type'], entry['body'].replace('{base_url}', self.base_url), {}
+
+        import requests
+
+        with self._lock:
+            self.requests[service] += 1
+        headers = {name: request_headers[name] for name in FORWARDED_HEADERS if request_headers.get(name)}
+        upstream = requests.request(method, UPSTREAMS[service] + url.path + (f'?{url.query}' if url.query else ''),
+                                    data=body or None, headers=headers, timeout=120)
+        content_type = upstream.headers.get('Content-Type', 'application/octet-stream')
+        text = upstream.text
+        if service == 'transcripts':
+            # Point caption track URLs at this server so replays stay local
+            text = text.replace(UPSTREAMS['transcripts'], '{base_url}')
+        self.cassette.put(key, upstream.status_code, content_type, text)
+        return upstream.status_code, content_type, text.replace('{base_url}', self.base_url), {}
@@ -0,0 +1,377 @@
+"""
+Load benchmark for the server, run offline against local stand-in services
+
+Starts benchmarks/fakes.py and then app.py in a subprocess pointed at the
+fakes, with a fresh cache directory. It runs each load scenario against the
+video metadata, playlist metadata, notes and quiz routes. For each scenario it
+reports throughput, p50/p95/p99 latency, the error rate and the server's
+memory use.
+
+The numbers depend on the machine, so there is no shared baseline. Each
+machine records its own with --update-baseline (in benchmarks/baselines/,
+which is not committed). Later runs on the same machine are compared with it,
+and the script exits with status 1 when a scenario regresses by more than the
+tolerance. A baseline recorded on a different machine is not compared.
+
+Usage (from the py-server directory):
+    python benchmarks/loadtest.py                      # run and compare with this machine's baseline, if any
+    python benchmarks/loadtest.py --update-baseline    # run and store the results as this machine's baseline
+    python benchmarks/loadtest.py --scenarios quiz,notes --gemini-latency 1.0
+    python benchmarks/loadtest.py --mode record --cassette real.json --video-ids ID1,ID2 --playlist-ids PL1
+    python benchmarks/loadtest.py --mode replay --cassette real.json --video-ids ID1,ID2 --playlist-ids PL1
+
+Record mode needs real YOUTUBE_API_KEY and GEMINI_API_KEY values in the
+environment. Replay mode needs the same IDs and scenarios that were recorded.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeServices, FakeSettings
+
+# Baselines recorded on each machine; they are not committed
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+# Each scenario sends `requests` requests from `concurrency` client threads;
+# params(i, ids) builds the query string of request i
+SCENARIOS = [
+    {
+        'name': 'video_metadata_cold',
+        'path': '/api/video/metadata',
+        'params': lambda i, ids: {'videoId': ids['videos'][i % len(ids['videos'])]},
+        'requests': 400,
+        'concurrency': 16
+    },
+    {
+        'name': 'video_metadata_warm',
+        'path': '/api/video/metadata',
+        'params': lambda i, ids: {'videoId': ids['videos'][i % min(20, len(ids['videos']))]},
+        'requests': 2000,
+        'concurrency': 16
+    },
+    {
+        'name': 'playlist_metadata',
+        'path': '/api/playlist/metadata',
+        'params': lambda i, ids: {'playlistId': ids['playlists'][i % len(ids['playlists'])]},
+        'requests': 40,
+        'concurrency': 8
+    },
+    {
+        'name': 'notes',
+        'path': '/api/notes/generate',
+        'params': lambda i, ids: {'videoId': ids['videos'][i % len(ids['videos'])], 'type': 'summary'},
+        'requests': 48,
+        'concurrency': 8
+    },
+    {
+        'name': 'quiz',
+        'path': '/api/quiz/generate',
+        'params': lambda i, ids: {'videoId': ids['videos'][-1 - i % len(ids['videos'])], 'questions': 4},
+        'requests': 48,
+        'concurrency': 8
+    }
+]
+
+# Metrics compared with the baseline, and whether higher values are better.
+# p50 is left out: on a shared machine it moves too much between runs
+COMPARED = {
+    'throughput_rps': True,
+    'p95_ms': False,
+    'peak_rss_mb': False
+}
+
+def machine_info():
+    """Describe the machine, so results are only compared with a baseline recorded on it"""
+    return {
+        'host': platform.node(),
+        'cpus': os.cpu_count(),
+        'platform': platform.platform(),
+        'python': platform.python_version()
+    }
+
+def default_baseline():
+    return os.path.join(BASELINE_DIR, f'{platform.node() or "local"}.json')
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def read_memory_mb(pid):
+    """Return (current RSS, peak RSS) of a process in MiB, or (None, None) without /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None, None
+    to_mb = lambda name: round(int(fields[name].split()[0]) / 1024, 1) if name in fields else None
+    return to_mb('VmRSS'), to_mb('VmHWM')
+
+def send_request(port, path, params, timeout):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', f'{path}?{urlencode(params)}')
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def run_scenario(port, scenario, ids, timeout):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(scenario['requests']))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = send_request(port, scenario['path'], scenario['params'](i, ids), timeout)
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(scenario['concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if not status.startswith('2'))
+    return {
+        'requests': scenario['requests'],
+        'concurrency': scenario['concurrency'],
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'error_rate': round(errors / max(1, len(latencies)), 4),
+        'statuses': statuses
+    }
+
+def start_app(port, fakes, cache_dir, log_file, server='threaded', extra_env=None):
+    env = dict(
+        os.environ,
+        PYTHONUNBUFFERED='1',
+        CACHE_DIR=cache_dir,
+        YOUTUBE_API_ENDPOINT=fakes.base_url,
+        GEMINI_API_ENDPOINT=fakes.base_url,
+        BENCH_TRANSCRIPT_URL=fakes.base_url,
+        # Every benchmark client is 127.0.0.1; measure the server, not admission control
+        LLM_RATE_LIMIT='0',
+        METADATA_RATE_LIMIT='0',
+        LLM_POOL_SIZE='10000',
+        METADATA_POOL_SIZE='10000',
+        # Prefetching would warm later scenarios; bench_prefetch.py measures it on its own
+        PREFETCH='off'
+    )
+    if fakes.mode != 'record':
+        env.update(YOUTUBE_API_KEY='benchmark-key', GEMINI_API_KEY='benchmark-gemini-key')
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), str(port), server],
+        cwd=SERVER_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_file.name) as f:
+                raise RuntimeError(f'Server exited with status {process.returncode}:\n{f.read()[-2000:]}')
+        try:
+            if send_request(port, '/metrics', {}, 1) == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Server did not start within 30s')
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline"""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get('scenarios', {}).get(name)
+        if not expected:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            if result.get(metric) is None or not expected.get(metric):
+                continue
+            change = (result[metric] - expected[metric]) / expected[metric]
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f'{name}: {metric} {expected[metric]} -> {result[metric]} ({change:+.0%})')
+        if result['error_rate'] > expected.get('error_rate', 0) + 0.01:
+            regressions.append(f'{name}: error_rate {expected.get("error_rate", 0)} -> {result["error_rate"]}')
+    return regressions
+
+def print_results(results):
+    header = f'{"scenario":<22}{"req":>6}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>9}{"rss MB":>9}'
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        print(f'{name:<22}{result["requests"]:>6}{result["throughput_rps"]:>10.1f}{result["p50_ms"]:>10.1f}'
+              f'{result["p95_ms"]:>10.1f}{result["p99_ms"]:>10.1f}{result["error_rate"]:>9.2%}'
+              f'{result["peak_rss_mb"] or 0:>9.1f}')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', help='Comma-separated scenario names (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply the request count of every scenario')
+    parser.add_argument('--mode', choices=('synthetic', 'record', 'replay'), default='synthetic')
+    parser.add_argument('--cassette', help='Recorded responses for record/replay mode')
+    parser.add_argument('--video-ids', help='Comma-separated real video IDs for record/replay mode')
+    parser.add_argument('--playlist-ids', help='Comma-separated real playlist IDs for record/replay mode')
+    parser.add_argument('--youtube-latency', type=float, default=0.02, help='Seconds per YouTube API call')
+    parser.add_argument('--transcript-latency', type=float, default=0.05, help='Seconds per transcript page')
+    parser.add_argument('--gemini-latency', type=float, default=0.4, help='Seconds per Gemini call')
+    parser.add_argument('--gemini-latency-per-1k-tokens', type=float, default=0.05,
+                        help='Extra Gemini seconds per 1000 prompt tokens')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Random latency variation, as a fraction')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of upstream calls that fail')
+    parser.add_argument('--transcript-segments', type=int, default=400, help='Caption segments per video')
+    parser.add_argument('--playlist-size', type=int, default=200, help='Videos per playlist')
+    parser.add_argument('--server', choices=('threaded', 'async', 'gunicorn', 'gunicorn-preload'), default='threaded',
+                        help="Serve with Flask's threaded server, with uvicorn and asgi.py, or with gunicorn")
+    parser.add_argument('--timeout', type=float, default=300, help='Client timeout per request in seconds')
+    parser.add_argument('--baseline', help="Baseline file (default: this machine's, in benchmarks/baselines/)")
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as this machine's baseline")
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed relative regression (default: 0.3)')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    baseline_path = args.baseline or default_baseline()
+    settings = FakeSettings(
+        youtube_latency=args.youtube_latency,
+        transcript_latency=args.transcript_latency,
+        gemini_latency=args.gemini_latency,
+        gemini_latency_per_1k_tokens=args.gemini_latency_per_1k_tokens,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        transcript_segments=args.transcript_segments,
+        playlist_size=args.playlist_size
+    )
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(',')
+        scenarios = [scenario for scenario in SCENARIOS if scenario['name'] in names]
+    scenarios = [dict(scenario, requests=max(1, int(scenario['requests'] * args.scale))) for scenario in scenarios]
+
+    if args.mode == 'synthetic':
+        ids = {
+            'videos': [f'bench{i:06d}' for i in range(max(scenario['requests'] for scenario in scenarios))],
+            'playlists': [f'PLbench{i:04d}' for i in range(10)]
+        }
+    else:
+        ids = {
+            'videos': (args.video_ids or '').split(','),
+            'playlists': (args.playlist_ids or '').split(',')
+        }
+
+    cache_dir = tempfile.mkdtemp(prefix='bench-cache-')
+    log_path = os.path.join(cache_dir, 'server.log')
+    results = {}
+    try:
+        with FakeServices(settings, args.mode, args.cassette) as fakes, open(log_path, 'w') as log_file:
+            port = free_port()
+            process = start_app(port, fakes, cache_dir, log_file, args.server)
+            try:
+                for scenario in scenarios:
+                    print(f'Running {scenario["name"]} ({scenario["requests"]} requests, '
+                          f'concurrency {scenario["concurrency"]})...', flush=True)
+                    result = run_scenario(port, scenario, ids, args.timeout)
+                    result['rss_mb'], result['peak_rss_mb'] = read_memory_mb(process.pid)
+                    results[scenario['name']] = result
+            finally:
+                process.terminate()
+                process.wait(10)
+            upstream = fakes.stats()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print()
+    print_results(results)
+    print(f'\nUpstream calls: {upstream["requests"]}, injected failures: {upstream["failures"]}')
+    if upstream['replay_misses']:
+        print(f'Requests without a recorded response: {upstream["replay_misses"]}')
+
+    report = {
+        'machine': machine_info(),
+        'settings': settings.to_dict(),
+        'mode': args.mode,
+        'server': args.server,
+        'scenarios': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'Baseline written to {baseline_path}')
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f'No baseline for this machine at {baseline_path}; run with --update-baseline to record one')
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != report['machine']:
+        print('Baseline was recorded on a different machine; not comparing')
+        return 0
+    if baseline.get('settings') != report['settings'] or baseline.get('mode') != args.mode:
+        print('Baseline was recorded with different fake service settings; not comparing')
+        return 0
+    if baseline.get('server', 'threaded') != args.server:
+        print(f'Baseline was recorded with the {baseline.get("server", "threaded")} server; not comparing')
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f'\nRegressions beyond {args.tolerance:.0%}:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+    print(f'\nNo regressions beyond {args.tolerance:.0%} against {baseline_path}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Run app.py against the local stand-in services, for the load benchmarks
+
+The YouTube Data API and Gemini endpoints are set with YOUTUBE_API_ENDPOINT
+and GEMINI_API_ENDPOINT by the caller. youtube-transcript-api has no setting
+for its base URL, so BENCH_TRANSCRIPT_URL is applied to the library here
+before the app is imported.
+
+SERVER selects Flask's threaded server (the default), uvicorn with asgi.py,
+or gunicorn with gunicorn.conf.py, without or with preloading.
+
+Usage (from the py-server directory):
+    python benchmarks/serve_app.py PORT [threaded|async|gunicorn|gunicorn-preload]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    port = int(sys.argv[1])
+    server = sys.argv[2] if len(sys.argv) > 2 else 'threaded'
+
+    transcript_url = os.getenv('BENCH_TRANSCRIPT_URL')
+    if transcript_url:
+        from youtube_transcript_api import _transcripts
+        _transcripts.WATCH_URL = transcript_url.rstrip('/') + '/watch?v={video_id}'
+
+    if server in ('gunicorn', 'gunicorn-preload'):
+        # Workers are forked from this process, so they inherit the transcript URL set above
+        from gunicorn.app.wsgiapp import run
+        os.environ['PRELOAD'] = '1' if server == 'gunicorn-preload' else '0'
+        sys.argv = ['gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app']
+        run()
+    elif server == 'async':
+        import uvicorn
+        from asgi import app
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+    else:
+        from app import app
+        app.run(host='127.0.0.1', port=port, threaded=True, debug=False, use_reloader=False)
+
+if __name__ == '__main__':
+    main()
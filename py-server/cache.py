@@ -0,0 +1,193 @@
+"""
+Caching Module for the Python Server
+Provides a tiered cache: an in-memory LRU in front of an on-disk SQLite store
+"""
+
+import os
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Directory where on-disk cache stores are kept
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+def make_cache_key(*parts):
+    """Build a content-addressed cache key from the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, str) else json.dumps(part, sort_keys=True)
+        digest.update(data.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class TieredCache:
+    """
+    Two-level cache for JSON-serializable values
+
+    Lookups go to the in-memory LRU first and fall back to the SQLite store.
+    Every entry has its own TTL. The memory tier is bounded by item count and
+    the disk tier by total payload size (least recently used entries go first).
+    """
+
+    def __init__(self, name, memory_items=256, disk_max_bytes=256 * 1024 * 1024, default_ttl=24 * 3600):
+        self.name = name
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.default_ttl = default_ttl
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0
+        }
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self._db = self._connect()
+        # A SQLite connection must not be used in a forked child, e.g. a prefork worker after preloading
+        os.register_at_fork(after_in_child=self._reopen)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        # Every worker process writes to the same file, so the payload total is
+        # kept in the database by triggers rather than counted per process
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS disk_usage (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                bytes INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries
+            BEGIN UPDATE disk_usage SET bytes = bytes + NEW.size; END
+        """)
+        self._db.execute("""
+            CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries
+            BEGIN UPDATE disk_usage SET bytes = bytes - OLD.size; END
+        """)
+        self._db.execute("INSERT OR IGNORE INTO disk_usage (id, bytes) SELECT 1, COALESCE(SUM(size), 0) FROM entries")
+        self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    def _connect(self):
+        return sqlite3.connect(os.path.join(CACHE_DIR, f"{self.name}.sqlite3"), check_same_thread=False)
+
+    def _reopen(self):
+        self._lock = threading.Lock()
+        self._db = self._connect()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._delete_from_disk(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self._stats["disk_hits"] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key in both tiers"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        payload = json.dumps(value)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._delete_from_disk(key)
+            self._db.execute(
+                "INSERT INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), expires_at, now)
+            )
+            self._evict_disk(now)
+            self._db.commit()
+            self._stats["sets"] += 1
+
+    def delete(self, key):
+        """Remove key from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._delete_from_disk(key)
+            self._db.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_usage()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _delete_from_disk(self, key):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _disk_usage(self):
+        # Payload bytes on disk, including entries written by other processes
+        return self._db.execute("SELECT bytes FROM disk_usage").fetchone()[0]
+
+    def _evict_disk(self, now):
+        # Called inside the write transaction, so other processes cannot change the total meanwhile
+        disk_bytes = self._disk_usage()
+        if disk_bytes <= self.disk_max_bytes:
+            return
+
+        # Expired entries go first, then the least recently used ones
+        expired = self._db.execute(
+            "SELECT key, size FROM entries WHERE expires_at <= ?", (now,)
+        ).fetchall()
+        victims = list(expired)
+        freed = sum(size for _, size in expired)
+        if disk_bytes - freed > self.disk_max_bytes:
+            for key, size in self._db.execute(
+                "SELECT key, size FROM entries WHERE expires_at > ? ORDER BY accessed_at", (now,)
+            ):
+                victims.append((key, size))
+                freed += size
+                if disk_bytes - freed <= self.disk_max_bytes:
+                    break
+
+        for key, size in victims:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+        self._stats["evictions"] += len(victims)
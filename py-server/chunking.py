@@ -0,0 +1,57 @@
+"""
+Transcript Chunking Module
+Splits long transcripts into token-bounded chunks for map-reduce generation
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from transcript import format_timestamp
+
+# Approximate token budget per chunk and number of chunks generated at once
+MAP_CHUNK_TOKENS = int(os.getenv('MAP_CHUNK_TOKENS', 8000))
+MAP_CONCURRENCY = int(os.getenv('MAP_CONCURRENCY', 4))
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate the number of LLM tokens in a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def chunk_segments(transcript, max_tokens=None):
+    """
+    Split a Transcript into chunks of at most max_tokens each
+
+    Chunks always end on a segment boundary, so a single segment larger than
+    the budget becomes a chunk on its own. Each chunk is a dictionary with
+    the sub-transcript it holds and the start time of its first and last segment.
+    """
+    max_tokens = max_tokens or MAP_CHUNK_TOKENS
+    bounds = []
+    first = 0
+    current_tokens = 0
+
+    for index in range(len(transcript)):
+        tokens = (transcript.segment_length(index) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + 1
+        if index > first and current_tokens + tokens > max_tokens:
+            bounds.append((first, index))
+            first = index
+            current_tokens = 0
+        current_tokens += tokens
+
+    if len(transcript) > first:
+        bounds.append((first, len(transcript)))
+
+    starts = transcript.starts
+    return [{
+        "transcript": transcript.slice(first, stop),
+        "start": starts[first],
+        "end": starts[stop - 1],
+        "label": f"{format_timestamp(starts[first])}-{format_timestamp(starts[stop - 1])}"
+    } for first, stop in bounds]
+
+def map_chunks(fn, chunks, concurrency=None):
+    """Apply fn to every chunk in parallel and return the results in chunk order"""
+    concurrency = max(1, min(concurrency or MAP_CONCURRENCY, len(chunks)))
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='map') as executor:
+        return list(executor.map(fn, chunks))
@@ -0,0 +1,140 @@
+"""
+Transcript Compaction Module
+Shrinks transcripts before prompt building by removing caption noise
+"""
+
+import os
+import re
+from chunking import estimate_tokens
+from metrics import Counter, stage
+from transcript import Transcript
+
+# off, light, standard or aggressive
+PROMPT_COMPACTION = os.getenv('PROMPT_COMPACTION', 'light')
+
+COMPACTION_LEVELS = ('off', 'light', 'standard', 'aggressive')
+
+# Shortest word overlap between the end of one caption and the start of the next
+# that is merged; only captions that overlap in time are compared
+MIN_OVERLAP_WORDS = {'light': 3, 'standard': 2, 'aggressive': 1}
+
+# Longest overlap looked for, in words
+MAX_OVERLAP_WORDS = 20
+
+# Non-speech markers: [Music], [Applause], (laughter), ♪ lyrics ♪ and >> speaker changes
+NON_SPEECH = re.compile(
+    r'\[[^\]]{0,40}\]'
+    r'|\((?:[^)]{0,20}\b)?(?:music|applause|laughter|laughs|laughing|inaudible|silence|noise|cheering|crosstalk)\b[^)]{0,20}\)'
+    r'|♪[^♪]{0,200}♪|[♪♫]+|>>+',
+    re.IGNORECASE
+)
+
+# Hesitation sounds; "um", "uhh", "erm", "hmm", "mm-hmm"
+FILLERS = re.compile(r'\b(?:u+h*m+|u+h+|e+r+m+|h+m+|m+-?h+m+|a+h+)\b[,.]?', re.IGNORECASE)
+
+# Verbal tics and stutters, removed only at the aggressive level
+AGGRESSIVE_FILLERS = re.compile(r'\b(?:you know|i mean)\b,?', re.IGNORECASE)
+STUTTERS = re.compile(r'\b(\w+)(?:\s+\1\b)+', re.IGNORECASE)
+
+SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+([,.!?;:])')
+PUNCTUATION_RUN = re.compile(r'[,;:]+([.!?])|([,;:])[,;:]+')
+
+compaction_tokens = Counter(
+    'prompt_compaction_tokens_total', 'Estimated transcript tokens before and after compaction',
+    labels=('level', 'state')
+)
+
+def compact_text(text, level):
+    """Remove non-speech markers and filler from one caption"""
+    text = NON_SPEECH.sub(' ', text)
+    if level in ('standard', 'aggressive'):
+        text = FILLERS.sub(' ', text)
+    if level == 'aggressive':
+        text = AGGRESSIVE_FILLERS.sub(' ', text)
+        text = STUTTERS.sub(r'\1', text)
+    text = SPACE_BEFORE_PUNCTUATION.sub(r'\1', ' '.join(text.split()))
+    text = PUNCTUATION_RUN.sub(lambda match: match.group(1) or match.group(2), text)
+    return text.strip(' ,')
+
+def overlap_words(previous, current, min_words):
+    """Number of leading words of current that repeat the end of previous"""
+    longest = min(len(previous), len(current), MAX_OVERLAP_WORDS)
+    for size in range(longest, min_words - 1, -1):
+        if previous[-size:] == current[:size]:
+            return size
+    return 0
+
+def compact_transcript(transcript, level=None):
+    """
+    Return a compacted copy of a Transcript and its before/after statistics
+
+    Every level drops non-speech markers, normalizes whitespace and merges
+    captions that repeat the end of the previous caption while it is still
+    on screen (rolling auto-captions); captions that follow each other in
+    time are kept whole, so a repeated phrase is never cut. "standard" also
+    drops hesitation sounds. "aggressive" also drops "you know"/"I mean" and
+    repeated words, and merges shorter overlaps. Segments left empty are
+    removed; the others keep their start times.
+    """
+    level = level or PROMPT_COMPACTION
+    if level not in COMPACTION_LEVELS:
+        raise ValueError(f"Unknown compaction level: {level}")
+
+    tokens_before = estimate_tokens(transcript.clean_text)
+    if level == 'off':
+        return transcript, {
+            "level": level,
+            "segments_before": len(transcript),
+            "segments_after": len(transcript),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_before
+        }
+
+    with stage('compact'):
+        min_overlap = MIN_OVERLAP_WORDS[level]
+        items = []
+        previous_words = []
+        previous_end = float('-inf')
+        for index in range(len(transcript)):
+            text = compact_text(transcript.segment_text(index), level)
+            if not text:
+                continue
+
+            start = transcript.starts[index]
+            rolling = start < previous_end
+            previous_end = max(previous_end, start + transcript.durations[index])
+
+            words = text.split()
+            folded = [word.lower().strip(',.!?') for word in words]
+            overlap = overlap_words(previous_words, folded, min_overlap) if rolling else 0
+            if overlap == len(words):
+                # Nothing new: a duplicate or the tail of the previous caption
+                continue
+            if overlap:
+                text = ' '.join(words[overlap:])
+                folded = folded[overlap:]
+
+            items.append({
+                "text": text,
+                "start": start,
+                "duration": transcript.durations[index]
+            })
+            previous_words = (previous_words + folded)[-MAX_OVERLAP_WORDS:]
+
+        compacted = Transcript.from_items(items)
+        if not len(compacted):
+            # Nothing but markers and filler; send it as it was rather than an empty prompt
+            compacted = transcript
+
+    stats = {
+        "level": level,
+        "segments_before": len(transcript),
+        "segments_after": len(compacted),
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(compacted.clean_text)
+    }
+    compaction_tokens.inc(level, 'before', amount=stats["tokens_before"])
+    compaction_tokens.inc(level, 'after', amount=stats["tokens_after"])
+    print(f"🗜️ Compacted transcript ({level}): {stats['tokens_before']} -> {stats['tokens_after']} tokens, "
+          f"{stats['segments_before']} -> {stats['segments_after']} segments")
+    return compacted, stats
@@ -0,0 +1,178 @@
+"""
+Shared Gemini Client Module
+One lazily configured Gemini client per process, with per-task model choice,
+a limit on concurrent calls and per-call timeouts
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+from metrics import stage, llm_prompt_chars, llm_response_chars
+from subsystems import lazy_import, mark_warm, register_warm_up
+import upstream
+
+# Load environment variables
+load_dotenv()
+
+# Set Gemini API key from environment
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', "")
+
+# Default model, and a cheaper/faster model for short outputs
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-pro')
+GEMINI_FAST_MODEL = os.getenv('GEMINI_FAST_MODEL', GEMINI_MODEL)
+
+# Alternative API root and transport (grpc or rest), e.g. for the local stand-in used by the load benchmarks
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or ('rest' if GEMINI_API_ENDPOINT else None)
+
+# Maximum Gemini calls in flight per process, and seconds allowed per call
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 8))
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 120))
+
+# Model used by each task unless overridden with GEMINI_MODEL_<TASK>, e.g. GEMINI_MODEL_NOTES_SUMMARY
+TASK_MODELS = {
+    'quiz': GEMINI_MODEL,
+    'notes_comprehensive': GEMINI_MODEL,
+    'notes_summary': GEMINI_FAST_MODEL,
+    'notes_key_points': GEMINI_FAST_MODEL,
+    'notes_study_guide': GEMINI_MODEL
+}
+
+_lock = threading.Lock()
+_configured = False
+_models = {}
+_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini')
+
+def get_model_name(task):
+    """Return the Gemini model name configured for a task"""
+    return os.getenv(f'GEMINI_MODEL_{task.upper()}') or TASK_MODELS.get(task, GEMINI_MODEL)
+
+def get_model(model_name):
+    """Return the shared GenerativeModel for model_name, importing and configuring the SDK on first use"""
+    global _configured
+    with _lock:
+        if not _configured:
+            api_key = GEMINI_API_KEY
+            if not api_key or api_key == "your-gemini-api-key-here":
+                raise ValueError("Failed to initialize Gemini API: Gemini API key not configured")
+            started = time.perf_counter()
+            genai = lazy_import('gemini', 'google.generativeai')
+            genai.configure(
+                api_key=api_key,
+                transport=GEMINI_TRANSPORT,
+                client_options={'api_endpoint': GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None
+            )
+            _configured = True
+            mark_warm('gemini', time.perf_counter() - started)
+            print(f"✅ Using Gemini API key: {api_key[:5]}...{api_key[-4:] if len(api_key) > 9 else ''}")
+
+        model = _models.get(model_name)
+        if model is None:
+            model = lazy_import('gemini', 'google.generativeai').GenerativeModel(model_name)
+            _models[model_name] = model
+        return model
+
+def warm_up():
+    """Import the SDK, configure the API and create the models for every task ahead of the first request"""
+    for model_name in {get_model_name(task) for task in TASK_MODELS}:
+        get_model(model_name)
+    lazy_import('gemini', 'google.generativeai.client').get_default_generative_client()
+    print(f"🔥 Gemini client warmed up ({', '.join(sorted(_models))})")
+
+register_warm_up('gemini', warm_up, modules=('google.generativeai',))
+
+class GeminiBusy(TimeoutError):
+    """Raised when no call slot frees up in time; says nothing about Gemini's health, so it is not retried"""
+    retryable = False
+
+def _acquire_slot(timeout):
+    if not _slots.acquire(timeout=max(0, timeout)):
+        raise GeminiBusy(f"No Gemini call slot became free within {timeout:.0f}s")
+
+def _wait(future, deadline, timeout, what):
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        raise upstream.UpstreamTimeout(f"Gemini {what} timed out after {timeout:g}s")
+
+def _generate_once(model, prompt, deadline):
+    timeout = deadline - time.monotonic()
+    _acquire_slot(timeout)
+    try:
+        future = _executor.submit(model.generate_content, prompt)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return _wait(future, deadline, timeout, 'call')
+
+def generate_content(prompt, task, timeout=None):
+    """
+    Call Gemini for a task and return the response
+
+    At most GEMINI_MAX_CONCURRENCY calls run at once; the timeout covers
+    waiting for a slot and the call itself, retries included. A call that
+    times out keeps its slot until Gemini actually answers, so the limit
+    stays honest. Transient errors are retried and counted by the Gemini
+    circuit breaker (see upstream.py).
+    """
+    timeout = timeout or GEMINI_TIMEOUT
+    deadline = time.monotonic() + timeout
+    model = get_model(get_model_name(task))
+
+    llm_prompt_chars.observe(len(prompt), task)
+    with stage('llm'):
+        response = upstream.gemini.call(_generate_once, model, prompt, deadline, deadline=timeout)
+    
+    llm_response_chars.observe(len(response.text), task)
+    return response
+
+def stream_content(prompt, task, timeout=None):
+    """
+    Call Gemini for a task in streaming mode, yielding text pieces
+
+    Holds one concurrency slot until the stream ends. Opening the stream and
+    reading each piece run on the Gemini executor, and each wait is bounded
+    by what is left of the timeout, so a stream that stalls cannot hold its
+    slot forever. A read still stuck at the timeout keeps the slot until it
+    returns, as in generate_content.
+    """
+    timeout = timeout or GEMINI_TIMEOUT
+    deadline = time.monotonic() + timeout
+    model = get_model(get_model_name(task))
+
+    _acquire_slot(timeout)
+    llm_prompt_chars.observe(len(prompt), task)
+    response_chars = 0
+    pending = None
+
+    def open_stream():
+        nonlocal pending
+        pending = _executor.submit(lambda: iter(model.generate_content(prompt, stream=True)))
+        return _wait(pending, deadline, timeout, 'stream')
+
+    try:
+        with stage('llm'):
+            # Only opening the stream is retried; text already sent cannot be taken back
+            chunks = upstream.gemini.call(open_stream, deadline=timeout)
+            try:
+                while True:
+                    pending = _executor.submit(next, chunks, None)
+                    chunk = _wait(pending, deadline, timeout, 'stream')
+                    if chunk is None:
+                        break
+                    if chunk.text:
+                        response_chars += len(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                upstream.gemini.record_failure(e)
+                raise
+    finally:
+        if pending is not None and not pending.done():
+            pending.add_done_callback(lambda _: _slots.release())
+        else:
+            _slots.release()
+        llm_response_chars.observe(response_chars, task)
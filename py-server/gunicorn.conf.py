@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for production
+Prefork worker processes, each serving the Flask app from a thread pool
+
+Run from the py-server directory:
+    gunicorn app:app
+    PRELOAD=1 gunicorn app:app
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+With PRELOAD=1 the app and the SDKs are imported once in the master process
+before the workers are forked, so workers start faster and share those
+modules' memory. Clients, connections and threads are still created in each
+worker after the fork.
+
+Admission pools, rate limits and in-memory caches are per worker, so each
+limit is multiplied by the number of workers (see admission.py).
+"""
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+preload_app = os.getenv('PRELOAD', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Generation requests wait up to JOB_WAIT_TIMEOUT for their job
+timeout = int(float(os.getenv('JOB_WAIT_TIMEOUT', 180))) + 30
+graceful_timeout = 30
+keepalive = 5
+
+def when_ready(server):
+    if preload_app:
+        import subsystems
+        subsystems.preload()
+        server.log.info("Preloaded SDKs: %s", ', '.join(
+            f"{name} {state['importSeconds']:.3f}s" for name, state in subsystems.status().items()
+        ))
+
+def post_worker_init(worker):
+    import subsystems
+    subsystems.start_warm_up()
@@ -0,0 +1,212 @@
+"""
+HTTP Caching Module for the Python Server
+ETags, conditional requests, per-route Cache-Control and response compression
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+import brotli
+from metrics import Counter
+
+# Seconds clients and proxies may reuse metadata and search responses
+HTTP_METADATA_MAX_AGE = int(os.getenv('HTTP_METADATA_MAX_AGE', 300))
+HTTP_SEARCH_MAX_AGE = int(os.getenv('HTTP_SEARCH_MAX_AGE', 60))
+
+# Seconds clients may reuse generated notes, quizzes and study packs
+HTTP_ARTIFACT_MAX_AGE = int(os.getenv('HTTP_ARTIFACT_MAX_AGE', 24 * 3600))
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+
+# Bytes of compressed response bodies kept in memory, by ETag
+COMPRESSED_CACHE_BYTES = int(os.getenv('COMPRESSED_CACHE_BYTES', 32 * 1024 * 1024))
+
+# Compression levels: fast by default, best for generated artifacts, which
+# are compressed once and served many times
+GZIP_LEVEL, GZIP_BEST_LEVEL = 6, 9
+BROTLI_QUALITY, BROTLI_BEST_QUALITY = 6, 11
+
+METADATA_POLICY = f'public, max-age={HTTP_METADATA_MAX_AGE}'
+ARTIFACT_POLICY = f'public, max-age={HTTP_ARTIFACT_MAX_AGE}'
+
+# Cache-Control by route; routes not listed are not stored
+CACHE_POLICIES = {
+    '/api/video/metadata': METADATA_POLICY,
+    '/api/video/metadata/batch': METADATA_POLICY,
+    '/api/playlist/metadata': METADATA_POLICY,
+    '/api/search': f'public, max-age={HTTP_SEARCH_MAX_AGE}',
+    '/api/notes/generate': ARTIFACT_POLICY,
+    '/api/quiz/generate': ARTIFACT_POLICY,
+    '/api/studypack/generate': ARTIFACT_POLICY,
+    '/api/jobs/<job_id>': 'private, no-cache'
+}
+DEFAULT_POLICY = 'no-store'
+
+# Generated results missing questions or parts (set by the handler); kept out
+# of caches so the next request generates what is missing
+INCOMPLETE_POLICY = 'no-store'
+
+# Routes whose bodies are generated artifacts, which do not change once
+# generated and are compressed with the slower, best settings
+ARTIFACT_ROUTES = ('/api/notes/generate', '/api/quiz/generate', '/api/studypack/generate')
+
+# Content codings in order of preference
+ENCODINGS = ('br', 'gzip')
+
+http_responses = Counter(
+    'http_responses_total', 'Responses by route, content coding and conditional result',
+    labels=('endpoint', 'encoding', 'result')
+)
+
+class CompressedCache:
+    """In-memory LRU of compressed bodies keyed by (ETag, content coding), bounded by total bytes"""
+
+    def __init__(self, max_bytes=COMPRESSED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["items"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+compressed_cache = CompressedCache()
+
+def make_etag(content):
+    """Weak ETag from a hash of the uncompressed body, so every content coding shares it"""
+    return 'W/"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches etag, using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:]
+    return any(tag.strip().removeprefix('W/') == opaque for tag in if_none_match.split(','))
+
+def choose_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, or None for the identity coding"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best = None
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+    return best[0] if best else None
+
+def compress(content, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_BEST_QUALITY if best else BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_BEST_LEVEL if best else GZIP_LEVEL, mtime=0)
+
+def cache_policy(endpoint, status, refresh=False):
+    """Cache-Control for a response; errors and ?refresh=true responses are not stored"""
+    if status >= 400 or refresh:
+        return DEFAULT_POLICY
+    return CACHE_POLICIES.get(endpoint, DEFAULT_POLICY)
+
+def metadata_policy(age, fresh_for):
+    """
+    Cache-Control for metadata served from the server's cache
+
+    The response also carries Age, and downstream caches keep it for
+    max-age minus Age, so max-age is the entry's age plus what is left of
+    its TTL (at most HTTP_METADATA_MAX_AGE). Entries already past their TTL,
+    served while they are refreshed, get max-age=0.
+    """
+    if fresh_for <= 0:
+        return 'public, max-age=0'
+    return f'public, max-age={int(age) + int(min(fresh_for, HTTP_METADATA_MAX_AGE))}'
+
+def finalize_response(endpoint, method, status, content, headers, accept_encoding=None, if_none_match=None,
+                      refresh=False):
+    """
+    Add validators, Cache-Control and a content coding to a buffered response
+
+    headers holds the response headers (a dict, or Flask's Headers) and is
+    updated in place. Returns the (status, content) to send: 304 with an
+    empty body when If-None-Match matches the body's ETag, and otherwise the
+    body, compressed with the client's preferred coding if it is a large
+    enough success response.
+    """
+    headers.setdefault('Cache-Control', cache_policy(endpoint, status, refresh))
+
+    etag = None
+    if status == 200 and method in ('GET', 'HEAD'):
+        etag = headers.setdefault('ETag', make_etag(content))
+        if etag_matches(if_none_match, etag):
+            http_responses.inc(endpoint, 'identity', 'not_modified')
+            headers.pop('Content-Length', None)
+            return 304, b''
+
+    if len(content) < COMPRESS_MIN_BYTES or not 200 <= status < 300 or 'Content-Encoding' in headers:
+        http_responses.inc(endpoint, 'identity', 'sent')
+        return status, content
+
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        http_responses.inc(endpoint, 'identity', 'sent')
+        return status, content
+
+    if etag is not None and headers['Cache-Control'] != DEFAULT_POLICY:
+        # The same body is usually served again, e.g. a cached playlist or
+        # artifact, so its compressed form is kept under its ETag
+        compressed = compressed_cache.get((etag, encoding))
+        if compressed is None:
+            compressed = compress(content, encoding, best=endpoint in ARTIFACT_ROUTES)
+            compressed_cache.set((etag, encoding), compressed)
+    else:
+        compressed = compress(content, encoding)
+
+    headers['Content-Encoding'] = encoding
+    headers['Content-Length'] = str(len(compressed))
+    http_responses.inc(endpoint, encoding, 'sent')
+    return status, compressed
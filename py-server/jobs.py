@@ -0,0 +1,166 @@
+"""
+Background Jobs Module for the Python Server
+Runs quiz and notes generation on a bounded worker pool
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit"""
+
+class Job:
+    """A unit of work submitted to the JobManager"""
+
+    def __init__(self, kind, params, key=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        # queued -> running -> succeeded | failed (unsuccessful result) | error (exception)
+        self.status = "queued"
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_done_callback(self, fn):
+        """Call fn(job) once the job has finished, right away if it already has"""
+        with self._callbacks_lock:
+            if not self.done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self):
+        with self._callbacks_lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def to_dict(self):
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "result": self.result
+        }
+
+class JobManager:
+    """
+    Bounded worker pool with a queue depth limit and job expiry
+
+    Jobs are functions returning the usual {"success": ..., ...} result
+    dictionaries. Finished jobs are kept for job_ttl seconds so clients can
+    collect their results, then dropped. Jobs submitted with a key share the
+    unfinished job with the same key, so identical requests take one worker.
+    """
+
+    def __init__(self, max_workers=4, max_queue=100, job_ttl=3600):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._by_key = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, params, fn, *args, key=None, inline=False, on_done=None):
+        """
+        Queue fn(*args) as a job; raises JobQueueFull when the queue is at its limit
+
+        With a key, an unfinished job with the same key is returned instead
+        of a new one. inline=True runs the job in the calling thread, without
+        queuing, for work known to be quick such as a cached result.
+        on_done(job) is called when a new job finishes.
+        """
+        job = Job(kind, params, key)
+        with self._lock:
+            self._expire_jobs()
+            existing = self._by_key.get(key) if key is not None else None
+            if existing is not None:
+                return existing
+            if not inline and self._active >= self.max_workers + self.max_queue:
+                raise JobQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+            self._active += 1
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job
+        if on_done:
+            job.add_done_callback(on_done)
+        if inline:
+            self._run(job, fn, args)
+        else:
+            self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        """Return the job with this ID, or None if it is unknown or expired"""
+        with self._lock:
+            self._expire_jobs()
+            return self._jobs.get(job_id)
+
+    def has_job(self, key):
+        """Whether a job with this key is queued or running"""
+        with self._lock:
+            return key in self._by_key
+
+    def wait(self, job, timeout=None):
+        """Wait for job to finish; returns False if the timeout passed first"""
+        return job.done.wait(timeout)
+
+    def active(self):
+        """Number of jobs queued or running"""
+        return self._active
+
+    def stats(self):
+        """Return worker pool and queue counters"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "queue_limit": self.max_queue,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "finished": len(statuses) - statuses.count("queued") - statuses.count("running")
+        }
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args)
+            job.status = "succeeded" if job.result.get("success", False) else "failed"
+        except Exception as e:
+            job.result = {
+                "success": False,
+                "error": {
+                    "type": "SERVER_ERROR",
+                    "message": str(e)
+                }
+            }
+            job.status = "error"
+        job.finished_at = time.time()
+        with self._lock:
+            self._active -= 1
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        job._finish()
+
+    def _expire_jobs(self):
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
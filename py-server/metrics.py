@@ -0,0 +1,190 @@
+"""
+Metrics Module for the Python Server
+Minimal Prometheus-style counters, gauges and histograms rendered in the text
+exposition format. Recording a value is a dictionary lookup and an addition
+under a lock, so it is cheap enough for the request hot path.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+
+# Latency buckets in seconds, from fast cache hits to long Gemini calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+# Size buckets in characters, for prompts and model responses
+SIZE_BUCKETS = (1000, 4000, 16000, 64000, 256000, 1000000, 4000000)
+
+_registry = []
+_collectors = []
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}'
+                for labels, value in items]
+
+class Counter(_Metric):
+    """A value that only goes up"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(_Metric):
+    """A value that can go up and down"""
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager that observes the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def _render_items(self, items):
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {count}')
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+def register_collector(fn):
+    """Register fn() returning extra exposition lines, called only when /metrics is scraped"""
+    _collectors.append(fn)
+    return fn
+
+def render_family(name, kind, documentation, samples):
+    """Render (labels dict, value) samples as one metric family, for collectors"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+    return lines
+
+def render():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+# Metrics shared across modules
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Latency of HTTP requests by route',
+    labels=('endpoint', 'method', 'status')
+)
+requests_in_flight = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', labels=('endpoint',)
+)
+stage_duration = Histogram(
+    'stage_duration_seconds',
+    'Latency of processing stages (transcript_fetch, compact, clean, prompt_build, llm, parse, youtube_api)',
+    labels=('stage',)
+)
+errors_total = Counter(
+    'errors_total', 'Error responses by endpoint and error.type', labels=('endpoint', 'type')
+)
+llm_prompt_chars = Histogram(
+    'llm_prompt_chars', 'Size of prompts sent to Gemini in characters', labels=('task',), buckets=SIZE_BUCKETS
+)
+cache_responses = Counter(
+    'http_cache_responses_total', 'Metadata responses by X-Cache status', labels=('endpoint', 'status')
+)
+llm_response_chars = Histogram(
+    'llm_response_chars', 'Size of Gemini responses in characters', labels=('task',), buckets=SIZE_BUCKETS
+)
+first_request_duration = Gauge(
+    'first_request_duration_seconds', 'Latency of the first request to each route in this process',
+    labels=('endpoint',)
+)
+app_import_seconds = Gauge('app_import_seconds', 'Seconds spent importing app.py and its modules')
+
+_first_requests = set()
+
+def record_request(seconds, endpoint, method, status):
+    """Observe a request's latency, and keep the first one per route"""
+    request_duration.observe(seconds, endpoint, method, status)
+    if endpoint not in _first_requests:
+        _first_requests.add(endpoint)
+        first_request_duration.set(endpoint, value=round(seconds, 6))
+
+def stage(name):
+    """Time a processing stage: `with stage('clean'): ...`"""
+    return stage_duration.time(name)
@@ -3,145 +3,268 @@ AI Notes Generator for YouTube Videos
 Uses Google Gemini AI to generate structured notes based on video transcripts
 """
 
-import os
 from dotenv import load_dotenv
-import google.generativeai as genai
-from quiz import extract_video_id, get_transcript, clean_transcript_text
+from quiz import get_transcript, clean_transcript_text, artifact_cache, run_in_flight
+from youtube_urls import extract_video_id
+from cache import make_cache_key
+from gemini_client import generate_content, stream_content, get_model_name
+from chunking import chunk_segments, map_chunks
+from transcript import Transcript
+from compaction import compact_transcript
+from metrics import stage
+import upstream
 
 # Load environment variables
 load_dotenv()
 
-# Set Gemini API key from environment
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', "")
+# Bump when any notes prompt changes so cached notes are regenerated
+NOTES_PROMPT_VERSION = 1
 
-def initialize_gemini():
-    """Initialize the Google Gemini API client"""
-    try:
-        api_key = GEMINI_API_KEY
-        if not api_key or api_key == "your-gemini-api-key-here":
-            raise ValueError("Gemini API key not configured")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-pro')
-        print(f"✅ Using Gemini API key: {api_key[:5]}...{api_key[-4:] if len(api_key) > 9 else ''}")
-        return model
-    except Exception as e:
-        raise ValueError(f"Failed to initialize Gemini API: {str(e)}")
+# Different prompts based on note type
+NOTE_PROMPTS = {
+    "comprehensive": """
+        Create comprehensive notes from this video transcript. 
+        Format the notes with clear sections, bullet points, and hierarchical organization.
+        Include all important concepts, definitions, examples, and relationships.
+        
+        Structure your response in markdown format with:
+        - Main topic headings (##)
+        - Subtopics (###)
+        - Bullet points for details
+        - Numbered lists for sequential information
+        - Bold for important terms
+        - Include a brief summary at the beginning
+    """,
+
+    "summary": """
+        Create a concise summary of this video transcript.
+        Focus on the main ideas and conclusions only.
+        Keep it brief but comprehensive, capturing the essence of the content.
+        
+        Format your response in markdown with:
+        - A title (# Summary)
+        - 3-5 bullet points of key takeaways
+        - A 1-2 paragraph summary of the content
+    """,
+
+    "key_points": """
+        Extract just the key points from this video transcript.
+        Focus on facts, statistics, definitions, and essential concepts.
+        
+        Format your response in markdown as a list of key points with:
+        - ## Key Points
+        - Bullet points for each important piece of information
+        - Bold for terms, numbers, or dates
+        - Group related points under ### subheadings if appropriate
+    """,
 
-def generate_notes(transcript_text, note_type="comprehensive"):
+    "study_guide": """
+        Create a study guide from this video transcript.
+        Format it as a learning resource with sections for:
+        
+        ## Summary (brief overview)
+        ## Key Concepts (definitions and explanations)
+        ## Important Facts (bullet points)
+        ## Relationships (how concepts connect)
+        ## Sample Questions (3-5 questions to test understanding)
+        
+        Use markdown formatting with appropriate headings, bullet points, 
+        and emphasis for important terms.
+    """
+}
+
+def build_notes_prompt(clean_text, note_type):
+    """Build the Gemini prompt for the given note type"""
+    # Default to comprehensive if type not found
+    prompt_template = NOTE_PROMPTS.get(note_type, NOTE_PROMPTS["comprehensive"])
+    
+    # Build the full prompt
+    return f"""
+        {prompt_template}
+        
+        VIDEO TRANSCRIPT:
+        {clean_text}
+        """
+
+def build_reduce_prompt(chunks, partial_notes, note_type):
+    """Build the prompt that merges per-chunk notes into one set of notes"""
+    prompt_template = NOTE_PROMPTS.get(note_type, NOTE_PROMPTS["comprehensive"])
+    parts = "\n\n".join(
+        f"PART {i + 1} ({chunk['label']}):\n{notes}"
+        for i, (chunk, notes) in enumerate(zip(chunks, partial_notes))
+    )
+    
+    return f"""
+        The notes below were written for consecutive parts of one video transcript, in order.
+        Merge them into a single document that follows these instructions, removing
+        repetition between parts and keeping the order of topics:
+        
+        {prompt_template}
+        
+        PARTIAL NOTES:
+        {parts}
+        """
+
+def prepare_notes_prompt(transcript, clean_text, note_type, refresh=False):
+    """
+    Build the prompt for a transcript
+    
+    Transcripts given as a Transcript that exceed the chunk budget go through a
+    map step first: notes are generated (and cached) per chunk in parallel,
+    and the returned prompt asks Gemini to merge them.
+    """
+    if isinstance(transcript, Transcript):
+        chunks = chunk_segments(transcript)
+        if len(chunks) > 1:
+            print(f"🧩 Generating {note_type} notes from {len(chunks)} transcript chunks")
+            results = map_chunks(lambda chunk: generate_notes(chunk["transcript"], note_type, refresh), chunks)
+            for result in results:
+                if not result["success"]:
+                    raise ValueError(result["error"]["message"])
+            with stage('prompt_build'):
+                return build_reduce_prompt(chunks, [result["data"]["notes"] for result in results], note_type)
+    
+    with stage('prompt_build'):
+        return build_notes_prompt(clean_text, note_type)
+
+def summarize_transcript(clean_text):
+    """Describe the transcript that notes were generated from"""
+    return {
+        "length": len(clean_text),
+        "sample": clean_text[:200] + "..." if len(clean_text) > 200 else clean_text
+    }
+
+def generate_notes(transcript_text, note_type="comprehensive", refresh=False):
     """
     Generate structured notes from video transcript
     
     Parameters:
-    - transcript_text: The transcript text from the video
+    - transcript_text: The transcript text or Transcript of the video; long
+      Transcripts are split into chunks and merged (map-reduce)
     - note_type: Type of notes to generate (comprehensive, summary, key_points, study_guide)
+    - refresh: Skip the generated-notes cache and generate new notes
     
     Returns:
     - Dictionary with success flag and generated notes or error
     """
     try:
-        model = initialize_gemini()
-        clean_text = clean_transcript_text(transcript_text)
-        
-        # Different prompts based on note type
-        prompts = {
-            "comprehensive": """
-                Create comprehensive notes from this video transcript. 
-                Format the notes with clear sections, bullet points, and hierarchical organization.
-                Include all important concepts, definitions, examples, and relationships.
-                
-                Structure your response in markdown format with:
-                - Main topic headings (##)
-                - Subtopics (###)
-                - Bullet points for details
-                - Numbered lists for sequential information
-                - Bold for important terms
-                - Include a brief summary at the beginning
-            """,
-            
-            "summary": """
-                Create a concise summary of this video transcript.
-                Focus on the main ideas and conclusions only.
-                Keep it brief but comprehensive, capturing the essence of the content.
-                
-                Format your response in markdown with:
-                - A title (# Summary)
-                - 3-5 bullet points of key takeaways
-                - A 1-2 paragraph summary of the content
-            """,
-            
-            "key_points": """
-                Extract just the key points from this video transcript.
-                Focus on facts, statistics, definitions, and essential concepts.
-                
-                Format your response in markdown as a list of key points with:
-                - ## Key Points
-                - Bullet points for each important piece of information
-                - Bold for terms, numbers, or dates
-                - Group related points under ### subheadings if appropriate
-            """,
-            
-            "study_guide": """
-                Create a study guide from this video transcript.
-                Format it as a learning resource with sections for:
-                
-                ## Summary (brief overview)
-                ## Key Concepts (definitions and explanations)
-                ## Important Facts (bullet points)
-                ## Relationships (how concepts connect)
-                ## Sample Questions (3-5 questions to test understanding)
-                
-                Use markdown formatting with appropriate headings, bullet points, 
-                and emphasis for important terms.
-            """
-        }
+        with stage('clean'):
+            clean_text = clean_transcript_text(transcript_text)
+        cache_key = make_cache_key('notes', NOTES_PROMPT_VERSION, get_model_name(f'notes_{note_type}'), note_type, clean_text)
+        if not refresh:
+            cached = artifact_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        # Default to comprehensive if type not found
-        prompt_template = prompts.get(note_type, prompts["comprehensive"])
-        
-        # Build the full prompt
-        prompt = f"""
-        {prompt_template}
-        
-        VIDEO TRANSCRIPT:
-        {clean_text}
-        """
+        prompt = prepare_notes_prompt(transcript_text, clean_text, note_type, refresh)
         
         print(f"🤖 Generating {note_type} notes using Google Gemini...")
-        response = model.generate_content(prompt)
+        response = generate_content(prompt, f'notes_{note_type}')
         notes_content = response.text.strip()
         
-        return {
+        result = {
             "success": True,
             "data": {
                 "notes": notes_content,
                 "note_type": note_type,
-                "transcript_summary": {
-                    "length": len(clean_text),
-                    "sample": clean_text[:200] + "..." if len(clean_text) > 200 else clean_text
-                }
+                "transcript_summary": summarize_transcript(clean_text)
             }
         }
+        artifact_cache.set(cache_key, result)
+        return result
         
     except Exception as e:
         return {
             "success": False,
             "error": {
-                "type": "SERVER_ERROR",
+                "type": upstream.error_type(e),
                 "message": f"Failed to generate notes: {str(e)}"
             }
         }
 
+def stream_notes(transcript_text, note_type="comprehensive", refresh=False):
+    """
+    Generate notes from a video transcript, yielding events as Gemini produces them
+    
+    Yields dictionaries:
+    - {"event": "chunk", "text": ...} for each piece of markdown
+    - {"event": "done", "data": {"note_type": ..., "transcript_summary": ...}} at the end
+    - {"event": "error", "error": {...}} if generation fails
+    """
+    try:
+        with stage('clean'):
+            clean_text = clean_transcript_text(transcript_text)
+        cache_key = make_cache_key('notes', NOTES_PROMPT_VERSION, get_model_name(f'notes_{note_type}'), note_type, clean_text)
+        if not refresh:
+            cached = artifact_cache.get(cache_key)
+            if cached is not None:
+                yield {"event": "chunk", "text": cached["data"]["notes"]}
+                yield {"event": "done", "data": {
+                    "note_type": note_type,
+                    "transcript_summary": cached["data"]["transcript_summary"]
+                }}
+                return
+        
+        prompt = prepare_notes_prompt(transcript_text, clean_text, note_type, refresh)
+        
+        print(f"🤖 Streaming {note_type} notes using Google Gemini...")
+        parts = []
+        for text in stream_content(prompt, f'notes_{note_type}'):
+            parts.append(text)
+            yield {"event": "chunk", "text": text}
+        
+        summary = summarize_transcript(clean_text)
+        artifact_cache.set(cache_key, {
+            "success": True,
+            "data": {
+                "notes": "".join(parts).strip(),
+                "note_type": note_type,
+                "transcript_summary": summary
+            }
+        })
+        yield {"event": "done", "data": {"note_type": note_type, "transcript_summary": summary}}
+        
+    except Exception as e:
+        yield {
+            "event": "error",
+            "error": {
+                "type": upstream.error_type(e),
+                "message": f"Failed to generate notes: {str(e)}"
+            }
+        }
+
+def stream_notes_for_video(video_id_or_url, note_type="comprehensive", refresh=False):
+    """Fetch the transcript for a YouTube video and stream notes for it"""
+    transcript_result = get_transcript(video_id_or_url)
+    if not transcript_result["success"]:
+        yield {"event": "error", "error": transcript_result["error"]}
+        return
+    
+    compacted, _ = compact_transcript(transcript_result["data"]["transcript"])
+    yield from stream_notes(compacted, note_type, refresh)
+
+def notes_key(video_id_or_url, note_type="comprehensive"):
+    """Identify a notes request; generate_notes_for_video adds the refresh flag for its single-flight key"""
+    return ('notes', extract_video_id(video_id_or_url) or video_id_or_url, note_type)
+
 # Main function to generate notes for a video
-def generate_notes_for_video(video_id_or_url, note_type="comprehensive"):
+def generate_notes_for_video(video_id_or_url, note_type="comprehensive", refresh=False):
     """Main function to generate notes for a YouTube video"""
+    return run_in_flight(
+        notes_key(video_id_or_url, note_type) + (refresh,),
+        lambda: build_notes_for_video(video_id_or_url, note_type, refresh)
+    )
+
+def build_notes_for_video(video_id_or_url, note_type="comprehensive", refresh=False):
+    """Fetch the transcript and generate notes for a YouTube video"""
     # Step 1: Get the transcript
     transcript_result = get_transcript(video_id_or_url)
     if not transcript_result["success"]:
         return transcript_result
     
-    # Step 2: Generate the notes
-    transcript_text = transcript_result["data"]["formatted"]
-    notes_result = generate_notes(transcript_text, note_type)
+    # Step 2: Compact the transcript and generate the notes (map-reduce for long transcripts)
+    compacted, _ = compact_transcript(transcript_result["data"]["transcript"])
+    notes_result = generate_notes(compacted, note_type, refresh)
     
     # Return the result
     if notes_result["success"]:
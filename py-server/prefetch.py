@@ -0,0 +1,215 @@
+"""
+Prefetch Module for the Python Server
+Background prefetching of transcripts, and optional pre-generation of notes
+and quizzes, for recently imported and recently viewed videos
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from metrics import Counter
+from quiz import get_transcript, generate_quiz_for_video
+from notes import generate_notes_for_video
+
+# What to prepare in the background: "off", or a comma-separated list of
+# transcripts, notes and quiz (notes and quiz also fetch the transcript)
+PREFETCH = os.getenv('PREFETCH', 'transcripts')
+
+# Background threads, i.e. the most prefetch tasks (and Gemini calls) running at once
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 1))
+
+# Seconds of background work allowed per hour, across all workers
+PREFETCH_BUDGET_SECONDS = float(os.getenv('PREFETCH_BUDGET_SECONDS', 600))
+
+# Pending tasks kept; the lowest-priority tasks are dropped beyond this
+PREFETCH_QUEUE_LIMIT = int(os.getenv('PREFETCH_QUEUE_LIMIT', 200))
+
+# Videos prepared from the start of each imported playlist
+PREFETCH_PLAYLIST_VIDEOS = int(os.getenv('PREFETCH_PLAYLIST_VIDEOS', 3))
+
+# Note type and number of quiz questions that are pre-generated (the endpoints' defaults)
+PREFETCH_NOTE_TYPE = os.getenv('PREFETCH_NOTE_TYPE', 'comprehensive')
+PREFETCH_QUIZ_QUESTIONS = int(os.getenv('PREFETCH_QUIZ_QUESTIONS', 4))
+
+# Seconds between checks while live requests are being served
+YIELD_POLL_INTERVAL = 0.5
+
+# Priorities: lower runs first. Viewed videos come before playlist imports,
+# transcripts before generation, and earlier playlist positions first
+PRIORITY_VIEWED = 0
+PRIORITY_PLAYLIST = 10
+GENERATION_OFFSET = 100
+
+prefetch_tasks = Counter(
+    'prefetch_tasks_total', 'Background prefetch tasks by kind and result', labels=('kind', 'result')
+)
+
+def prefetch_kinds(setting=None):
+    """Task kinds enabled by the PREFETCH setting"""
+    setting = (PREFETCH if setting is None else setting).strip().lower()
+    if setting in ('', 'off', 'none', '0', 'false'):
+        return ()
+    kinds = [kind.strip() for kind in setting.split(',')]
+    return tuple(kind for kind in ('transcript', 'notes', 'quiz') if kind in kinds or kind + 's' in kinds)
+
+class PrefetchScheduler:
+    """
+    Priority queue of background preparation tasks
+
+    Each task runs one of the functions the endpoints use (get_transcript,
+    generate_notes_for_video, generate_quiz_for_video), so results land in
+    the same transcript and artifact caches, and a live request for a video
+    that is being prepared joins the running call. Tasks wait while busy()
+    reports live work, and stop being started once the hourly time budget is
+    spent. Queued tasks can be cancelled; a running task finishes and its
+    result is cached.
+    """
+
+    def __init__(self, kinds=(), workers=1, budget_seconds=600, queue_limit=200, busy=None):
+        self.kinds = tuple(kinds)
+        self.workers = workers
+        self.budget_seconds = budget_seconds
+        self.queue_limit = queue_limit
+        self.busy = busy or (lambda: False)
+
+        self._heap = []
+        self._pending = {}
+        self._running = set()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._budget = budget_seconds
+        self._budget_updated = time.monotonic()
+        self._stats = {"scheduled": 0, "completed": 0, "failed": 0, "cancelled": 0, "dropped": 0, "yields": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.kinds) and self.workers > 0 and self.budget_seconds > 0
+
+    def schedule_video(self, video_id, priority=PRIORITY_VIEWED):
+        """Queue the enabled tasks for a video"""
+        if not self.enabled or not video_id:
+            return
+        with self._condition:
+            for kind in self.kinds:
+                offset = GENERATION_OFFSET if kind != 'transcript' else 0
+                self._push((kind, video_id), priority + offset)
+            self._start_workers()
+            self._condition.notify_all()
+
+    def schedule_playlist(self, video_ids, limit=None):
+        """Queue the first videos of an imported playlist"""
+        limit = PREFETCH_PLAYLIST_VIDEOS if limit is None else limit
+        for position, video_id in enumerate(video_ids[:limit]):
+            self.schedule_video(video_id, PRIORITY_PLAYLIST + position)
+
+    def cancel(self, video_id=None):
+        """Drop queued tasks for a video, or all queued tasks; returns how many were dropped"""
+        with self._condition:
+            keys = [key for key in self._pending if video_id is None or key[1] == video_id]
+            for key in keys:
+                del self._pending[key]
+            self._stats["cancelled"] += len(keys)
+            for kind, _ in keys:
+                prefetch_tasks.inc(kind, 'cancelled')
+            if video_id is None:
+                self._heap = []
+            return len(keys)
+
+    def stats(self):
+        with self._condition:
+            self._refill_budget()
+            return dict(
+                self._stats,
+                kinds=list(self.kinds),
+                queued=len(self._pending),
+                running=len(self._running),
+                budget_seconds=self.budget_seconds,
+                budget_remaining_seconds=round(self._budget, 3)
+            )
+
+    def _push(self, key, priority):
+        current = self._pending.get(key)
+        if key in self._running or (current is not None and current <= priority):
+            return
+        if current is None:
+            if len(self._pending) >= self.queue_limit:
+                worst = max(self._pending, key=self._pending.get)
+                if self._pending[worst] <= priority:
+                    self._stats["dropped"] += 1
+                    prefetch_tasks.inc(key[0], 'dropped')
+                    return
+                del self._pending[worst]
+                self._stats["dropped"] += 1
+                prefetch_tasks.inc(worst[0], 'dropped')
+            self._stats["scheduled"] += 1
+        self._pending[key] = priority
+        # Newer tasks go first among equal priorities; stale heap entries are skipped when popped
+        heapq.heappush(self._heap, (priority, -next(self._sequence), key))
+
+    def _start_workers(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'prefetch-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _refill_budget(self):
+        now = time.monotonic()
+        self._budget = min(
+            self.budget_seconds,
+            self._budget + (now - self._budget_updated) * self.budget_seconds / 3600
+        )
+        self._budget_updated = now
+
+    def _next_task(self):
+        """Wait for a task that may run now and mark it running"""
+        with self._condition:
+            while True:
+                while self._heap and self._pending.get(self._heap[0][2]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                self._refill_budget()
+                if self._budget <= 0:
+                    # Wait until the budget has refilled enough for the deficit
+                    self._condition.wait(-self._budget * 3600 / self.budget_seconds + 1)
+                    continue
+                if self.busy():
+                    self._stats["yields"] += 1
+                    self._condition.wait(YIELD_POLL_INTERVAL)
+                    continue
+
+                _, _, key = heapq.heappop(self._heap)
+                del self._pending[key]
+                self._running.add(key)
+                return key
+
+    def _work(self):
+        while True:
+            key = self._next_task()
+            kind, video_id = key
+            started = time.monotonic()
+            try:
+                if kind == 'transcript':
+                    result = get_transcript(video_id)
+                elif kind == 'notes':
+                    result = generate_notes_for_video(video_id, PREFETCH_NOTE_TYPE)
+                else:
+                    result = generate_quiz_for_video(video_id, PREFETCH_QUIZ_QUESTIONS)
+                outcome = 'completed' if result.get('success') else 'failed'
+            except Exception as e:
+                print(f"⚠️ Prefetch {kind} for {video_id} failed: {str(e)}")
+                outcome = 'failed'
+
+            with self._condition:
+                self._running.discard(key)
+                self._refill_budget()
+                self._budget -= time.monotonic() - started
+                self._stats[outcome] += 1
+            prefetch_tasks.inc(kind, outcome)
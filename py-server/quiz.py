@@ -4,102 +4,196 @@ Uses Google Gemini AI to generate quizzes based on video transcripts
 """
 
 import re
-import json
 import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-import google.generativeai as genai
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from cache import TieredCache, make_cache_key
+from gemini_client import stream_content, get_model_name
+from singleflight import SingleFlight
+from metrics import Counter, stage, stage_duration
+from chunking import chunk_segments, map_chunks
+from transcript import Transcript
+from compaction import compact_transcript
+from quiz_parser import QuizStreamParser, validate_question
+from subsystems import lazy_import, mark_warm, register_warm_up
+from youtube_urls import extract_video_id
+from search import transcript_index
+import upstream
 
 # Load environment variables
 load_dotenv()
 
-# Set Gemini API key from environment or use default
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', "")
+# Bump when the quiz prompt changes so cached quizzes are regenerated
+QUIZ_PROMPT_VERSION = 2
 
-def initialize_gemini():
-    """Initialize the Google Gemini API client"""
-    try:
-        api_key = GEMINI_API_KEY
-        if not api_key or api_key == "your-gemini-api-key-here":
-            raise ValueError("Gemini API key not configured")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-pro')
-        print(f"✅ Using Gemini API key: {api_key[:5]}...{api_key[-4:] if len(api_key) > 9 else ''}")
-        return model
-    except Exception as e:
-        raise ValueError(f"Failed to initialize Gemini API: {str(e)}")
+# Follow-up calls made to replace missing or invalid quiz questions
+QUIZ_REPAIR_ATTEMPTS = int(os.getenv('QUIZ_REPAIR_ATTEMPTS', 1))
+
+# Transcript cache settings (TTLs in seconds)
+TRANSCRIPT_CACHE_TTL = int(os.getenv('TRANSCRIPT_CACHE_TTL', 7 * 24 * 3600))
+TRANSCRIPT_UNAVAILABLE_TTL = int(os.getenv('TRANSCRIPT_UNAVAILABLE_TTL', 6 * 3600))
+
+transcript_cache = TieredCache(
+    'transcripts',
+    memory_items=int(os.getenv('TRANSCRIPT_CACHE_MEMORY_ITEMS', 256)),
+    disk_max_bytes=int(os.getenv('TRANSCRIPT_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    default_ttl=TRANSCRIPT_CACHE_TTL
+)
+
+# Seconds a merged request waits for the identical request already in flight
+IN_FLIGHT_TIMEOUT = float(os.getenv('IN_FLIGHT_TIMEOUT', 120))
+
+# Concurrent identical transcript fetches and generations share one upstream call
+in_flight = SingleFlight()
 
-def extract_video_id(url):
-    """Extract the video ID from a YouTube URL"""
-    if not url:
-        return None
+# Generations (keyed without the refresh flag) whose last result was complete,
+# remembered for as long as their transcript stays cached so admission control
+# can tell a repeat request will be served without calling Gemini
+RECENT_GENERATIONS = int(os.getenv('RECENT_GENERATIONS', 10000))
+_recent_generations = OrderedDict()
+_recent_lock = threading.Lock()
+
+quiz_questions = Counter('quiz_questions_total', 'Quiz questions received from Gemini by outcome', labels=('result',))
+
+# Generated quizzes and notes, keyed by a hash of everything that shapes the output
+artifact_cache = TieredCache(
+    'artifacts',
+    memory_items=int(os.getenv('ARTIFACT_CACHE_MEMORY_ITEMS', 128)),
+    disk_max_bytes=int(os.getenv('ARTIFACT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    default_ttl=int(os.getenv('ARTIFACT_CACHE_TTL', 30 * 24 * 3600))
+)
+
+def get_transcript(video_id_or_url):
+    """Fetch the transcript for a YouTube video, serving repeat requests from the cache"""
+    video_id = extract_video_id(video_id_or_url)
+    if not video_id:
+        return {
+            "success": False,
+            "error": {
+                "type": "PARSING_ERROR",
+                "message": "Invalid YouTube URL or video ID"
+            }
+        }
     
-    url = url.strip()
-    patterns = [
-        r"(?:v=|\/)([0-9A-Za-z_-]{11})",
-        r"youtu\.be\/([0-9A-Za-z_-]{11})",
-        r"youtube\.com\/embed\/([0-9A-Za-z_-]{11})",
-        r"youtube\.com\/watch\?v=([0-9A-Za-z_-]{11})",
-        r"youtube\.com\/live\/([0-9A-Za-z_-]{11})"
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
+    cached = transcript_cache.get(transcript_cache_key(video_id))
+    if cached is not None:
+        result = load_transcript_result(cached)
+        if video_id not in transcript_index:
+            # Transcripts cached before the search index existed, or indexed by another worker
+            index_transcript(video_id, result, replace=False)
+        return result
     
-    # If it's just a video ID (11 characters)
-    if re.match(r'^[a-zA-Z0-9_-]{11}$', url):
-        return url
-        
-    return None
-
-def format_transcript_item(item):
-    """Format a transcript item for display"""
-    if hasattr(item, '_dict_'):
-        item_dict = item._dict_
-        text = item_dict.get('text', '')
-        start = item_dict.get('start', 0)
-    elif isinstance(item, dict):
-        text = item.get('text', '')
-        start = item.get('start', 0)
-    else:
-        try:
-            text = item.text
-            start = item.start
-        except AttributeError:
-            text = str(item)
-            start = 0
-    return text, start
+    return run_in_flight(('transcript', video_id), lambda: fetch_and_cache_transcript(video_id))
 
-def get_transcript(video_id_or_url):
-    """Fetch the transcript for a YouTube video"""
+def fetch_and_cache_transcript(video_id):
+    """Fetch a transcript from YouTube and store the outcome in the transcript cache"""
+    with stage('transcript_fetch'):
+        result = fetch_transcript(video_id)
+    
+    # Cache transcripts and "no transcript" answers; other errors may be transient
+    if result["success"]:
+        transcript_cache.set(transcript_cache_key(video_id), {
+            "success": True,
+            "data": {"transcript": result["data"]["transcript"].to_dict()}
+        })
+        index_transcript(video_id, result)
+    elif result["error"]["type"] == "TRANSCRIPT_UNAVAILABLE":
+        transcript_cache.set(transcript_cache_key(video_id), result, ttl=TRANSCRIPT_UNAVAILABLE_TTL)
+    
+    return result
+
+def index_transcript(video_id, result, replace=True):
+    """Add a fetched transcript to the search index; a failure only costs search coverage"""
+    if not result["success"]:
+        return
     try:
-        video_id = extract_video_id(video_id_or_url)
-        if not video_id:
-            return {
-                "success": False,
-                "error": {
-                    "type": "PARSING_ERROR",
-                    "message": "Invalid YouTube URL or video ID"
-                }
+        transcript_index.add(video_id, result["data"]["transcript"], replace=replace)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not index transcript for {video_id}: {str(e)}")
+
+def transcript_cache_key(video_id):
+    """Cache key of a video's transcript; entries hold the columnar Transcript form"""
+    return f"transcript:{video_id}"
+
+def load_transcript_result(cached):
+    """Turn a cached transcript result back into one holding a Transcript"""
+    if not cached["success"]:
+        return cached
+    return {
+        "success": True,
+        "data": {"transcript": Transcript.from_dict(cached["data"]["transcript"])}
+    }
+
+def run_in_flight(key, fn):
+    """Run fn once for all concurrent callers with the same key"""
+    try:
+        return in_flight.do(key, fn, timeout=IN_FLIGHT_TIMEOUT)
+    except TimeoutError as e:
+        return {
+            "success": False,
+            "error": {
+                "type": "TIMEOUT",
+                "message": str(e)
             }
-        
+        }
+
+def remember_generation(key):
+    """Record that the artifacts for a generation key are cached"""
+    with _recent_lock:
+        _recent_generations.pop(key, None)
+        _recent_generations[key] = time.monotonic()
+        while len(_recent_generations) > RECENT_GENERATIONS:
+            _recent_generations.popitem(last=False)
+
+def is_generation_cached(key):
+    """Whether a complete result for a generation key was generated recently"""
+    with _recent_lock:
+        generated_at = _recent_generations.get(key)
+        if generated_at is None:
+            return False
+        if time.monotonic() - generated_at >= TRANSCRIPT_CACHE_TTL:
+            del _recent_generations[key]
+            return False
+        return True
+
+def load_transcript_api():
+    """Import youtube-transcript-api on first use"""
+    transcript_api = lazy_import('transcripts', 'youtube_transcript_api')
+    mark_warm('transcripts')
+    return transcript_api
+
+register_warm_up('transcripts', load_transcript_api, modules=('youtube_transcript_api',))
+
+def fetch_transcript(video_id):
+    """Fetch the transcript for a YouTube video ID from YouTube"""
+    transcript_api = load_transcript_api()
+    try:
         print(f"🔍 Extracting transcript for video ID: {video_id}")
         
         try:
             # Try to get English transcript first
-            transcript_data = YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'en-US', 'en-GB'])
+            transcript_data = upstream.transcripts.call(
+                transcript_api.YouTubeTranscriptApi.get_transcript, video_id,
+                languages=['en', 'en-US', 'en-GB'], hedge=True
+            )
             print("✅ English transcript found!")
-        except NoTranscriptFound:
+        except transcript_api.NoTranscriptFound:
             # Try to get any available transcript
             try:
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+                transcript_list = upstream.transcripts.call(
+                    transcript_api.YouTubeTranscriptApi.list_transcripts, video_id, hedge=True
+                )
                 for transcript in transcript_list:
                     try:
-                        transcript_data = transcript.fetch()
+                        transcript_data = upstream.transcripts.call(transcript.fetch, hedge=True)
                         print(f"✅ Found transcript in {transcript.language_code}")
                         break
-                    except Exception:
+                    except Exception as e:
+                        if upstream.is_transient(e):
+                            raise
                         continue
                 else:
                     return {
@@ -110,6 +204,9 @@ def get_transcript(video_id_or_url):
                         }
                     }
             except Exception as e:
+                # Only a definite answer is reported (and cached) as unavailable
+                if upstream.is_transient(e):
+                    raise
                 return {
                     "success": False,
                     "error": {
@@ -118,22 +215,9 @@ def get_transcript(video_id_or_url):
                     }
                 }
         
-        # Format the transcript
-        formatted_transcript = []
-        raw_transcript = []
-        
-        for item in transcript_data:
-            text, start = format_transcript_item(item)
-            if text and text.strip():
-                timestamp = f"[{int(start // 60):02d}:{int(start % 60):02d}]"
-                formatted_transcript.append(f"{timestamp} {text.strip()}")
-                raw_transcript.append({
-                    "text": text.strip(),
-                    "start": start,
-                    "timestamp": f"{int(start // 60):02d}:{int(start % 60):02d}"
-                })
+        transcript = Transcript.from_items(transcript_data)
         
-        if not formatted_transcript:
+        if not len(transcript):
             return {
                 "success": False,
                 "error": {
@@ -145,12 +229,11 @@ def get_transcript(video_id_or_url):
         return {
             "success": True,
             "data": {
-                "formatted": "\n".join(formatted_transcript),
-                "raw": raw_transcript
+                "transcript": transcript
             }
         }
         
-    except TranscriptsDisabled:
+    except transcript_api.TranscriptsDisabled:
         return {
             "success": False,
             "error": {
@@ -162,19 +245,23 @@ def get_transcript(video_id_or_url):
         return {
             "success": False,
             "error": {
-                "type": "SERVER_ERROR",
+                "type": upstream.error_type(e),
                 "message": f"Error: {str(e)}"
             }
         }
 
 def clean_transcript_text(transcript):
     """Clean the transcript text for quiz generation"""
+    # A Transcript already holds its text without timestamps
+    if isinstance(transcript, Transcript):
+        return transcript.clean_text
+    
     # For formatted transcript with timestamps
     if isinstance(transcript, str):
         lines = transcript.split('\n')
         cleaned_text = []
         for line in lines:
-            text = re.sub(r'\[\d{2}:\d{2}\]', '', line).strip()
+            text = re.sub(r'\[\d+:\d{2}\]', '', line).strip()
             if text:
                 cleaned_text.append(text)
         return ' '.join(cleaned_text)
@@ -185,21 +272,21 @@ def clean_transcript_text(transcript):
     
     return ""
 
-def generate_mcq_quiz(transcript_text, num_questions=4):
-    """Generate a multiple-choice quiz using Google Gemini AI"""
-    try:
-        model = initialize_gemini()
-        clean_text = clean_transcript_text(transcript_text)
-        
-        # No transcript length limit since Gemini can handle it
-        prompt = f"""Based on the following video transcript, create exactly {num_questions} multiple choice questions (MCQs) in English. Each question should have 4 options (A, B, C, D) with only one correct answer.
+def build_quiz_prompt(clean_text, num_questions=4, exclude=()):
+    """Build the Gemini prompt for a multiple-choice quiz, avoiding the questions in exclude"""
+    avoid = ""
+    if exclude:
+        avoid = "\nDo not repeat or rephrase these existing questions:\n" + "\n".join(f"- {q}" for q in exclude) + "\n"
+    
+    # No transcript length limit since Gemini can handle it
+    return f"""Based on the following video transcript, create exactly {num_questions} multiple choice questions (MCQs) in English. Each question should have 4 options (A, B, C, D) with only one correct answer.
 
 The questions should:
 1. Test understanding of key concepts from the video
 2. Be clear and well-structured
 3. Have plausible wrong answers (distractors)
 4. Cover different parts of the content
-
+{avoid}
 IMPORTANT: Respond ONLY with a valid JSON object in this exact format:
 {{
   "quiz": [
@@ -220,83 +307,189 @@ IMPORTANT: Respond ONLY with a valid JSON object in this exact format:
 
 Video Transcript:
 {clean_text}"""
+
+def iter_quiz_questions(prompt):
+    """Stream a quiz prompt to Gemini, yielding (question, error) as each question object completes"""
+    parser = QuizStreamParser()
+    parse_seconds = 0.0
+    try:
+        for text in stream_content(prompt, 'quiz'):
+            started = time.perf_counter()
+            items = parser.feed(text)
+            parse_seconds += time.perf_counter() - started
+            for item in items:
+                yield validate_question(item)
+    finally:
+        stage_duration.observe(parse_seconds, 'parse')
+
+def collect_quiz_questions(prompt, num_questions, questions, outcome='valid'):
+    """
+    Add valid questions from a streamed quiz response to questions, up to num_questions
+
+    Invalid and duplicate questions are dropped. The stream is closed as soon
+    as enough questions have arrived. If the stream fails after some
+    questions were collected, those are kept so they can be topped up.
+    """
+    seen = {question["question"].lower() for question in questions}
+    try:
+        for question, error in iter_quiz_questions(prompt):
+            if error:
+                quiz_questions.inc('invalid')
+                print(f"⚠️ Dropped quiz question: {error}")
+            elif question["question"].lower() in seen:
+                quiz_questions.inc('duplicate')
+            else:
+                seen.add(question["question"].lower())
+                questions.append(question)
+                quiz_questions.inc(outcome)
+            if len(questions) >= num_questions:
+                break
+    except Exception as e:
+        if not questions:
+            raise
+        print(f"⚠️ Quiz response ended early: {str(e)}")
+
+def generate_mcq_quiz(transcript_text, num_questions=4, refresh=False):
+    """Generate a multiple-choice quiz using Google Gemini AI
+
+    Results are cached by content; refresh=True skips the cache lookup and
+    stores the newly generated quiz in its place.
+    """
+    try:
+        with stage('clean'):
+            clean_text = clean_transcript_text(transcript_text)
+        cache_key = make_cache_key('quiz', QUIZ_PROMPT_VERSION, get_model_name('quiz'), num_questions, clean_text)
+        if not refresh:
+            cached = artifact_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        with stage('prompt_build'):
+            prompt = build_quiz_prompt(clean_text, num_questions)
         
         print("🤖 Generating quiz questions using Google Gemini...")
-        response = model.generate_content(prompt)
-        quiz_content = response.text.strip()
+        questions = []
+        collect_quiz_questions(prompt, num_questions, questions)
         
-        # Clean up the response to extract valid JSON
-        if quiz_content.startswith('```json'):
-            quiz_content = quiz_content[7:]
-        if quiz_content.startswith('```'):
-            quiz_content = quiz_content[3:]
-        if quiz_content.endswith('```'):
-            quiz_content = quiz_content[:-3]
-        quiz_content = quiz_content.strip()
+        # Regenerate only the missing or invalid questions, in a small follow-up call
+        for _ in range(QUIZ_REPAIR_ATTEMPTS):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            print(f"🔧 Regenerating {missing} missing or invalid quiz question(s)...")
+            with stage('prompt_build'):
+                repair_prompt = build_quiz_prompt(clean_text, missing, exclude=[q["question"] for q in questions])
+            collect_quiz_questions(repair_prompt, num_questions, questions, outcome='repaired')
         
-        try:
-            quiz_data = json.loads(quiz_content)
+        if not questions:
             return {
-                "success": True,
-                "data": quiz_data
-            }
-        except json.JSONDecodeError:
-            # Try to extract JSON from response if it's not properly formatted
-            json_match = re.search(r'\{.*\}', quiz_content, re.DOTALL)
-            if json_match:
-                try:
-                    quiz_data = json.loads(json_match.group())
-                    return {
-                        "success": True,
-                        "data": quiz_data
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        "success": False,
-                        "error": {
-                            "type": "PARSING_ERROR",
-                            "message": "Could not parse quiz data from response"
-                        }
-                    }
-            else:
-                return {
-                    "success": False,
-                    "error": {
-                        "type": "PARSING_ERROR",
-                        "message": "Could not find valid JSON in response"
-                    }
+                "success": False,
+                "error": {
+                    "type": "PARSING_ERROR",
+                    "message": "Could not parse any valid quiz questions from response"
                 }
+            }
+        
+        result = {
+            "success": True,
+            "data": {
+                "quiz": questions
+            }
+        }
+        # A quiz still short of questions is not cached, so the next request tries again
+        if len(questions) == num_questions:
+            artifact_cache.set(cache_key, result)
+        return result
     except Exception as e:
         return {
             "success": False,
             "error": {
-                "type": "SERVER_ERROR",
+                "type": upstream.error_type(e),
                 "message": f"Failed to generate quiz: {str(e)}"
             }
         }
 
+def generate_chunked_quiz(transcript, num_questions=4, refresh=False, max_tokens=None, concurrency=None):
+    """
+    Generate a quiz for a long transcript with map-reduce
+    
+    Short transcripts go through generate_mcq_quiz in one call. Long ones are
+    split into token-bounded chunks at segment boundaries, the questions are
+    spread evenly over the chunks, and each chunk gets its own (cached) quiz
+    in parallel. The reduce step joins the questions in video order.
+    """
+    chunks = chunk_segments(transcript, max_tokens)
+    if len(chunks) <= 1:
+        return generate_mcq_quiz(transcript, num_questions, refresh)
+    
+    count = len(chunks)
+    quotas = [(i + 1) * num_questions // count - i * num_questions // count for i in range(count)]
+    selected = [(chunk, quota) for chunk, quota in zip(chunks, quotas) if quota > 0]
+    print(f"🧩 Generating quiz from {len(selected)} of {count} transcript chunks")
+    results = map_chunks(
+        lambda item: generate_mcq_quiz(item[0]["transcript"], item[1], refresh),
+        selected, concurrency
+    )
+    
+    # Reduce: keep each chunk's share of questions in video order, dropping duplicates
+    seen = set()
+    questions = []
+    for (chunk, quota), result in zip(selected, results):
+        if not result["success"]:
+            continue
+        for question in result["data"].get("quiz", [])[:quota]:
+            text = question.get("question", "").strip().lower() if isinstance(question, dict) else ""
+            if text and text not in seen:
+                seen.add(text)
+                questions.append(question)
+    
+    failed = next((result for result in results if not result["success"]), None)
+    if not questions and failed:
+        return failed
+    
+    return {
+        "success": True,
+        "data": {
+            "quiz": questions
+        }
+    }
+
+def quiz_key(video_id_or_url, num_questions=4):
+    """Identify a quiz request; generate_quiz_for_video adds the refresh flag for its single-flight key"""
+    return ('quiz', extract_video_id(video_id_or_url) or video_id_or_url, num_questions)
+
 # Main function to generate a quiz for a video
-def generate_quiz_for_video(video_id_or_url, num_questions=4):
+def generate_quiz_for_video(video_id_or_url, num_questions=4, refresh=False):
     """Main function to generate a quiz for a YouTube video"""
+    return run_in_flight(
+        quiz_key(video_id_or_url, num_questions) + (refresh,),
+        lambda: build_quiz_for_video(video_id_or_url, num_questions, refresh)
+    )
+
+def build_quiz_for_video(video_id_or_url, num_questions=4, refresh=False):
+    """Fetch the transcript and generate a quiz for a YouTube video"""
     # Step 1: Get the transcript
     transcript_result = get_transcript(video_id_or_url)
     if not transcript_result["success"]:
         return transcript_result
     
-    # Step 2: Generate the quiz
-    transcript_text = transcript_result["data"]["formatted"]
-    quiz_result = generate_mcq_quiz(transcript_text, num_questions)
+    # Step 2: Compact the transcript and generate the quiz (map-reduce for long transcripts)
+    transcript = transcript_result["data"]["transcript"]
+    compacted, compaction = compact_transcript(transcript)
+    quiz_result = generate_chunked_quiz(compacted, num_questions, refresh)
     
     # Return the result
     if quiz_result["success"]:
+        length = transcript.formatted_length
         return {
             "success": True,
             "data": {
                 "quiz": quiz_result["data"],
                 "transcript_summary": {
-                    "length": len(transcript_text),
-                    "segments": len(transcript_result["data"]["raw"]),
-                    "sample": transcript_text[:200] + "..." if len(transcript_text) > 200 else transcript_text
+                    "length": length,
+                    "segments": len(transcript),
+                    "sample": transcript.formatted_prefix(200) + "..." if length > 200 else transcript.formatted,
+                    "compaction": compaction
                 }
             }
         }
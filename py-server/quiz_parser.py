@@ -0,0 +1,144 @@
+"""
+Quiz Parser Module
+Extracts and validates quiz questions from Gemini output as it streams in
+"""
+
+import re
+import json
+
+OPTION_KEYS = ('A', 'B', 'C', 'D')
+
+# Start of the questions array: '"quiz": [' or a bare '[' followed by an object
+ARRAY_START = re.compile(r'\[(?=\s*\{)')
+
+# Trailing commas and // comments (as in the prompt's example) that json.loads rejects
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+LINE_COMMENT = re.compile(r'^\s*//.*$', re.MULTILINE)
+
+# correct_answer given as "B", "(B)", "Option B" or "Answer: B", or starting with "B) "
+ANSWER_LETTER = re.compile(r'^(?:OPTION\s+|ANSWER\s*:?\s*)?\(?([A-D])\)?[.:]?$')
+ANSWER_PREFIX = re.compile(r'^\(?([A-D])[).:]\s')
+
+class QuizStreamParser:
+    """
+    Incremental parser for the quiz JSON returned by Gemini
+
+    feed() takes the response text piece by piece and returns each question
+    object as soon as its closing brace arrives, so questions can be checked
+    before the response is complete. Code fences and text around the JSON
+    are skipped. Objects that are not valid JSON even after removing
+    trailing commas and comments are returned as None.
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._position = 0
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    def feed(self, text):
+        """Add a piece of model output and return the question objects it completed"""
+        self._text += text
+        if self._finished:
+            return []
+
+        if not self._in_array:
+            match = ARRAY_START.search(self._text, self._position)
+            if match is None:
+                return []
+            self._in_array = True
+            self._position = match.end()
+
+        items = []
+        text = self._text
+        position = self._position
+        while position < len(text):
+            char = text[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._object_start = position
+                self._depth += 1
+            elif char == '}' and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(self._load(text[self._object_start:position + 1]))
+            elif char == ']' and self._depth == 0:
+                self._finished = True
+                break
+            position += 1
+
+        self._position = position
+        return items
+
+    def _load(self, text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(TRAILING_COMMA.sub(r'\1', LINE_COMMENT.sub('', text)))
+        except json.JSONDecodeError:
+            return None
+
+def validate_question(item):
+    """
+    Check a question against the quiz schema
+
+    Returns (question, None) with the question normalized, or (None, reason).
+    Options given as a list of four or with keys like "a)" are accepted, and
+    correct_answer may be given as "Option B" or as the text of an option.
+    """
+    if item is None:
+        return None, "malformed JSON"
+    if not isinstance(item, dict):
+        return None, "question is not an object"
+
+    question = item.get('question')
+    if not isinstance(question, str) or not question.strip():
+        return None, "missing question text"
+
+    options = item.get('options')
+    if isinstance(options, list) and len(options) == len(OPTION_KEYS):
+        options = dict(zip(OPTION_KEYS, options))
+    if not isinstance(options, dict):
+        return None, "options must be an object"
+    options = {str(key).strip().upper().rstrip(').:'): value for key, value in options.items()}
+    if sorted(options) != list(OPTION_KEYS):
+        return None, "options must be exactly A, B, C and D"
+    if not all(isinstance(value, str) and value.strip() for value in options.values()):
+        return None, "options must be non-empty text"
+
+    answer = item.get('correct_answer')
+    if not isinstance(answer, str):
+        return None, "missing correct_answer"
+    answer = answer.strip()
+    match = ANSWER_LETTER.match(answer.upper())
+    letter = match.group(1) if match else None
+    if letter is None:
+        letter = next((key for key, value in options.items() if value.strip().lower() == answer.lower()), None)
+    if letter is None:
+        match = ANSWER_PREFIX.match(answer.upper())
+        letter = match.group(1) if match else None
+    if letter is None:
+        return None, f"invalid correct_answer: {answer[:20]}"
+
+    explanation = item.get('explanation')
+    return {
+        "question": question.strip(),
+        "options": {key: options[key].strip() for key in OPTION_KEYS},
+        "correct_answer": letter,
+        "explanation": explanation.strip() if isinstance(explanation, str) else ""
+    }, None
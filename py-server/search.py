@@ -0,0 +1,258 @@
+"""
+Search Module for the Python Server
+Full-text index of every fetched transcript, with timestamped hits
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from bisect import bisect_right
+from cache import CACHE_DIR
+from metrics import stage
+from transcript import format_timestamp
+
+# Characters of consecutive segments indexed together, so phrases that cross
+# caption boundaries still match; hits are still reported per segment
+SEARCH_PASSAGE_CHARS = int(os.getenv('SEARCH_PASSAGE_CHARS', 300))
+
+# Bytes of the index file SQLite reads through a memory map instead of read calls
+SEARCH_MMAP_BYTES = int(os.getenv('SEARCH_MMAP_BYTES', 1024 * 1024 * 1024))
+
+# Matching passages ranked per query; a query matching more ranks the most recently indexed ones
+SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', 20000))
+
+# Most hits returned by one query
+SEARCH_MAX_RESULTS = 100
+
+# Passage rowids are the video's number shifted left by this many bits plus
+# the passage's position, so one video's passages are one rowid range
+PASSAGE_BITS = 20
+
+# Words, "quoted phrases" and prefix* terms of a search query
+QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+# Markers around matched terms in snippets, and the private markers used to find the first match
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = '**', '**'
+MATCH_MARKER = '\x02'
+
+def build_match_query(text):
+    """
+    Turn a user query into an FTS5 expression, or return None if it has no terms
+
+    Every term is quoted, so FTS5 operators and punctuation in the query are
+    searched as text. Terms must all match (AND); a quoted phrase must match
+    as a phrase and a term ending in * matches as a prefix.
+    """
+    terms = []
+    for phrase, word in QUERY_TERM.findall(text or ''):
+        value = phrase if phrase else word
+        prefix = bool(word) and word.endswith('*')
+        value = value.rstrip('*') if prefix else value
+        if not value.strip():
+            continue
+        quoted = '"' + value.replace('"', '""') + '"'
+        terms.append(quoted + ' *' if prefix else quoted)
+    return ' '.join(terms) or None
+
+def split_passages(transcript, max_chars=SEARCH_PASSAGE_CHARS):
+    """Yield (text, segment offsets, segment starts) for runs of consecutive segments"""
+    offsets, starts = transcript.offsets, transcript.starts
+    first = 0
+    for index in range(len(transcript)):
+        end = index + 1
+        if offsets[end] - offsets[first] >= max_chars or end == len(transcript):
+            base = offsets[first]
+            yield (
+                transcript.text[base:offsets[end] - 1],
+                ' '.join(str(offset - base) for offset in offsets[first:end]),
+                ' '.join(f'{start:.2f}' for start in starts[first:end])
+            )
+            first = end
+
+class TranscriptIndex:
+    """
+    SQLite FTS5 index of transcript passages
+
+    Transcripts are added as they are fetched. Each passage row stores the
+    character offset and start time of its segments, so the first match in a
+    passage is mapped back to the segment it is in. Queries are ranked with
+    BM25 and read through per-thread connections with the file memory-mapped;
+    writes go through one connection under a lock.
+    """
+
+    def __init__(self, name='search', passage_chars=SEARCH_PASSAGE_CHARS, mmap_bytes=SEARCH_MMAP_BYTES,
+                 max_candidates=SEARCH_MAX_CANDIDATES):
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.passage_chars = passage_chars
+        self.max_candidates = max_candidates
+        self.mmap_bytes = mmap_bytes
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"indexed": 0, "queries": 0, "truncated": 0}
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self._db = self._connect()
+        # SQLite connections must not be used in a forked child, e.g. a prefork worker after preloading
+        os.register_at_fork(after_in_child=self._reopen)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL UNIQUE,
+                passage_count INTEGER NOT NULL,
+                segment_count INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+                text, offsets UNINDEXED, starts UNINDEXED,
+                tokenize = 'porter unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+            )
+        """)
+        self._db.commit()
+        self._indexed = {row[0] for row in self._db.execute("SELECT video_id FROM videos")}
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA busy_timeout = 5000")
+        db.execute(f"PRAGMA mmap_size = {int(self.mmap_bytes)}")
+        return db
+
+    def _reopen(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._db = self._connect()
+
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def __contains__(self, video_id):
+        return video_id in self._indexed
+
+    def add(self, video_id, transcript, replace=True):
+        """
+        Index a video's transcript, replacing an older version of it
+
+        With replace=False a video that is already indexed is left as it is,
+        e.g. when a transcript is read back from the cache.
+        """
+        if not replace and video_id in self._indexed:
+            return
+        passages = list(split_passages(transcript, self.passage_chars))
+        with stage('search_index'), self._lock:
+            row = self._db.execute("SELECT id FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is not None and not replace:
+                self._indexed.add(video_id)
+                return
+            if row is None:
+                number = self._db.execute(
+                    "INSERT INTO videos (video_id, passage_count, segment_count, indexed_at) VALUES (?, 0, 0, 0)", (video_id,)
+                ).lastrowid
+            else:
+                number = row[0]
+                self._db.execute(
+                    "DELETE FROM passages WHERE rowid BETWEEN ? AND ?",
+                    (number << PASSAGE_BITS, ((number + 1) << PASSAGE_BITS) - 1)
+                )
+            self._db.executemany(
+                "INSERT INTO passages (rowid, text, offsets, starts) VALUES (?, ?, ?, ?)",
+                (((number << PASSAGE_BITS) + position, *passage) for position, passage in enumerate(passages))
+            )
+            self._db.execute(
+                "UPDATE videos SET passage_count = ?, segment_count = ?, indexed_at = ? WHERE id = ?",
+                (len(passages), len(transcript), time.time(), number)
+            )
+            self._db.commit()
+            self._indexed.add(video_id)
+            self._stats["indexed"] += 1
+
+    def search(self, query, video_id=None, limit=20, offset=0):
+        """
+        Return (hits, truncated) for query, best hit first
+
+        Each hit has the video ID, the start time of the segment holding the
+        first match, a snippet with the matched terms in **bold**, and the
+        BM25 score (higher is better). BM25 has to score every match before
+        the best can be picked, so a query matching more than
+        max_candidates passages only ranks the most recently indexed ones,
+        and truncated is True. Returns None if the query has no terms.
+        """
+        expression = build_match_query(query)
+        if expression is None:
+            return None
+
+        db = self._reader()
+        low, high = 0, -1
+        if video_id is not None:
+            number = db.execute("SELECT id FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if number is None:
+                return [], False
+            low, high = number[0] << PASSAGE_BITS, ((number[0] + 1) << PASSAGE_BITS) - 1
+        range_clause = "passages.rowid >= ?" + (" AND passages.rowid <= ?" if high >= 0 else "")
+        range_params = [low] + ([high] if high >= 0 else [])
+
+        with stage('search_query'):
+            # Walking matches in descending rowid order stops early, unlike ranking them
+            cutoff = db.execute(
+                f"SELECT rowid FROM passages WHERE passages MATCH ? AND {range_clause} "
+                "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                [expression, *range_params, self.max_candidates]
+            ).fetchone()
+            truncated = cutoff is not None
+            if truncated:
+                range_params[0] = cutoff[0] + 1
+
+            rows = db.execute(f"""
+                SELECT videos.video_id, passages.offsets, passages.starts,
+                       highlight(passages, 0, '{MATCH_MARKER}', ''),
+                       snippet(passages, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', 16),
+                       bm25(passages)
+                FROM passages JOIN videos ON videos.id = passages.rowid >> {PASSAGE_BITS}
+                WHERE passages MATCH ? AND {range_clause}
+                ORDER BY bm25(passages) LIMIT ? OFFSET ?
+            """, [expression, *range_params, limit, offset]).fetchall()
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["truncated"] += truncated
+
+        hits = []
+        for found_video_id, offsets, starts, highlighted, snippet, score in rows:
+            offsets = [int(value) for value in offsets.split()]
+            starts = [float(value) for value in starts.split()]
+            match_at = highlighted.find(MATCH_MARKER)
+            segment = max(bisect_right(offsets, match_at) - 1, 0)
+            start = starts[segment]
+            hits.append({
+                'videoId': found_video_id,
+                'start': start,
+                'timestamp': format_timestamp(start),
+                'url': f'https://www.youtube.com/watch?v={found_video_id}&t={int(start)}s',
+                'snippet': snippet,
+                'score': round(-score, 6)
+            })
+        return hits, truncated
+
+    def stats(self):
+        """Return indexed video and passage counts, the index file size and counters"""
+        videos, passages = self._reader().execute(
+            "SELECT COUNT(*), COALESCE(SUM(passage_count), 0) FROM videos"
+        ).fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats["videos"] = videos
+        stats["passages"] = passages
+        stats["disk_bytes"] = sum(
+            os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path)
+        )
+        return stats
+
+# Every transcript this server has fetched
+transcript_index = TranscriptIndex()
@@ -0,0 +1,75 @@
+"""
+Single-flight Module for the Python Server
+Merges concurrent identical calls so only one of them does the work
+"""
+
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    The first caller for a key (the leader) runs the function. Callers that
+    arrive while it is running wait for the leader and get the same result,
+    or the same exception. Waiters give up after the timeout so a stuck
+    leader cannot hold them forever.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            "leaders": 0,
+            "merged": 0,
+            "timeouts": 0
+        }
+
+    def do(self, key, fn, timeout=None):
+        """Call fn() for key, or wait for the call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["leaders"] += 1
+            else:
+                call.waiters += 1
+                self._stats["merged"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight request")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def running(self, key):
+        """Whether a call for key is in flight, so a new caller would wait for it"""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        """Return leader/merged/timeout counters and the number of calls in flight"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
@@ -0,0 +1,97 @@
+"""
+Study Pack Generator for YouTube Videos
+Builds notes and a quiz for a video from a single transcript fetch
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from quiz import get_transcript, generate_chunked_quiz, run_in_flight
+from youtube_urls import extract_video_id
+from notes import generate_notes, summarize_transcript
+from compaction import compact_transcript
+import upstream
+
+def run_timed(fn):
+    """Run fn and return its result dictionary with the elapsed time added"""
+    started = time.perf_counter()
+    try:
+        result = dict(fn())
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": {
+                "type": upstream.error_type(e),
+                "message": str(e)
+            }
+        }
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def build_study_pack(transcript, note_types, num_questions=4, refresh=False):
+    """
+    Generate every requested part of a study pack concurrently
+
+    Each part is reported separately with its own success flag and timing,
+    so a failure in one part does not discard the others.
+    """
+    tasks = {f"notes:{note_type}": (lambda note_type=note_type: generate_notes(transcript, note_type, refresh))
+             for note_type in note_types}
+    if num_questions > 0:
+        tasks["quiz"] = lambda: generate_chunked_quiz(transcript, num_questions, refresh)
+
+    if not tasks:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='studypack') as executor:
+        futures = {name: executor.submit(run_timed, task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def study_pack_key(video_id_or_url, note_types=("comprehensive",), num_questions=4):
+    """Identify a study pack request; generate_study_pack_for_video adds the refresh flag for its single-flight key"""
+    return ('studypack', extract_video_id(video_id_or_url) or video_id_or_url, tuple(note_types), num_questions)
+
+# Main function to generate a study pack for a video
+def generate_study_pack_for_video(video_id_or_url, note_types=("comprehensive",), num_questions=4, refresh=False):
+    """Main function to generate notes and a quiz for a YouTube video"""
+    return run_in_flight(
+        study_pack_key(video_id_or_url, note_types, num_questions) + (refresh,),
+        lambda: build_study_pack_for_video(video_id_or_url, note_types, num_questions, refresh)
+    )
+
+def build_study_pack_for_video(video_id_or_url, note_types=("comprehensive",), num_questions=4, refresh=False):
+    """Fetch the transcript once and generate every part of the study pack from it"""
+    started = time.perf_counter()
+
+    # Step 1: Get the transcript (shared by every part)
+    transcript_result = get_transcript(video_id_or_url)
+    transcript_ms = round((time.perf_counter() - started) * 1000, 1)
+    if not transcript_result["success"]:
+        return transcript_result
+
+    # Step 2: Compact the transcript once, then generate notes and quiz concurrently
+    transcript = transcript_result["data"]["transcript"]
+    compacted, compaction = compact_transcript(transcript)
+    parts = build_study_pack(compacted, note_types, num_questions, refresh)
+
+    notes = {name.split(":", 1)[1]: part for name, part in parts.items() if name.startswith("notes:")}
+    quiz = parts.get("quiz")
+
+    if parts and not any(part["success"] for part in parts.values()):
+        return next(iter(parts.values()))
+
+    return {
+        "success": True,
+        "data": {
+            "notes": notes,
+            "quiz": quiz,
+            "transcript_summary": dict(
+                summarize_transcript(transcript.clean_text),
+                segments=len(transcript),
+                compaction=compaction
+            ),
+            "timing": {
+                "transcript_ms": transcript_ms,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+    }
@@ -0,0 +1,132 @@
+"""
+Subsystems Module
+Lazy imports of the heavy SDKs, background warm-up, and the cold/warm state
+of each subsystem reported by the readiness endpoint
+"""
+
+import os
+import sys
+import time
+import importlib
+import threading
+from metrics import Gauge
+
+# Subsystems warmed up in the background when a worker starts: a comma-separated
+# list of youtube, gemini and transcripts, "all" or "none"
+WARM_UP = os.getenv('WARM_UP', 'all')
+
+SUBSYSTEMS = ('youtube', 'gemini', 'transcripts')
+
+subsystem_import_seconds = Gauge(
+    'subsystem_import_seconds', 'Seconds spent importing the SDKs of each subsystem', labels=('subsystem',)
+)
+subsystem_warm = Gauge(
+    'subsystem_warm', 'Whether a subsystem has its SDK imported and its client set up (1) or not (0)',
+    labels=('subsystem',)
+)
+
+_lock = threading.RLock()
+_state = {
+    name: {'imported': False, 'importSeconds': 0.0, 'warm': False, 'warmSeconds': None, 'modules': set()}
+    for name in SUBSYSTEMS
+}
+_warmers = {}
+_sdk_modules = {}
+_warm_up_started = False
+
+for _name in SUBSYSTEMS:
+    subsystem_warm.set(_name, value=0)
+
+def lazy_import(subsystem, module_name):
+    """
+    Import an SDK module on first use and return it
+
+    The time of the first import is added to the subsystem's import time.
+    Later calls only look the module up.
+    """
+    state = _state[subsystem]
+    if module_name in state['modules']:
+        return sys.modules[module_name]
+    with _lock:
+        if module_name in state['modules']:
+            return sys.modules[module_name]
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - started
+        state['modules'].add(module_name)
+        state['imported'] = True
+        state['importSeconds'] += elapsed
+        subsystem_import_seconds.set(subsystem, value=round(state['importSeconds'], 6))
+        return module
+
+def mark_warm(subsystem, seconds=None):
+    """Record that a subsystem's client is set up and ready for requests; seconds defaults to its import time"""
+    with _lock:
+        state = _state[subsystem]
+        if state['warm']:
+            return
+        state['warm'] = True
+        state['warmSeconds'] = round(seconds if seconds is not None else state['importSeconds'], 6)
+    subsystem_warm.set(subsystem, value=1)
+
+def is_warm(subsystem):
+    return _state[subsystem]['warm']
+
+def register_warm_up(subsystem, fn, modules=()):
+    """Register the function that sets up a subsystem, and the SDK modules it imports"""
+    _warmers[subsystem] = fn
+    _sdk_modules[subsystem] = tuple(modules)
+
+def warm_up_names(names=None):
+    names = WARM_UP if names is None else names
+    if names.strip().lower() == 'all':
+        return list(SUBSYSTEMS)
+    return [name.strip() for name in names.split(',') if name.strip() in SUBSYSTEMS]
+
+def warm_up(names=None):
+    """Warm up subsystems in this thread; a subsystem that fails stays cold"""
+    for name in warm_up_names(names):
+        fn = _warmers.get(name)
+        if fn is None or is_warm(name):
+            continue
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ {name} warm-up skipped: {str(e)}")
+            continue
+        mark_warm(name, time.perf_counter() - started)
+
+def start_warm_up(names=None):
+    """Run warm_up in the background so startup is not blocked; only the first call in a process starts it"""
+    global _warm_up_started
+    with _lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, args=(names,), name='warm-up', daemon=True).start()
+
+def preload():
+    """
+    Import every subsystem's SDKs without setting up clients
+
+    Used by the prefork launcher before workers are forked, so the imported
+    modules are shared by all workers. Clients, connections and threads are
+    still created in each worker.
+    """
+    for name, modules in _sdk_modules.items():
+        for module_name in modules:
+            lazy_import(name, module_name)
+
+def status():
+    """Return the state of every subsystem"""
+    with _lock:
+        return {
+            name: {
+                'imported': state['imported'],
+                'warm': state['warm'],
+                'importSeconds': round(state['importSeconds'], 6),
+                'warmSeconds': state['warmSeconds']
+            }
+            for name, state in _state.items()
+        }
@@ -0,0 +1,137 @@
+"""
+Transcript Module
+Compact columnar representation of a video transcript
+"""
+
+from array import array
+from functools import cached_property
+
+def format_timestamp(seconds):
+    """Format seconds as mm:ss"""
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+def read_item(item):
+    """Return (text, start, duration) of an item from youtube-transcript-api"""
+    if hasattr(item, '_dict_'):
+        item = item._dict_
+    if isinstance(item, dict):
+        return item.get('text', ''), item.get('start', 0), item.get('duration', 0)
+    try:
+        return item.text, item.start, getattr(item, 'duration', 0)
+    except AttributeError:
+        return str(item), 0, 0
+
+class Transcript:
+    """
+    Transcript segments stored column by column
+
+    Start times and durations are typed arrays. The segment texts are joined
+    with single spaces into one string, and offsets[i] is where segment i
+    begins; offsets has one extra entry so segment i ends at offsets[i + 1] - 1.
+    The joined string is also the cleaned transcript text used for prompts.
+    Formatted and per-segment views are built only when asked for.
+    """
+
+    def __init__(self, text, offsets, starts, durations):
+        self.text = text
+        self.offsets = offsets
+        self.starts = starts
+        self.durations = durations
+
+    @classmethod
+    def from_items(cls, items):
+        """Build a transcript from youtube-transcript-api items, dropping empty segments"""
+        texts = []
+        offsets = array('q', [0])
+        starts = array('d')
+        durations = array('d')
+        position = 0
+        for item in items:
+            text, start, duration = read_item(item)
+            text = ' '.join(text.split())
+            if not text:
+                continue
+            texts.append(text)
+            position += len(text) + 1
+            offsets.append(position)
+            starts.append(start)
+            durations.append(duration)
+        return cls(' '.join(texts), offsets, starts, durations)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a transcript stored with to_dict"""
+        return cls(data['text'], array('q', data['offsets']), array('d', data['starts']), array('d', data['durations']))
+
+    def to_dict(self):
+        """Return a JSON-serializable columnar form, e.g. for the transcript cache"""
+        return {
+            'text': self.text,
+            'offsets': self.offsets.tolist(),
+            'starts': self.starts.tolist(),
+            'durations': self.durations.tolist()
+        }
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment_text(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def segment_length(self, index):
+        return self.offsets[index + 1] - self.offsets[index] - 1
+
+    def slice(self, start, stop):
+        """Return segments start..stop-1 as a new transcript"""
+        base = self.offsets[start]
+        return Transcript(
+            self.text[base:self.offsets[stop] - 1] if stop > start else '',
+            array('q', (offset - base for offset in self.offsets[start:stop + 1])),
+            self.starts[start:stop],
+            self.durations[start:stop]
+        )
+
+    @property
+    def clean_text(self):
+        """Segment texts joined by spaces, without timestamps"""
+        return self.text
+
+    def iter_formatted(self):
+        """Yield '[mm:ss] text' lines"""
+        offsets, text = self.offsets, self.text
+        for index, start in enumerate(self.starts):
+            yield f"[{format_timestamp(start)}] {text[offsets[index]:offsets[index + 1] - 1]}"
+
+    @cached_property
+    def formatted(self):
+        """Segments as '[mm:ss] text' lines"""
+        return '\n'.join(self.iter_formatted())
+
+    @cached_property
+    def formatted_length(self):
+        """Length of formatted, without building it"""
+        if not self.starts:
+            return 0
+        # "[" + timestamp + "] " per line and a newline between lines; the text lengths add up to len(text) - (n - 1)
+        stamps = sum(len(format_timestamp(start)) + 3 for start in self.starts)
+        return stamps + len(self.text)
+
+    def formatted_prefix(self, limit):
+        """First limit characters of formatted, building only the lines needed"""
+        parts = []
+        size = 0
+        for line in self.iter_formatted():
+            parts.append(line)
+            size += len(line) + 1
+            if size > limit:
+                break
+        return '\n'.join(parts)[:limit]
+
+    def segments(self):
+        """Per-segment dictionaries, as returned by the transcript API"""
+        return [{
+            'text': self.segment_text(index),
+            'start': start,
+            'duration': self.durations[index],
+            'timestamp': format_timestamp(start)
+        } for index, start in enumerate(self.starts)]
@@ -0,0 +1,286 @@
+"""
+Upstream Calls Module for the Python Server
+Deadlines, jittered retries, hedged reads and circuit breakers around the
+YouTube Data API, transcript and Gemini calls
+"""
+
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from metrics import Counter, Gauge
+
+# Threads that run YouTube and transcript attempts, so a call can be abandoned at
+# its deadline and a hedged second request can run next to the first
+UPSTREAM_WORKERS = int(os.getenv('UPSTREAM_WORKERS', 32))
+
+# Consecutive transient failures that open a dependency's circuit, and seconds
+# it stays open before one trial call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))
+
+# First retry waits up to RETRY_BACKOFF_BASE seconds, doubling per retry up to RETRY_BACKOFF_MAX
+RETRY_BACKOFF_BASE = float(os.getenv('RETRY_BACKOFF_BASE', 0.25))
+RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', 4))
+
+# Seconds allowed per Gemini call (shared with gemini_client)
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 120))
+
+# HTTP status of each error type raised for upstream failures; everything else is a 500
+ERROR_STATUS = {
+    'UPSTREAM_TIMEOUT': 504,
+    'UPSTREAM_UNAVAILABLE': 503,
+    'UPSTREAM_ERROR': 502
+}
+
+# Circuit states, as reported by the upstream_circuit_state gauge
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: 'closed', HALF_OPEN: 'half_open', OPEN: 'open'}
+
+upstream_calls = Counter(
+    'upstream_calls_total', 'Upstream calls by dependency and result', labels=('dependency', 'result')
+)
+upstream_retries = Counter('upstream_retries_total', 'Upstream attempts that were retries', labels=('dependency',))
+upstream_hedges = Counter(
+    'upstream_hedges_total', 'Hedged second requests sent, and those that answered first', labels=('dependency', 'result')
+)
+circuit_state = Gauge(
+    'upstream_circuit_state', 'Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open',
+    labels=('dependency',)
+)
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+class UpstreamTimeout(TimeoutError):
+    """Raised when an upstream call does not answer within its deadline"""
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the dependency while its circuit is open"""
+
+def http_status(error):
+    """HTTP status carried by an API client error, or None"""
+    for status in (
+        getattr(getattr(error, 'resp', None), 'status', None),          # googleapiclient HttpError
+        getattr(getattr(error, 'response', None), 'status_code', None), # requests HTTPError
+        getattr(error, 'code', None)                                    # google.api_core errors
+    ):
+        if isinstance(status, int) and not isinstance(status, bool):
+            return status
+    # youtube-transcript-api wraps the requests error it was raised from
+    context = error.__cause__ or error.__context__
+    return http_status(context) if context is not None and context is not error else None
+
+def is_retryable(error):
+    """Whether an error is transient: timeouts, connection errors, 429 and 5xx responses"""
+    retryable = getattr(error, 'retryable', None)
+    if retryable is not None:
+        return retryable
+    status = http_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, OSError)
+
+def is_transient(error):
+    """Whether an error says nothing about the request itself, so its outcome must not be cached"""
+    return isinstance(error, UpstreamUnavailable) or is_retryable(error)
+
+def error_type(error):
+    """Error type reported to clients for an exception from an upstream call"""
+    if isinstance(error, UpstreamUnavailable):
+        return 'UPSTREAM_UNAVAILABLE'
+    if isinstance(error, TimeoutError):
+        return 'UPSTREAM_TIMEOUT'
+    if is_retryable(error):
+        return 'UPSTREAM_ERROR'
+    return 'SERVER_ERROR'
+
+def error_status(error):
+    return ERROR_STATUS.get(error_type(error), 500)
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is down
+
+    Opens after failure_threshold consecutive transient failures. While open,
+    calls are refused; after reset_timeout one trial call is let through
+    (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        circuit_state.set(name, value=CLOSED)
+
+    def before_call(self):
+        """Raise UpstreamUnavailable unless a call may go ahead"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial_running):
+                retry_in = max(0, self.reset_timeout - (time.monotonic() - self._opened_at))
+                raise UpstreamUnavailable(f"{self.name} is unavailable; retry in {retry_in:.0f}s")
+            if self.state == HALF_OPEN:
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def record_skipped(self):
+        """For a call that never reached the dependency: count nothing, but free the trial slot"""
+        with self._lock:
+            self._trial_running = False
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"⚡ Circuit for {self.name} is now {STATE_NAMES[state]}")
+        self.state = state
+        circuit_state.set(self.name, value=state)
+
+class Dependency:
+    """
+    Call policy for one upstream service
+
+    timeout bounds each attempt and deadline the whole call, retries
+    included. Transient errors are retried with full-jitter exponential
+    backoff while time is left. With hedge_after set, an idempotent call that
+    has not answered after that many seconds gets a second, identical request
+    and the first answer wins. Attempts run on the upstream worker threads,
+    except with inline=True, for clients that enforce their own timeout.
+    """
+
+    def __init__(self, name, timeout, deadline, retries, hedge_after=0, inline=False):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.inline = inline
+        self.breaker = CircuitBreaker(name)
+
+    @classmethod
+    def from_env(cls, name, timeout, deadline, retries, hedge_after=0):
+        """Build a dependency whose settings can be overridden with UPSTREAM_<NAME>_<SETTING>"""
+        def setting(key, default):
+            return float(os.getenv(f'UPSTREAM_{name.upper()}_{key}', default))
+        return cls(
+            name,
+            timeout=setting('TIMEOUT', timeout),
+            deadline=setting('DEADLINE', deadline),
+            retries=int(setting('RETRIES', retries)),
+            hedge_after=setting('HEDGE_AFTER', hedge_after)
+        )
+
+    def call(self, fn, *args, hedge=False, deadline=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) under this dependency's policy
+
+        Raises UpstreamUnavailable while the circuit is open, UpstreamTimeout
+        when the deadline passes, and otherwise the last error fn raised.
+        Errors that are not transient (e.g. a 404) are raised at once.
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except UpstreamUnavailable:
+                upstream_calls.inc(self.name, 'short_circuited')
+                raise
+            try:
+                result = self._attempt(fn, args, kwargs, deadline_at, hedge)
+            except Exception as e:
+                if not is_retryable(e):
+                    if http_status(e) is not None:
+                        # The service answered; the request itself was refused
+                        self.breaker.record_success()
+                    else:
+                        # Raised on our side, e.g. GeminiBusy, so it says nothing about the service
+                        self.breaker.record_skipped()
+                    upstream_calls.inc(self.name, 'error')
+                    raise
+                self.breaker.record_failure()
+                backoff = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+                if attempt >= self.retries or time.monotonic() + backoff >= deadline_at:
+                    upstream_calls.inc(self.name, 'timeout' if isinstance(e, TimeoutError) else 'error')
+                    raise
+                attempt += 1
+                upstream_retries.inc(self.name)
+                print(f"🔁 Retrying {self.name} call in {backoff:.2f}s after: {str(e)}")
+                time.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            upstream_calls.inc(self.name, 'success')
+            return result
+
+    def record_failure(self, error):
+        """Count an error raised after call() returned, e.g. part way through a stream"""
+        if is_retryable(error):
+            self.breaker.record_failure()
+
+    def _attempt(self, fn, args, kwargs, deadline_at, hedge):
+        if self.inline:
+            return fn(*args, **kwargs)
+
+        timeout = min(self.timeout, deadline_at - time.monotonic())
+        attempt_deadline = time.monotonic() + timeout
+        first = _executor.submit(fn, *args, **kwargs)
+        pending = {first}
+        if hedge and 0 < self.hedge_after < timeout and self.breaker.state == CLOSED:
+            done, _ = wait(pending, self.hedge_after)
+            if not done:
+                pending.add(_executor.submit(fn, *args, **kwargs))
+                upstream_hedges.inc(self.name, 'sent')
+
+        error = None
+        while pending:
+            done, pending = wait(pending, max(0, attempt_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                # Abandoned requests finish in the background; their results are dropped
+                raise UpstreamTimeout(f"{self.name} did not answer within {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        upstream_hedges.inc(self.name, 'won')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        return {
+            "state": STATE_NAMES[self.breaker.state],
+            "timeout": self.timeout,
+            "deadline": self.deadline,
+            "retries": self.retries,
+            "hedge_after": self.hedge_after
+        }
+
+# YouTube Data API reads and transcript fetches are idempotent and hedged.
+# Gemini calls are not hedged; they keep their own slot-limited executor and
+# enforce the timeout there, and gemini_client passes each call's deadline
+youtube = Dependency.from_env('youtube', timeout=10, deadline=30, retries=2, hedge_after=1.5)
+transcripts = Dependency.from_env('transcripts', timeout=15, deadline=40, retries=2, hedge_after=3)
+gemini = Dependency('gemini', timeout=GEMINI_TIMEOUT, deadline=GEMINI_TIMEOUT,
+                    retries=int(os.getenv('UPSTREAM_GEMINI_RETRIES', 1)), inline=True)
+
+def stats():
+    """Return the policy and circuit state of every dependency"""
+    return {dependency.name: dependency.stats() for dependency in (youtube, transcripts, gemini)}
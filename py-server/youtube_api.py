@@ -0,0 +1,727 @@
+"""
+YouTube Data API Module
+Client creation, batched lookups, playlist ingestion and response field mapping
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from cache import TieredCache
+from metrics import stage
+import upstream
+from subsystems import lazy_import, mark_warm, register_warm_up
+from youtube_urls import classify_link
+
+# Load environment variables
+load_dotenv()
+
+# Get YouTube API key from environment variable
+YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
+
+# Alternative API root, e.g. a local stand-in used by the load benchmarks
+YOUTUBE_API_ENDPOINT = os.getenv('YOUTUBE_API_ENDPOINT')
+
+# Socket timeout in seconds for YouTube Data API connections
+YOUTUBE_HTTP_TIMEOUT = float(os.getenv('YOUTUBE_HTTP_TIMEOUT', 30))
+
+# videos().list accepts at most 50 IDs per call
+VIDEOS_PER_REQUEST = 50
+
+# Long-lived worker threads for concurrent lookups, so their per-thread clients are reused
+youtube_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('YOUTUBE_API_WORKERS', 8)),
+    thread_name_prefix='youtube'
+)
+
+# Threads that resolve groups of links for ingest_links. They wait on youtube_executor,
+# so they must be a separate pool
+link_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('LINK_INGEST_WORKERS', 4)),
+    thread_name_prefix='links'
+)
+
+# Threads for stale-while-revalidate refreshes. A playlist refresh waits on
+# youtube_executor, so refreshes must not run on it
+refresh_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('METADATA_REFRESH_WORKERS', 2)),
+    thread_name_prefix='refresh'
+)
+
+# Playlist items seen by the last import of each playlist, used to make re-imports incremental
+playlist_snapshots = TieredCache(
+    'playlists',
+    memory_items=64,
+    disk_max_bytes=int(os.getenv('PLAYLIST_SNAPSHOT_MAX_BYTES', 128 * 1024 * 1024)),
+    default_ttl=int(os.getenv('PLAYLIST_SNAPSHOT_TTL', 24 * 3600))
+)
+
+def load_discovery_document():
+    """Load the YouTube Data API discovery document from the local static copy"""
+    discovery_cache = lazy_import('youtube', 'googleapiclient.discovery_cache')
+    document = discovery_cache.get_static_doc('youtube', 'v3')
+    return json.loads(document) if document else None
+
+# Parsed once, on first use, instead of on every request
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+def get_discovery_document():
+    """Return the parsed discovery document, importing the API client library on first use"""
+    global _discovery_document
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                started = time.perf_counter()
+                lazy_import('youtube', 'googleapiclient.discovery')
+                _discovery_document = load_discovery_document() or {}
+                mark_warm('youtube', time.perf_counter() - started)
+    return _discovery_document
+
+register_warm_up('youtube', get_discovery_document,
+                 modules=('httplib2', 'googleapiclient.discovery', 'googleapiclient.errors'))
+
+# One client per thread: the API client and its httplib2 transport are not
+# thread-safe, but each thread's transport keeps its connections alive
+_thread_clients = threading.local()
+
+# Metadata cache freshness in seconds: statistics go stale quickly, titles,
+# thumbnails and durations rarely change. Stale entries are served while a
+# background refresh runs, for up to METADATA_STALE_WHILE_REVALIDATE seconds.
+METADATA_STATS_TTL = int(os.getenv('METADATA_STATS_TTL', 10 * 60))
+METADATA_STATIC_TTL = int(os.getenv('METADATA_STATIC_TTL', 24 * 3600))
+METADATA_STALE_WHILE_REVALIDATE = int(os.getenv('METADATA_STALE_WHILE_REVALIDATE', 24 * 3600))
+PLAYLIST_METADATA_TTL = int(os.getenv('PLAYLIST_METADATA_TTL', 15 * 60))
+
+# Video and playlist metadata with the ETag of the response it came from
+metadata_cache = TieredCache(
+    'metadata',
+    memory_items=int(os.getenv('METADATA_CACHE_MEMORY_ITEMS', 4096)),
+    disk_max_bytes=int(os.getenv('METADATA_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    default_ttl=int(os.getenv('METADATA_CACHE_MAX_AGE', 30 * 24 * 3600))
+)
+
+# Cache keys with a background refresh in progress
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Create YouTube API client
+def get_youtube_client():
+    if not YOUTUBE_API_KEY:
+        return None
+    
+    youtube = getattr(_thread_clients, 'youtube', None)
+    if youtube is None:
+        document = get_discovery_document()
+        discovery = lazy_import('youtube', 'googleapiclient.discovery')
+        http = lazy_import('youtube', 'httplib2').Http(timeout=YOUTUBE_HTTP_TIMEOUT)
+        client_options = {'api_endpoint': YOUTUBE_API_ENDPOINT} if YOUTUBE_API_ENDPOINT else None
+        if document:
+            youtube = discovery.build_from_document(document, developerKey=YOUTUBE_API_KEY, http=http,
+                                                    client_options=client_options)
+        else:
+            youtube = discovery.build('youtube', 'v3', developerKey=YOUTUBE_API_KEY, http=http, client_options=client_options)
+        _thread_clients.youtube = youtube
+    return youtube
+
+def get_thumbnail_url(thumbnails, fallback=None):
+    """Pick the best available thumbnail URL"""
+    return (
+        thumbnails.get('high', {}).get('url') or
+        thumbnails.get('medium', {}).get('url') or
+        thumbnails.get('default', {}).get('url') or
+        fallback
+    )
+
+def format_video_metadata(video_data):
+    """Map a videos().list item to the metadata object returned by the API"""
+    video_id = video_data['id']
+    snippet = video_data['snippet']
+    content_details = video_data['contentDetails']
+    statistics = video_data.get('statistics', {})
+
+    # Parse ISO 8601 duration format
+    duration_str = content_details.get('duration', 'PT0S')  # Default to 0 seconds
+
+    # Format thumbnail URL
+    thumbnail_url = get_thumbnail_url(
+        snippet.get('thumbnails', {}),
+        f'https://img.youtube.com/vi/{video_id}/hqdefault.jpg'
+    )
+
+    return {
+        'id': video_id,
+        'title': snippet.get('title', 'Unknown Title'),
+        'author': snippet.get('channelTitle', 'Unknown Author'),
+        'duration': duration_str,  # Client can parse this if needed
+        'thumbnailUrl': thumbnail_url,
+        'publishedAt': snippet.get('publishedAt'),
+        'description': snippet.get('description', ''),
+        'viewCount': statistics.get('viewCount'),
+        'likeCount': statistics.get('likeCount'),
+        'commentCount': statistics.get('commentCount'),
+        'tags': snippet.get('tags', []),
+        'categoryId': snippet.get('categoryId')
+    }
+
+def fetch_video_items(video_ids):
+    """Fetch raw videos().list items for up to 50 video IDs in one call"""
+    response = execute_request(lambda youtube: youtube.videos().list(
+        part='snippet,contentDetails,statistics',
+        id=','.join(video_ids)
+    ))
+    return response.get('items', [])
+
+def execute_request(build_request, etag=None):
+    """
+    Build and execute an API request, sending If-None-Match when an ETag is known; returns None on 304
+
+    build_request(youtube) creates the request. Each attempt runs on an
+    upstream worker thread with that thread's client, under the YouTube
+    deadline, retry, hedging and circuit breaker policy.
+    """
+    def attempt():
+        request = build_request(get_youtube_client())
+        if etag:
+            request.headers['If-None-Match'] = etag
+        try:
+            return request.execute()
+        except lazy_import('youtube', 'googleapiclient.errors').HttpError as e:
+            if etag and e.resp.status == 304:
+                return None
+            raise
+
+    with stage('youtube_api'):
+        return upstream.youtube.call(attempt, hedge=True)
+
+# Static fields and statistics of a video are cached as separate entries, each
+# with its own TTL and ETag, and refreshed with videos().list calls for their parts.
+# (Entries from before the split were stored whole under video:<id> and are ignored.)
+VIDEO_PARTS = {
+    'static': ('snippet,contentDetails', 'video-static'),
+    'stats': ('statistics', 'video-stats')
+}
+
+def video_part_ttl(part):
+    return METADATA_STATIC_TTL if part == 'static' else METADATA_STATS_TTL
+
+def split_video_item(item):
+    """Split a videos().list item into its static fields and its statistics"""
+    static = {key: value for key, value in item.items() if key != 'statistics'}
+    return {'static': static, 'stats': item.get('statistics', {})}
+
+def store_video_part(video_id, part, value, etag=None):
+    """Cache one part of a video, stamping when it was last validated"""
+    metadata_cache.set(f'{VIDEO_PARTS[part][1]}:{video_id}', {
+        'value': value,
+        'etag': etag,
+        'validated_at': time.time()
+    })
+
+def store_video_item(video_id, item):
+    """Cache both parts of a full videos().list item"""
+    for part, value in split_video_item(item).items():
+        store_video_part(video_id, part, value)
+
+def refresh_video_part(video_id, part, entry=None):
+    """
+    Fetch one part of a video from the API, revalidating with its cached ETag if there is one
+
+    Returns (value, status) where status is REVALIDATED when the API answered
+    304 Not Modified and MISS when a full response was fetched. value is None
+    if the video no longer exists.
+    """
+    etag = entry.get('etag') if entry else None
+    response = execute_request(lambda youtube: youtube.videos().list(
+        part=VIDEO_PARTS[part][0],
+        id=video_id
+    ), etag)
+
+    if response is None:
+        store_video_part(video_id, part, entry['value'], etag)
+        return entry['value'], 'REVALIDATED'
+
+    items = response.get('items', [])
+    if not items:
+        for _, prefix in VIDEO_PARTS.values():
+            metadata_cache.delete(f'{prefix}:{video_id}')
+        return None, 'MISS'
+
+    value = split_video_item(items[0])[part]
+    store_video_part(video_id, part, value, response.get('etag'))
+    return value, 'MISS'
+
+def refresh_video_part_group(part, video_ids):
+    """
+    Fetch one part of up to 50 videos from the API in one call
+
+    The response's ETag covers the whole list, so the parts are stored
+    without one. Videos missing from the response are dropped from the cache.
+    """
+    response = execute_request(lambda youtube: youtube.videos().list(
+        part=VIDEO_PARTS[part][0],
+        id=','.join(video_ids)
+    ))
+    found = {item['id']: item for item in response.get('items', [])}
+    for video_id in video_ids:
+        if video_id in found:
+            store_video_part(video_id, part, split_video_item(found[video_id])[part])
+        else:
+            for _, prefix in VIDEO_PARTS.values():
+                metadata_cache.delete(f'{prefix}:{video_id}')
+
+def run_refresh(keys, fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"⚠️ Background refresh of {keys[0]}{f' and {len(keys) - 1} more' if len(keys) > 1 else ''} failed: {str(e)}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update(keys)
+
+def schedule_refresh(key, fn, *args):
+    """Run fn(*args) in the background unless a refresh for key is already running"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    refresh_executor.submit(run_refresh, [key], fn, *args)
+
+def schedule_video_part_refresh(part, video_ids):
+    """Refresh one part of many videos in the background, 50 per call, skipping videos already being refreshed"""
+    prefix = VIDEO_PARTS[part][1]
+    with _refreshing_lock:
+        video_ids = [video_id for video_id in video_ids if f'{prefix}:{video_id}' not in _refreshing]
+        _refreshing.update(f'{prefix}:{video_id}' for video_id in video_ids)
+    for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        group = video_ids[start:start + VIDEOS_PER_REQUEST]
+        refresh_executor.submit(run_refresh, [f'{prefix}:{video_id}' for video_id in group],
+                                refresh_video_part_group, part, group)
+
+def get_cached_video_item(video_id, refresh_stale=True):
+    """
+    Look a video up in the metadata cache without calling the API
+
+    Returns (item, status, age, fresh_for, parts). status is HIT when both
+    parts are fresh, STALE when a part is served while a background refresh
+    runs, or None when the caller has to go to the API. parts maps each part
+    to its (status, entry): the entry is kept when expired so its ETag can be
+    used to revalidate. age is that of the older part, and fresh_for the
+    seconds until the first part expires (0 once one has). Stale parts are
+    refreshed in the background unless refresh_stale is False.
+    """
+    parts = {}
+    age = 0
+    fresh_for = min(video_part_ttl(part) for part in VIDEO_PARTS)
+    for part, (_, prefix) in VIDEO_PARTS.items():
+        entry = metadata_cache.get(f'{prefix}:{video_id}')
+        status = None
+        if entry is not None:
+            part_age = time.time() - entry['validated_at']
+            age = max(age, part_age)
+            ttl = video_part_ttl(part)
+            fresh_for = max(0, min(fresh_for, ttl - part_age))
+            if part_age < ttl:
+                status = 'HIT'
+            elif part_age < ttl + METADATA_STALE_WHILE_REVALIDATE:
+                status = 'STALE'
+        parts[part] = (status, entry)
+
+    if not all(status for status, _ in parts.values()):
+        return None, None, age, fresh_for, parts
+
+    for part, (status, entry) in parts.items():
+        if status == 'STALE' and refresh_stale:
+            schedule_refresh(f'{VIDEO_PARTS[part][1]}:{video_id}', refresh_video_part, video_id, part, entry)
+    status = 'HIT' if all(status == 'HIT' for status, _ in parts.values()) else 'STALE'
+    item = merge_video_parts(parts['static'][1]['value'], parts['stats'][1]['value'])
+    return item, status, age, fresh_for, parts
+
+def merge_video_parts(static, statistics):
+    return dict(static, statistics=statistics)
+
+def get_video_item(video_id):
+    """
+    Return (item, cache_status, age, fresh_for) for one video, using the metadata cache
+
+    fresh_for is the seconds the returned item stays fresh in the cache.
+    """
+    item, status, age, fresh_for, parts = get_cached_video_item(video_id)
+    if status:
+        return item, status, age, fresh_for
+
+    # A new video is fetched in one call; otherwise only the expired part is
+    fresh_for = min(video_part_ttl(part) for part in VIDEO_PARTS)
+    if not any(entry for _, entry in parts.values()):
+        items = fetch_video_items([video_id])
+        if not items:
+            return None, 'MISS', 0, 0
+        store_video_item(video_id, items[0])
+        return items[0], 'MISS', 0, fresh_for
+
+    values = {}
+    statuses = set()
+    for part, (part_status, entry) in parts.items():
+        if part_status:
+            if part_status == 'STALE':
+                schedule_refresh(f'{VIDEO_PARTS[part][1]}:{video_id}', refresh_video_part, video_id, part, entry)
+            fresh_for = max(0, min(fresh_for, video_part_ttl(part) - (time.time() - entry['validated_at'])))
+            values[part] = entry['value']
+            continue
+        values[part], refresh_status = refresh_video_part(video_id, part, entry)
+        if values[part] is None:
+            return None, 'MISS', 0, 0
+        statuses.add(refresh_status)
+    status = 'MISS' if 'MISS' in statuses else 'REVALIDATED'
+    return merge_video_parts(values['static'], values['stats']), status, 0, fresh_for
+
+def fetch_video_metadata_batch(video_ids):
+    """
+    Fetch metadata for many unique video IDs
+
+    Cached videos are served from the metadata cache; the rest are split into
+    50-ID videos().list calls that run concurrently. Returns a dictionary
+    mapping each video ID to a result dictionary in the standard
+    {"success": ..., "data" | "error": ...} format, a dictionary counting
+    cache statuses, and the seconds until the first of the videos expires in
+    the cache. Stale parts are refreshed in the background, 50 videos per call.
+    """
+    results = {}
+    cache_counts = {}
+    missing = []
+    stale = {part: [] for part in VIDEO_PARTS}
+    fresh_for = min(video_part_ttl(part) for part in VIDEO_PARTS)
+    for video_id in video_ids:
+        item, status, _, item_fresh_for, parts = get_cached_video_item(video_id, refresh_stale=False)
+        if status:
+            fresh_for = min(fresh_for, item_fresh_for)
+            for part, (part_status, _) in parts.items():
+                if part_status == 'STALE':
+                    stale[part].append(video_id)
+            results[video_id] = {
+                'success': True,
+                'data': format_video_metadata(item)
+            }
+            cache_counts[status] = cache_counts.get(status, 0) + 1
+        else:
+            missing.append(video_id)
+
+    for part, stale_ids in stale.items():
+        schedule_video_part_refresh(part, stale_ids)
+
+    chunks = [missing[i:i + VIDEOS_PER_REQUEST] for i in range(0, len(missing), VIDEOS_PER_REQUEST)]
+    if missing:
+        cache_counts['MISS'] = len(missing)
+
+    def fetch_chunk(chunk):
+        try:
+            return chunk, fetch_video_items(chunk), None
+        except Exception as e:
+            return chunk, [], e
+
+    for chunk, items, error in youtube_executor.map(fetch_chunk, chunks):
+        found = {item['id']: item for item in items}
+        for video_id in chunk:
+            if error is not None:
+                results[video_id] = {
+                    'success': False,
+                    'error': {
+                        'type': upstream.error_type(error),
+                        'message': str(error)
+                    }
+                }
+            elif video_id in found:
+                store_video_item(video_id, found[video_id])
+                results[video_id] = {
+                    'success': True,
+                    'data': format_video_metadata(found[video_id])
+                }
+            else:
+                results[video_id] = {
+                    'success': False,
+                    'error': {
+                        'type': 'VIDEO_NOT_FOUND',
+                        'message': 'Video not found or not accessible'
+                    }
+                }
+    return results, cache_counts, fresh_for
+
+def format_playlist_video(video):
+    """Map a videos().list item to the video object used in playlist responses"""
+    video_snippet = video['snippet']
+    video_content = video['contentDetails']
+
+    return {
+        'id': video['id'],
+        'title': video_snippet.get('title', 'Unknown Title'),
+        'description': video_snippet.get('description', ''),
+        'thumbnailUrl': get_thumbnail_url(
+            video_snippet.get('thumbnails', {}),
+            f'https://img.youtube.com/vi/{video["id"]}/hqdefault.jpg'
+        ),
+        'duration': video_content.get('duration', 'PT0S'),
+        'author': video_snippet.get('channelTitle', 'Unknown'),
+        'publishedAt': video_snippet.get('publishedAt')
+    }
+
+def format_playlist_metadata(playlist_id, playlist_data):
+    """Map a playlists().list item to the playlist object returned by the API (without videos)"""
+    playlist_snippet = playlist_data['snippet']
+    playlist_details = playlist_data['contentDetails']
+
+    return {
+        'id': playlist_id,
+        'title': playlist_snippet.get('title', 'Unknown Playlist'),
+        'description': playlist_snippet.get('description', ''),
+        'thumbnailUrl': get_thumbnail_url(playlist_snippet.get('thumbnails', {})),
+        'channelTitle': playlist_snippet.get('channelTitle', 'Unknown Channel'),
+        'itemCount': playlist_details.get('itemCount', 0),
+        'publishedAt': playlist_snippet.get('publishedAt')
+    }
+
+def resolve_playlist_page(items, snapshot):
+    """
+    Turn one page of playlist items into playlist videos
+
+    Items whose etag matches the previous import reuse the stored video;
+    only new or changed items are looked up with videos().list. Returns the
+    videos in playlist order, the snapshot entries for this page and the
+    number of videos that had to be fetched.
+    """
+    entries = {}
+    needed = []
+    for item in items:
+        video_id = item['contentDetails']['videoId']
+        previous = snapshot.get(video_id)
+        if previous and previous['etag'] == item.get('etag'):
+            entries[video_id] = previous
+        else:
+            entries[video_id] = {'etag': item.get('etag'), 'video': None}
+            needed.append(video_id)
+
+    if needed:
+        for video in fetch_video_items(needed):
+            if video['id'] in entries:
+                entries[video['id']]['video'] = format_playlist_video(video)
+
+    # Private and deleted videos have no details and are left out, as before
+    videos = [entry['video'] for entry in entries.values() if entry['video']]
+    return videos, entries, len(needed)
+
+def ingest_playlist(playlist_id):
+    """
+    Fetch a playlist and all of its videos, yielding events as pages arrive
+
+    Yields {"event": "playlist", "data": ...} first, then one
+    {"event": "videos", "page": n, "data": [...]} per page of up to 50 items,
+    and finally {"event": "done", "data": {...counters}}. A missing playlist
+    yields a single {"event": "error", ...}. Video details for page N are
+    fetched in the background while page N+1 is being listed.
+    """
+    # Get playlist details
+    playlist_response = execute_request(lambda youtube: youtube.playlists().list(
+        part='snippet,contentDetails',
+        id=playlist_id
+    ))
+
+    if not playlist_response.get('items'):
+        yield {
+            'event': 'error',
+            'error': {
+                'type': 'PLAYLIST_NOT_FOUND',
+                'message': 'Playlist not found or not accessible'
+            }
+        }
+        return
+
+    yield {
+        'event': 'playlist',
+        'data': format_playlist_metadata(playlist_id, playlist_response['items'][0]),
+        'etag': playlist_response.get('etag')
+    }
+
+    snapshot = playlist_snapshots.get(playlist_id) or {}
+    new_snapshot = {}
+    counts = {'pages': 0, 'items': 0, 'videos': 0, 'fetched': 0}
+
+    pending = []
+    next_page_token = None
+
+    while True:
+        playlist_items_response = execute_request(lambda youtube: youtube.playlistItems().list(
+            part='snippet,contentDetails',
+            playlistId=playlist_id,
+            maxResults=50,  # YouTube API allows max 50 per request
+            pageToken=next_page_token
+        ))
+
+        items = playlist_items_response.get('items', [])
+        counts['items'] += len(items)
+        pending.append(youtube_executor.submit(resolve_playlist_page, items, snapshot))
+
+        # Emit the previous page while this page's details are being fetched
+        next_page_token = playlist_items_response.get('nextPageToken')
+        while pending and (len(pending) > 1 or not next_page_token):
+            videos, entries, fetched = pending.pop(0).result()
+            new_snapshot.update(entries)
+            counts['videos'] += len(videos)
+            counts['fetched'] += fetched
+            counts['pages'] += 1
+            yield {'event': 'videos', 'page': counts['pages'], 'data': videos}
+
+        if not next_page_token:
+            break
+
+    playlist_snapshots.set(playlist_id, new_snapshot)
+    counts['reused'] = counts['items'] - counts['fetched']
+    yield {'event': 'done', 'data': counts}
+
+def collect_playlist(playlist_id):
+    """Ingest a whole playlist and return it in the standard result format, plus the playlist ETag"""
+    playlist_metadata = None
+    etag = None
+    videos = []
+
+    for event in ingest_playlist(playlist_id):
+        if event['event'] == 'error':
+            return {'success': False, 'error': event['error']}, None
+        if event['event'] == 'playlist':
+            playlist_metadata = event['data']
+            etag = event.get('etag')
+        elif event['event'] == 'videos':
+            videos.extend(event['data'])
+
+    playlist_metadata['videos'] = videos
+    return {'success': True, 'data': playlist_metadata}, etag
+
+def refresh_playlist(playlist_id, entry=None):
+    """
+    Refresh a cached playlist, revalidating with the playlist's ETag first
+
+    A 304 from playlists().list keeps the cached videos; otherwise the
+    playlist is ingested again (incrementally). Returns (result, status).
+    """
+    if entry and entry.get('etag'):
+        response = execute_request(lambda youtube: youtube.playlists().list(
+            part='snippet,contentDetails',
+            id=playlist_id
+        ), entry['etag'])
+        if response is None:
+            metadata_cache.set(f'playlist:{playlist_id}', dict(entry, validated_at=time.time()))
+            return entry['result'], 'REVALIDATED'
+
+    result, etag = collect_playlist(playlist_id)
+    if result['success']:
+        metadata_cache.set(f'playlist:{playlist_id}', {
+            'result': result,
+            'etag': etag,
+            'validated_at': time.time()
+        })
+    return result, 'MISS'
+
+def get_playlist(playlist_id):
+    """Return (result, cache_status, age, fresh_for) for a playlist, using the metadata cache"""
+    entry = metadata_cache.get(f'playlist:{playlist_id}')
+    if entry is not None:
+        age = time.time() - entry['validated_at']
+        if age < PLAYLIST_METADATA_TTL:
+            return entry['result'], 'HIT', age, PLAYLIST_METADATA_TTL - age
+        if age < PLAYLIST_METADATA_TTL + METADATA_STALE_WHILE_REVALIDATE:
+            schedule_refresh(f'playlist:{playlist_id}', refresh_playlist, playlist_id, entry)
+            return entry['result'], 'STALE', age, 0
+
+    result, status = refresh_playlist(playlist_id, entry)
+    return result, status, 0, PLAYLIST_METADATA_TTL
+
+def ingest_links(links):
+    """
+    Resolve a list of mixed video and playlist links, yielding results in input order
+
+    Links are classified and deduplicated first. Unique videos are resolved
+    in groups of 50 with fetch_video_metadata_batch (cache first, then one
+    videos().list call per group) and unique playlists with get_playlist, all
+    concurrently on link_executor. Yields one {"event": "link", "index": i,
+    "input": ..., "kind": ..., "success": ..., "data" | "error": ...} per
+    input link as soon as it and every link before it are resolved, then
+    {"event": "done", "data": {...counters}}.
+    """
+    classified = [classify_link(str(link)) for link in links]
+    video_ids = list(dict.fromkeys(link.video_id for link in classified if link.kind == 'video'))
+    playlist_ids = list(dict.fromkeys(link.playlist_id for link in classified if link.kind == 'playlist'))
+
+    # Groups are submitted in first-seen order, so the first links resolve first
+    video_groups = {}
+    for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        group = video_ids[start:start + VIDEOS_PER_REQUEST]
+        future = link_executor.submit(fetch_video_metadata_batch, group)
+        for video_id in group:
+            video_groups[video_id] = future
+    playlists = {playlist_id: link_executor.submit(get_playlist, playlist_id) for playlist_id in playlist_ids}
+
+    def server_error(error):
+        return {
+            'success': False,
+            'error': {
+                'type': upstream.error_type(error),
+                'message': str(error)
+            }
+        }
+
+    cache_counts = {}
+    counted = set()
+    counts = {'links': len(links), 'videos': len(video_ids), 'playlists': len(playlist_ids), 'invalid': 0, 'failed': 0}
+    seen = set()
+
+    try:
+        for index, (value, link) in enumerate(zip(links, classified)):
+            event = {'event': 'link', 'index': index, 'input': value, 'kind': link.kind}
+            if link.kind == 'video':
+                event['videoId'] = link.video_id
+                if link.playlist_id:
+                    event['playlistId'] = link.playlist_id
+                future = video_groups[link.video_id]
+                try:
+                    results, group_counts, _ = future.result()
+                    if id(future) not in counted:
+                        counted.add(id(future))
+                        for status, count in group_counts.items():
+                            cache_counts[status] = cache_counts.get(status, 0) + count
+                    result = results[link.video_id]
+                except Exception as e:
+                    result = server_error(e)
+            elif link.kind == 'playlist':
+                event['playlistId'] = link.playlist_id
+                try:
+                    result, status, _, _ = playlists[link.playlist_id].result()
+                    if link.playlist_id not in seen:
+                        cache_counts[status] = cache_counts.get(status, 0) + 1
+                except Exception as e:
+                    result = server_error(e)
+            else:
+                counts['invalid'] += 1
+                result = {
+                    'success': False,
+                    'error': {
+                        'type': 'PARSING_ERROR',
+                        'message': 'Not a YouTube video or playlist ID or URL'
+                    }
+                }
+
+            key = link.video_id or link.playlist_id
+            if key in seen:
+                event['duplicate'] = True
+            elif key:
+                seen.add(key)
+                if not result['success']:
+                    counts['failed'] += 1
+            event.update(result)
+            yield event
+    finally:
+        # A client that disconnects early does not leave groups queued
+        for future in list(video_groups.values()) + list(playlists.values()):
+            future.cancel()
+
+    counts['cache'] = cache_counts
+    yield {'event': 'done', 'data': counts}
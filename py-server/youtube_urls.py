@@ -0,0 +1,94 @@
+"""
+YouTube URL Module
+Classifies video and playlist links with one precompiled pattern
+"""
+
+import re
+from collections import namedtuple
+
+# video, playlist, or None for input that is neither
+YouTubeLink = namedtuple('YouTubeLink', ('kind', 'video_id', 'playlist_id'))
+
+NOT_A_LINK = YouTubeLink(None, None, None)
+
+# Prefixes of public playlist IDs: user playlists, uploads, likes, mixes, albums
+PLAYLIST_PREFIXES = r'(?:PL|UU|LL|FL|RD|OL|UL|PU|EL|TL)'
+
+# One anchored pass over a link: a bare video or playlist ID, a youtu.be link,
+# an /embed/, /v/, /live/ or /shorts/ link, or a /watch or /playlist link. The
+# common watch?v=ID form is matched here; other query strings are read with
+# QUERY_ID. IDs must end at a non-ID character, so longer strings are not cut
+# to eleven characters. Host names are matched in lower case only. re.ASCII
+# keeps \w to [A-Za-z0-9_], the characters YouTube IDs are made of.
+LINK = re.compile(r'''
+    (?:
+        (?P<bare_video>[\w-]{11})
+      | (?P<bare_playlist>''' + PLAYLIST_PREFIXES + r'''[\w-]{10,})
+    )$
+  | (?:https?://)?(?:www\.|m\.|music\.)?
+    (?:
+        youtu\.be/(?P<short>[\w-]{11})(?![\w-])
+      | youtube(?:-nocookie)?\.com/
+        (?:
+            (?:embed|v|e|live|shorts)/(?P<path>[\w-]{11})(?![\w-])
+          | watch(?:\?v=(?P<watch>[\w-]{11})(?![\w-]))?
+          | playlist
+        )
+    )
+    (?P<rest>[^#\s]*)
+''', re.VERBOSE | re.ASCII)
+
+# v= and list= parameters of a query string
+QUERY_ID = re.compile(r'[?&](v|list)=([\w-]+)', re.ASCII)
+
+VIDEO_ID = re.compile(r'[\w-]{11}$', re.ASCII)
+
+# Separators between links in pasted text
+LINK_SEPARATORS = re.compile(r'[\s,]+')
+
+def classify_link(text):
+    """
+    Return the YouTubeLink for a video or playlist ID or URL
+
+    A watch URL with both v= and list= is a video link that also carries the
+    playlist ID. Anything else, including other sites, gives kind None.
+    """
+    match = LINK.match(text.strip().strip('<>"\'')) if text else None
+    if match is None:
+        return NOT_A_LINK
+
+    bare_video, bare_playlist, video_id, rest = match.group('bare_video', 'bare_playlist', 'watch', 'rest')
+    if bare_video:
+        return YouTubeLink('video', bare_video, None)
+    if bare_playlist:
+        return YouTubeLink('playlist', None, bare_playlist)
+
+    video_id = video_id or match.group('short') or match.group('path')
+    playlist_id = None
+    if rest and (video_id is None or 'list=' in rest):
+        for name, value in QUERY_ID.findall(rest):
+            if name == 'list':
+                playlist_id = playlist_id or value
+            elif video_id is None and VIDEO_ID.match(value):
+                video_id = value
+
+    if video_id == 'videoseries':
+        # /embed/videoseries?list=... embeds a playlist
+        video_id = None
+    if video_id:
+        return YouTubeLink('video', video_id, playlist_id)
+    if playlist_id:
+        return YouTubeLink('playlist', None, playlist_id)
+    return NOT_A_LINK
+
+def extract_video_id(url):
+    """Extract the video ID from a YouTube URL or ID, or return None"""
+    return classify_link(url).video_id
+
+def extract_playlist_id(url):
+    """Extract the playlist ID from a playlist URL or ID, or from a watch URL's list=, or return None"""
+    return classify_link(url).playlist_id
+
+def split_links(text):
+    """Split pasted text into links at whitespace and commas"""
+    return [link for link in LINK_SEPARATORS.split(text) if link]